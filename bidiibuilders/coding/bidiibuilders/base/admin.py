@@ -1,12 +1,393 @@
-from django.contrib import admin
-from .models import Team, Project, Worker, Skill, Payment, Task, TeamMember, JobApplication, TimeLog
-
-admin.site.register(Team)
-admin.site.register(Project)
-admin.site.register(Worker)
-admin.site.register(Skill)
-admin.site.register(Payment)
-admin.site.register(Task)
-admin.site.register(TeamMember)
-admin.site.register(JobApplication)
-admin.site.register(TimeLog)
\ No newline at end of file
+from datetime import date, datetime, timedelta
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.db import transaction
+from django.db.models import DateTimeField, F, Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .availability import BookingConflict, book_application, move_conflicts, release_application
+from .cache import bump_on_commit, user_scope
+from .financials import apply_costs, payment_cost
+from .jobqueue import enqueue
+from .jobs import notify_application
+from .ledger import apply_payments
+from .models import (Team, Project, Worker, Skill, Payment, Task, TeamMember, JobApplication, TimeLog, BackgroundJob,
+                     SlowQuery)
+from .pagination import EstimatedCountPaginator
+
+
+# Rows read per batch by bulk actions that keep derived tables in step
+ACTION_BATCH = 500
+
+
+# ==================== LARGE TABLES ====================
+def _period_start(value, kind):
+    if kind == 'year':
+        return date(value.year, 1, 1)
+    if kind == 'month':
+        return date(value.year, value.month, 1)
+    return date(value.year, value.month, value.day)
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return date(start.year + 1, 1, 1)
+    if kind == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+class IndexedDateQuerySet(QuerySet):
+    """
+    QuerySet whose date hierarchy queries seek the date column's index
+    instead of reading every row.
+
+    dates()/datetimes() fetch the first date past the last period found,
+    again and again (a loose index scan), so they cost one query per
+    period listed. The hierarchy's Min/Max aggregate becomes two ordered
+    LIMIT 1 queries, as SQLite scans the whole index for MIN and MAX in
+    one statement.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        if args or not kwargs or self.query.is_sliced or self.query.distinct or not all(
+                type(aggregate) in (Min, Max) and aggregate.filter is None
+                and isinstance(aggregate.source_expressions[0], F) for aggregate in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for name, aggregate in kwargs.items():
+            field_name = aggregate.source_expressions[0].name
+            values = self.filter(**{f'{field_name}__isnull': False}).values_list(field_name, flat=True)
+            result[name] = values.order_by(field_name if type(aggregate) is Min else f'-{field_name}').first()
+        return result
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        return self._periods(field_name, kind, order, aware=False)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day') or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self._periods(field_name, kind, order, aware=settings.USE_TZ)
+
+    def _periods(self, field_name, kind, order, aware):
+        def bound(day):
+            moment = datetime.combine(day, datetime.min.time())
+            return timezone.make_aware(moment) if aware else moment
+
+        is_datetime = isinstance(self.model._meta.get_field(field_name), DateTimeField)
+        values = self.filter(**{f'{field_name}__isnull': False}).values_list(field_name, flat=True)
+        last = values.order_by(f'-{field_name}').first()
+        values = values.order_by(field_name)
+        periods = []
+        value = values.first()
+        while value is not None:
+            if is_datetime and aware:
+                value = timezone.localtime(value)
+            start = _period_start(value, kind)
+            periods.append(bound(start) if is_datetime else start)
+            end = bound(_next_period(start, kind)) if is_datetime else _next_period(start, kind)
+            # BETWEEN, not a second >=: SQLite seeks on the first lower bound of a column, which may
+            # be the changelist's own, wider one
+            value = values.filter(**{f'{field_name}__range': (end, last)}).first() if end <= last else None
+        return periods[::-1] if order == 'DESC' else periods
+
+
+class PrefetchChangeList(ChangeList):
+    """
+    Loads list_select_related with prefetch_related: a page is then one
+    ordered walk of the table's index plus a pk lookup per relation. As a
+    JOIN, SQLite may start from the small related table and sort every
+    row of the large one.
+    """
+
+    def apply_select_related(self, qs):
+        if isinstance(self.list_select_related, (list, tuple)):
+            return qs.prefetch_related(*self.list_select_related)
+        return super().apply_select_related(qs)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow into the millions: no full
+    COUNT(*) (estimated when unfiltered, and no second count of the whole
+    table beside a filtered one), and a date hierarchy that walks the
+    date index. Subclasses list their FKs in list_select_related (they
+    are prefetched per page) and keep sortable_by to indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_changelist(self, request, **kwargs):
+        return PrefetchChangeList
+
+    def get_queryset(self, request):
+        queryset = IndexedDateQuerySet(self.model, using=self.model._default_manager.db)
+        ordering = self.get_ordering(request)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+
+def _batches(queryset):
+    pks = list(queryset.values_list('pk', flat=True))
+    for i in range(0, len(pks), ACTION_BATCH):
+        yield pks[i:i + ACTION_BATCH]
+
+
+# ==================== TEAMS ====================
+@admin.register(Team)
+class TeamAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'created_at')
+    list_select_related = ('owner',)
+    search_fields = ('name',)
+    raw_id_fields = ('owner',)
+
+
+@admin.register(TeamMember)
+class TeamMemberAdmin(admin.ModelAdmin):
+    list_display = ('user', 'team', 'role', 'is_active')
+    list_filter = ('role', 'is_active')
+    list_select_related = ('user', 'team')
+    search_fields = ('=user__username', 'team__name')
+    raw_id_fields = ('user', 'team')
+
+
+# ==================== PROJECTS / WORKERS ====================
+class ProjectAdminForm(forms.ModelForm):
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get('start_date'), cleaned.get('end_date')
+        # Saving would move the bookings with the dates; refuse here rather than fail the save
+        if self.instance.pk and start and end and start <= end:
+            clashes = move_conflicts(self.instance, start, end)
+            if clashes:
+                raise forms.ValidationError(str(BookingConflict(clashes)))
+        return cleaned
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    form = ProjectAdminForm
+    list_display = ('name', 'client_name', 'user', 'status', 'progress', 'start_date', 'end_date', 'budget')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    search_fields = ('name', 'client_name', 'location')
+    raw_id_fields = ('user', 'team')
+
+
+@admin.register(Worker)
+class WorkerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'role', 'status', 'rating', 'daily_rate', 'user')
+    list_filter = ('role', 'status')
+    list_select_related = ('user',)
+    search_fields = ('name', 'phone', '=id_number')
+    raw_id_fields = ('user',)
+    actions = ('mark_available', 'mark_inactive')
+
+    def _set_status(self, request, queryset, status):
+        # save() per worker: the skill index, match scores and caches follow Worker saves
+        count = 0
+        with transaction.atomic():
+            for worker in queryset.exclude(status=status):
+                worker.status = status
+                worker.save(update_fields=['status', 'updated_at'])
+                count += 1
+        self.message_user(request, f'{count} worker(s) marked {status}.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected workers available')
+    def mark_available(self, request, queryset):
+        self._set_status(request, queryset, 'available')
+
+    @admin.action(description='Mark selected workers inactive')
+    def mark_inactive(self, request, queryset):
+        self._set_status(request, queryset, 'inactive')
+
+
+@admin.register(Skill)
+class SkillAdmin(admin.ModelAdmin):
+    list_display = ('name', 'description')
+
+
+# ==================== PAYMENTS ====================
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ('date', 'user', 'project', 'type', 'category', 'amount', 'status', 'payment_method', 'reference')
+    list_filter = ('type', 'status', 'category', 'payment_method')
+    list_select_related = ('user', 'project')
+    date_hierarchy = 'date'
+    sortable_by = ('date',)
+    search_fields = ('reference',)
+    search_help_text = 'Exact payment reference'
+    autocomplete_fields = ('user', 'project')
+    actions = ('mark_completed', 'mark_pending', 'mark_cancelled')
+
+    def get_search_results(self, request, queryset, search_term):
+        # An exact match can use payment_reference_idx; the default icontains scans every row
+        term = search_term.strip()
+        return (queryset.filter(reference=term) if term else queryset), False
+
+    def _set_status(self, request, queryset, status):
+        """update() in batches, moving each payment's rollup bucket and project cost as save() would"""
+        count = 0
+        now = timezone.now()
+        with transaction.atomic():
+            for pks in _batches(queryset.exclude(status=status)):
+                payments = list(Payment.objects.filter(pk__in=pks))
+                apply_payments(payments, sign=-1)
+                apply_costs((payment_cost(p) for p in payments), sign=-1)
+                Payment.objects.filter(pk__in=pks).update(status=status, updated_at=now)
+                for payment in payments:
+                    payment.status = status
+                apply_payments(payments)
+                apply_costs(payment_cost(p) for p in payments)
+                count += len(payments)
+        self.message_user(request, f'{count} payment(s) marked {status}.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected payments completed')
+    def mark_completed(self, request, queryset):
+        self._set_status(request, queryset, 'completed')
+
+    @admin.action(description='Mark selected payments pending')
+    def mark_pending(self, request, queryset):
+        self._set_status(request, queryset, 'pending')
+
+    @admin.action(description='Mark selected payments cancelled')
+    def mark_cancelled(self, request, queryset):
+        self._set_status(request, queryset, 'cancelled')
+
+
+# ==================== SCHEDULE ====================
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('title', 'date', 'time', 'user', 'project', 'type', 'priority', 'completed')
+    list_filter = ('completed', 'type', 'priority')
+    list_select_related = ('user', 'project')
+    date_hierarchy = 'date'
+    sortable_by = ('date',)
+    raw_id_fields = ('user', 'project', 'recurrence')
+    actions = ('mark_done', 'mark_not_done')
+
+    def _set_completed(self, request, queryset, completed):
+        now = timezone.now()
+        with transaction.atomic():
+            users = set(queryset.values_list('user_id', flat=True).distinct())
+            # updated_at moves the calendar feed's ETag; the search index follows by trigger
+            count = queryset.exclude(completed=completed).update(
+                completed=completed, completed_at=now if completed else None, updated_at=now)
+            # update() skips the post_save cache invalidation
+            bump_on_commit(*(user_scope(user_id) for user_id in users))
+        self.message_user(request, f'{count} task(s) updated.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected tasks completed')
+    def mark_done(self, request, queryset):
+        self._set_completed(request, queryset, True)
+
+    @admin.action(description='Mark selected tasks not completed')
+    def mark_not_done(self, request, queryset):
+        self._set_completed(request, queryset, False)
+
+
+# ==================== APPLICATIONS / TIME ====================
+@admin.register(JobApplication)
+class JobApplicationAdmin(LargeTableAdmin):
+    list_display = ('worker', 'project', 'status', 'applied_at', 'responded_at')
+    list_filter = ('status',)
+    list_select_related = ('worker', 'project')
+    date_hierarchy = 'applied_at'
+    sortable_by = ('applied_at',)
+    autocomplete_fields = ('worker', 'project')
+    actions = ('accept', 'reject')
+
+    def _respond(self, request, queryset, status):
+        """As the client's accept/reject: book or release the worker and notify them"""
+        count, clashes = 0, []
+        for application in queryset.select_related('worker', 'project').exclude(status=status):
+            try:
+                with transaction.atomic():
+                    application.status = status
+                    application.responded_at = timezone.now()
+                    application.save()
+                    if status == 'accepted':
+                        book_application(application)
+                    else:
+                        release_application(application)
+                    enqueue(notify_application, {'application_id': application.pk, 'event': 'responded'})
+            except BookingConflict as e:
+                clashes.append(f'{application}: {e}')
+                continue
+            count += 1
+        self.message_user(request, f'{count} application(s) {status}.', messages.SUCCESS)
+        for clash in clashes:
+            self.message_user(request, clash, messages.WARNING)
+
+    @admin.action(description='Accept selected applications')
+    def accept(self, request, queryset):
+        self._respond(request, queryset, 'accepted')
+
+    @admin.action(description='Reject selected applications')
+    def reject(self, request, queryset):
+        self._respond(request, queryset, 'rejected')
+
+
+@admin.register(TimeLog)
+class TimeLogAdmin(LargeTableAdmin):
+    list_display = ('worker', 'project', 'date', 'clock_in_time', 'clock_out_time', 'hours_worked')
+    list_select_related = ('worker', 'project')
+    date_hierarchy = 'date'
+    sortable_by = ('date',)
+    autocomplete_fields = ('worker', 'project')
+
+
+# ==================== OPERATIONS ====================
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'finished_at', 'last_error')
+    list_filter = ('status', 'name')
+    search_fields = ('=unique_key',)
+    actions = ('retry',)
+
+    @admin.action(description='Retry selected failed jobs')
+    def retry(self, request, queryset):
+        now = timezone.now()
+        count = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=now, finished_at=None, last_error='', updated_at=now)
+        self.message_user(request, f'{count} job(s) queued again.', messages.SUCCESS)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Read-only: rows are written by base.slowqueries; delete them to start over"""
+    list_display = ('short_statement', 'calls', 'mean', 'max_ms', 'total_ms', 'view', 'location', 'last_seen')
+    list_filter = ('database', 'view')
+    search_fields = ('statement', 'view', 'location')
+    ordering = ('-total_ms',)
+    fields = ('fingerprint', 'database', 'calls', 'total_ms', 'max_ms', 'first_seen', 'last_seen', 'view',
+              'location', 'statement_block', 'sample_sql', 'sample_params', 'plan_block')
+    readonly_fields = fields
+
+    @admin.display(description='Statement')
+    def short_statement(self, obj):
+        return obj.statement if len(obj.statement) <= 120 else obj.statement[:117] + '...'
+
+    @admin.display(description='Mean ms', ordering='total_ms')
+    def mean(self, obj):
+        return f'{obj.mean_ms:.1f}'
+
+    @admin.display(description='Statement')
+    def statement_block(self, obj):
+        return format_html('<pre style="white-space: pre-wrap">{}</pre>', obj.statement)
+
+    @admin.display(description='Plan')
+    def plan_block(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan or '-')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,152 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Project, Worker, Payment, Task, JobApplication, TimeLog
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Stable under concurrent edits, unlike updated_at
+API_ORDERING = ('id',)
+
+
+class ApiError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class Resource:
+    name: str
+    model: type
+    # API field -> ORM column; foreign keys are exposed as ids
+    fields: dict
+    # user -> the rows that user may read
+    scope: Callable
+
+
+def _fields(*names, **columns):
+    return {**{name: name for name in names}, **columns}
+
+
+RESOURCES = {resource.name: resource for resource in [
+    Resource('projects', Project, _fields(
+        'id', 'name', 'location', 'client_name', 'client_phone', 'budget', 'description', 'status',
+        'start_date', 'end_date', 'progress', 'created_at', 'updated_at', team='team_id',
+    ), lambda user: Project.objects.filter(user=user)),
+    # The directory is shared; only the client-visible columns are exposed
+    Resource('workers', Worker, _fields(
+        'id', 'name', 'phone', 'role', 'daily_rate', 'experience_years', 'bio', 'skills', 'status', 'rating',
+        'completed_projects', 'created_at', 'updated_at',
+    ), lambda user: Worker.objects.all()),
+    Resource('payments', Payment, _fields(
+        'id', 'type', 'category', 'amount', 'description', 'date', 'status', 'payment_method', 'reference',
+        'created_at', 'updated_at', project='project_id',
+    ), lambda user: Payment.objects.filter(user=user)),
+    Resource('tasks', Task, _fields(
+        'id', 'title', 'type', 'date', 'time', 'description', 'completed', 'completed_at', 'priority',
+        'created_at', 'updated_at', project='project_id',
+    ), lambda user: Task.objects.filter(user=user)),
+    # Clients see applications to their projects, workers their own
+    Resource('job-applications', JobApplication, _fields(
+        'id', 'status', 'applied_at', 'responded_at', 'cover_letter', 'notes', 'created_at', 'updated_at',
+        worker='worker_id', project='project_id',
+    ), lambda user: JobApplication.objects.filter(Q(project__user=user) | Q(worker__user=user))),
+    Resource('time-logs', TimeLog, _fields(
+        'id', 'date', 'clock_in_time', 'clock_out_time', 'hours_worked', 'notes', 'created_at', 'updated_at',
+        worker='worker_id', project='project_id',
+    ), lambda user: TimeLog.objects.filter(Q(worker__user=user) | Q(project__user=user))),
+]}
+
+
+# ==================== REQUEST PARSING ====================
+def get_resource(name):
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise ApiError(f"Unknown resource '{name}'", status=404)
+
+
+def parse_fields(resource, raw):
+    """The requested sparse fieldset (all fields by default); id is always included"""
+    if not raw:
+        return list(resource.fields)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown field(s) for {resource.name}: {', '.join(unknown)}")
+    return ['id'] + [name for name in dict.fromkeys(names) if name != 'id']
+
+
+def parse_page_size(raw):
+    if not raw:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(raw)
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ApiError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return size
+
+
+def filter_since(queryset, raw):
+    """?since=<ISO datetime> keeps rows updated after it, for incremental sync"""
+    if not raw:
+        return queryset
+    try:
+        since = parse_datetime(raw)
+    except ValueError:
+        # Well formed but out of range, e.g. month 13
+        since = None
+    if since is None:
+        raise ApiError(f"Invalid since '{raw}'")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return queryset.filter(updated_at__gt=since)
+
+
+# ==================== VALIDATORS ====================
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def collection_validators(request, queryset):
+    """
+    (ETag, last modified) of a filtered collection, from one aggregate.
+
+    The newest updated_at changes on every create or update; the row count
+    covers deletes. The full path is mixed in so each fieldset and page
+    has its own tag.
+    """
+    state = queryset.order_by().aggregate(last=Max('updated_at'), count=Count('id'))
+    return make_etag(API_VERSION, request.get_full_path(), state['last'], state['count']), state['last']
+
+
+# ==================== SERIALIZATION ====================
+def fetch_page(resource, queryset, fields, cursor, page_size):
+    """One keyset page of rows as {field: value} dicts, plus the next cursor"""
+    columns = [resource.fields[name] for name in fields]
+    paginator = KeysetPaginator(queryset.values(*columns), API_ORDERING, page_size=page_size)
+    try:
+        page = paginator.page(cursor)
+    except InvalidCursor as e:
+        raise ApiError(str(e))
+    items = [{name: row[column] for name, column in zip(fields, columns)} for row in page.items]
+    return items, page.next_cursor
+
+
+def fetch_one(resource, queryset, fields, pk):
+    columns = [resource.fields[name] for name in fields]
+    row = queryset.filter(pk=pk).values('updated_at', *columns).first()
+    if row is None:
+        raise ApiError(f'{resource.name} {pk} not found', status=404)
+    return {name: row[column] for name, column in zip(fields, columns)}, row['updated_at']
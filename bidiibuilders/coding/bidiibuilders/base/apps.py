@@ -1,6 +1,62 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 
 
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+
+        from . import availability, cache, financials, ledger, matching, metrics, skills, slowqueries
+        from . import jobs  # noqa: F401 - registers the background job handlers
+        from .models import JobApplication, Payment, Project, Task, TimeLog, Worker, WorkerBooking
+
+        # Keep PaymentRollup in step with Payment writes
+        pre_save.connect(ledger.remember_previous, sender=Payment, dispatch_uid='ledger_pre_save')
+        post_save.connect(ledger.payment_saved, sender=Payment, dispatch_uid='ledger_post_save')
+        post_delete.connect(ledger.payment_deleted, sender=Payment, dispatch_uid='ledger_post_delete')
+
+        # Keep ProjectCost in step with project expenses and time logs
+        pre_save.connect(financials.remember_previous_cost, sender=Payment, dispatch_uid='costs_pre_save_Payment')
+        post_save.connect(financials.cost_saved, sender=Payment, dispatch_uid='costs_post_save_Payment')
+        post_delete.connect(financials.cost_deleted, sender=Payment, dispatch_uid='costs_post_delete_Payment')
+        # Wages are priced per worker-day, so time log writes re-price their days
+        pre_save.connect(financials.remember_previous_days, sender=TimeLog, dispatch_uid='costs_pre_save_TimeLog')
+        post_save.connect(financials.days_saved, sender=TimeLog, dispatch_uid='costs_post_save_TimeLog')
+        pre_delete.connect(financials.remember_deleted_days, sender=TimeLog, dispatch_uid='costs_pre_delete_TimeLog')
+        post_delete.connect(financials.days_deleted, sender=TimeLog, dispatch_uid='costs_post_delete_TimeLog')
+
+        # Keep the WorkerSkill search index in step with Worker.skills
+        post_save.connect(skills.worker_saved, sender=Worker, dispatch_uid='skills_post_save')
+
+        # Keep cached applicant match scores fresh (via the job queue)
+        post_save.connect(matching.project_saved, sender=Project, dispatch_uid='matching_project_saved')
+        post_save.connect(matching.worker_saved, sender=Worker, dispatch_uid='matching_worker_saved')
+        post_save.connect(matching.application_saved, sender=JobApplication, dispatch_uid='matching_application_saved')
+
+        # Rebuild the in-memory availability index after booking writes; bookings follow project dates
+        post_save.connect(availability.bookings_changed, sender=WorkerBooking, dispatch_uid='availability_post_save')
+        post_delete.connect(availability.bookings_changed, sender=WorkerBooking,
+                            dispatch_uid='availability_post_delete')
+        post_save.connect(availability.project_saved, sender=Project, dispatch_uid='availability_project_saved')
+
+        # Drop cached fragments that depend on the written rows
+        for model in (Project, Worker, Payment, Task):
+            post_save.connect(cache.invalidate_for_instance, sender=model, dispatch_uid=f'cache_save_{model.__name__}')
+            post_delete.connect(cache.invalidate_for_instance, sender=model, dispatch_uid=f'cache_delete_{model.__name__}')
+        post_save.connect(cache.invalidate_for_user, sender=User, dispatch_uid='cache_save_user')
+        post_delete.connect(cache.invalidate_for_user, sender=User, dispatch_uid='cache_delete_user')
+
+        # Time SQL for the request metrics
+        if settings.PERF_METRICS:
+            connection_created.connect(metrics.install_query_timer, dispatch_uid='metrics_query_timer')
+
+        # Log slow queries with their plans; entries are written once the request is over
+        if settings.SLOW_QUERY_LOG:
+            connection_created.connect(slowqueries.install_slow_query_log, dispatch_uid='slow_query_log')
+            request_finished.connect(slowqueries.flush, dispatch_uid='slow_query_flush')
@@ -0,0 +1,262 @@
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .cache import WORKERS_SCOPE, bump_on_commit, get_generations
+from .models import Worker, WorkerBooking
+
+
+# Bumped (after commit) whenever a booking is written
+BOOKINGS_SCOPE = 'bookings'
+# Statuses that take a worker out of every search, whatever the dates
+UNBOOKABLE = ('inactive',)
+CARD_FIELDS = ('id', 'name', 'role', 'daily_rate', 'rating')
+
+
+class BookingError(ValueError):
+    pass
+
+
+class BookingConflict(BookingError):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        days = ', '.join(f'{b.start_date} to {b.end_date}' for b in conflicts)
+        super().__init__(f'Worker is already booked {days}')
+
+
+# ==================== INTERVAL INDEX ====================
+class IntervalIndex:
+    """
+    Static index of closed integer intervals [start, end] with a key each.
+
+    Intervals are sorted by start and a max-end tree is kept over them, so
+    finding the k intervals overlapping a range costs O(log n + k): only
+    those starting by the range's end can overlap, and whole subtrees
+    ending before its start are skipped.
+    """
+
+    def __init__(self, intervals):
+        rows = sorted(intervals)
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.keys = [row[2] for row in rows]
+        size = 1
+        while size < len(rows):
+            size *= 2
+        self.size = size
+        tree = [float('-inf')] * (2 * size)
+        tree[size:size + len(rows)] = self.ends
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self.max_end = tree
+
+    def __len__(self):
+        return len(self.keys)
+
+    def overlapping(self, start, end):
+        """Keys of the intervals sharing at least one point with [start, end]"""
+        limit = bisect_right(self.starts, end)
+        found = []
+        if not limit:
+            return found
+        size, max_end, ends, keys = self.size, self.max_end, self.ends, self.keys
+        # (node, first leaf position it covers, leaves it covers)
+        stack = [(1, 0, size)]
+        while stack:
+            node, first, width = stack.pop()
+            if first >= limit or max_end[node] < start:
+                continue
+            if width == 1:
+                found.append(keys[first])
+                continue
+            half = width // 2
+            stack.append((2 * node + 1, first + half, half))
+            stack.append((2 * node, first, half))
+        return found
+
+    def overlaps(self, start, end):
+        return bool(self.overlapping(start, end))
+
+
+# ==================== AVAILABILITY INDEX ====================
+@dataclass
+class AvailabilityIndex:
+    """
+    Every booking and bookable worker, held in memory per process.
+
+    Dates are stored as ordinals. Built from two queries and rebuilt when
+    the workers or bookings cache scope moves on.
+    """
+    generations: list
+    # worker id -> card dict; ordered best rated first
+    workers: dict
+    # trade -> worker ids of that trade, in the workers' order
+    trades: dict
+    # '' (every trade) and each trade -> IntervalIndex of booking ids
+    booked: dict
+    # worker id -> IntervalIndex of that worker's booking ids
+    by_worker: dict = field(default_factory=dict)
+    # booking id -> (worker id, kind, start, end, project id)
+    bookings: dict = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, generations):
+        workers = {
+            row['id']: row for row in
+            Worker.objects.exclude(status__in=UNBOOKABLE).order_by('-rating', 'name').values(*CARD_FIELDS)
+        }
+        trades = {}
+        for worker_id, row in workers.items():
+            trades.setdefault(row['role'], []).append(worker_id)
+
+        bookings, per_trade, per_worker = {}, {}, {}
+        rows = WorkerBooking.objects.values_list('id', 'worker_id', 'kind', 'start_date', 'end_date', 'project_id')
+        for booking_id, worker_id, kind, start, end, project_id in rows.iterator(chunk_size=5000):
+            start, end = start.toordinal(), end.toordinal()
+            bookings[booking_id] = (worker_id, kind, start, end, project_id)
+            per_worker.setdefault(worker_id, []).append((start, end, booking_id))
+            if worker_id in workers:
+                per_trade.setdefault(workers[worker_id]['role'], []).append((start, end, worker_id))
+
+        booked = {trade: IntervalIndex(rows) for trade, rows in per_trade.items()}
+        booked[''] = IntervalIndex(row for rows in per_trade.values() for row in rows)
+        return cls(
+            generations=generations, workers=workers, trades=trades, booked=booked,
+            by_worker={worker_id: IntervalIndex(rows) for worker_id, rows in per_worker.items()},
+            bookings=bookings,
+        )
+
+    def free_workers(self, start, end, trade=None, limit=None):
+        """Cards of the bookable workers (of a trade) with no booking between start and end"""
+        start, end = start.toordinal(), end.toordinal()
+        index = self.booked.get(trade or '')
+        busy = set(index.overlapping(start, end)) if index is not None else set()
+        candidates = self.trades.get(trade, ()) if trade else self.workers
+        free = []
+        for worker_id in candidates:
+            if worker_id not in busy:
+                free.append(self.workers[worker_id])
+                if len(free) == limit:
+                    break
+        return free
+
+    def conflicts(self, worker_id, start, end, exclude=None):
+        """Ids of the worker's bookings between start and end, other than exclude"""
+        index = self.by_worker.get(worker_id)
+        if index is None:
+            return []
+        found = index.overlapping(start.toordinal(), end.toordinal())
+        return [booking_id for booking_id in found if booking_id != exclude]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def availability_index():
+    """The process's AvailabilityIndex, rebuilt first if a worker or booking changed since"""
+    global _index
+    generations = get_generations(WORKERS_SCOPE, BOOKINGS_SCOPE)
+    index = _index
+    if index is None or index.generations != generations:
+        with _index_lock:
+            index = _index
+            if index is None or index.generations != generations:
+                index = _index = AvailabilityIndex.build(generations)
+    return index
+
+
+def free_workers(start, end, trade=None, limit=None):
+    return availability_index().free_workers(start, end, trade, limit)
+
+
+def conflicts(worker_id, start, end, exclude=None):
+    return availability_index().conflicts(worker_id, start, end, exclude)
+
+
+# ==================== BOOKING ====================
+def _clashes(worker_id, start, end, exclude=None):
+    clashes = WorkerBooking.objects.filter(worker_id=worker_id, start_date__lte=end, end_date__gte=start)
+    if exclude is not None:
+        clashes = clashes.exclude(pk=exclude)
+    return list(clashes.order_by('start_date'))
+
+
+@transaction.atomic
+def book_worker(worker, start, end, kind='project', project=None, application=None, note='', replace=None):
+    """
+    Book a worker from start to end, or raise BookingConflict.
+
+    The overlap check runs against the database with the worker row
+    locked, so two requests can't both book the same days; replace is an
+    existing booking to move rather than clash with.
+    """
+    if end < start:
+        raise BookingError('A booking cannot end before it starts')
+    # Row lock on PostgreSQL; SQLite's IMMEDIATE transactions already serialize writers
+    list(Worker.objects.select_for_update().filter(pk=worker.pk).values_list('pk'))
+    clashes = _clashes(worker.pk, start, end, exclude=replace.pk if replace else None)
+    if clashes:
+        raise BookingConflict(clashes)
+    if replace is not None:
+        replace.start_date, replace.end_date = start, end
+        replace.save(update_fields=['start_date', 'end_date', 'updated_at'])
+        return replace
+    return WorkerBooking.objects.create(worker=worker, kind=kind, project=project, application=application,
+                                        start_date=start, end_date=end, note=note)
+
+
+def book_application(application):
+    """Book an accepted application's worker for the project's dates; None if the project has none"""
+    project = application.project
+    existing = WorkerBooking.objects.filter(application=application).first()
+    if not (project.start_date and project.end_date):
+        release_application(application)
+        return None
+    return book_worker(application.worker, project.start_date, project.end_date, project=project,
+                       application=application, replace=existing)
+
+
+def release_application(application):
+    for booking in WorkerBooking.objects.filter(application=application):
+        booking.delete()
+
+
+def move_conflicts(project, start, end):
+    """Bookings that moving the project's bookings to start..end would clash with"""
+    clashes = []
+    for booking in WorkerBooking.objects.filter(project=project, kind='project'):
+        clashes.extend(_clashes(booking.worker_id, start, end, exclude=booking.pk))
+    return clashes
+
+
+def project_saved(sender, instance, raw=False, **kwargs):
+    """
+    Move the project's bookings with its dates, or raise BookingConflict
+    with every clash. Project.save runs this in its transaction, so a
+    refused move leaves the project's dates as they were.
+    """
+    if raw or not (instance.start_date and instance.end_date) or instance.end_date < instance.start_date:
+        return
+    moving = (
+        WorkerBooking.objects.filter(project=instance, kind='project')
+        .exclude(start_date=instance.start_date, end_date=instance.end_date)
+        .select_related('worker')
+    )
+    clashes = []
+    for booking in moving:
+        try:
+            book_worker(booking.worker, instance.start_date, instance.end_date, replace=booking)
+        except BookingConflict as exc:
+            clashes.extend(exc.conflicts)
+    if clashes:
+        raise BookingConflict(clashes)
+
+
+# ==================== INVALIDATION ====================
+def bookings_changed(*args, **kwargs):
+    """post_save/post_delete of WorkerBooking: drop the indexes once the write is visible"""
+    # Bumping before commit would let another process rebuild from the old rows
+    bump_on_commit(BOOKINGS_SCOPE)
@@ -0,0 +1,386 @@
+import json
+import platform
+import statistics
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+
+from .availability import AvailabilityIndex, free_workers
+from .calendar import calendar_events, occurrence_dates
+from .financials import project_financials
+from .ledger import find_drift, user_totals
+from .ledger_io import LEDGER_COLUMNS
+from .matching import ranked_applicants
+from .models import JobApplication, Payment, Project, RecurringTask, Task, Worker
+from .pagination import KeysetPaginator
+from .querybudget import QueryCounter
+from .replicas import REPLICA
+from .reports import cash_flow_report
+from .search import search
+from .skills import search_workers
+from .stats import get_dashboard_stats
+from .synthetic import OWNER, STAFF, TODAY
+
+
+# A case is slower than its baseline when its median is this much higher...
+DEFAULT_TOLERANCE = 0.25
+# ...and by at least this many milliseconds, so sub-millisecond noise is ignored
+MIN_REGRESSION_MS = 2.0
+
+
+# ==================== SCRATCH DATABASE ====================
+def discard_default():
+    """Close this thread's default connection so the next query reconnects with the current settings"""
+    connections.close_all()
+    try:
+        del connections['default']
+    except AttributeError:
+        pass  # Not connected in this thread
+
+
+@contextmanager
+def scratch_sqlite(path, journal_mode='WAL', synchronous='NORMAL', transaction_mode='IMMEDIATE'):
+    """
+    Point the default alias at a scratch SQLite file, for every thread.
+
+    A configured replica is left out meanwhile, so every read sees the
+    scratch data.
+    """
+    busy_timeout = getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 5000)
+    original = connections.settings['default']
+    replica = connections.settings.pop(REPLICA, None)
+    discard_default()
+    connections.settings['default'] = {
+        **original, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+        'OPTIONS': {
+            'init_command': (f'PRAGMA journal_mode={journal_mode}; PRAGMA synchronous={synchronous}; '
+                             f'PRAGMA busy_timeout={busy_timeout}'),
+            'transaction_mode': transaction_mode,
+        },
+    }
+    try:
+        yield
+    finally:
+        discard_default()
+        connections.settings['default'] = original
+        if replica is not None:
+            connections.settings[REPLICA] = replica
+
+
+@contextmanager
+def postgres_connections(conn_max_age, pool=None):
+    """
+    Run the configured PostgreSQL default alias with this CONN_MAX_AGE and
+    pool, for every thread. The data stays the configured database's; the
+    replica is left out as in scratch_sqlite.
+    """
+    original = connections.settings['default']
+    if original['ENGINE'] != 'django.db.backends.postgresql':
+        raise ValueError('The default database is not PostgreSQL')
+    replica = connections.settings.pop(REPLICA, None)
+    discard_default()
+    options = {name: value for name, value in original.get('OPTIONS', {}).items() if name != 'pool'}
+    if pool:
+        options['pool'] = pool
+    connections.settings['default'] = {**original, 'CONN_MAX_AGE': conn_max_age, 'OPTIONS': options}
+    try:
+        yield
+    finally:
+        connections.close_all()
+        if pool:
+            # The backend keeps pools per alias, past its connections
+            connections['default'].close_pool()
+        discard_default()
+        connections.settings['default'] = original
+        if replica is not None:
+            connections.settings[REPLICA] = replica
+
+
+# ==================== FIXTURES ====================
+@dataclass
+class Fixtures:
+    """Rows of the synthetic data the cases act on"""
+    owner: object
+    staff: object
+    project: object
+    worker: object
+    payment: object
+    task: object
+    rule: object
+    rule_day: object
+    application: object
+    open_project: object
+    today: object
+
+    @classmethod
+    def load(cls):
+        owner = User.objects.get(username=OWNER)
+        staff = User.objects.get(username=STAFF)
+        staff_worker = Worker.objects.get(user=staff)
+        # The owner's project with the most applicants
+        project = Project.objects.filter(user=owner).order_by('-crew_size', 'id').first()
+        application = JobApplication.objects.filter(project__user=owner).order_by('id').first()
+        rule = RecurringTask.objects.filter(user=owner).order_by('id').first()
+        return cls(
+            owner=owner, staff=staff, project=project, worker=staff_worker,
+            payment=Payment.objects.filter(user=owner).order_by('id').first(),
+            task=Task.objects.filter(user=owner).order_by('id').first(),
+            rule=rule,
+            rule_day=next(occurrence_dates(rule, rule.start_date, rule.start_date + timedelta(days=400)), None)
+            if rule else None,
+            application=application,
+            open_project=Project.objects.exclude(job_applications__worker=staff_worker).order_by('id').first(),
+            today=TODAY,
+        )
+
+
+def _ledger_csv(fx):
+    """A small ledger upload with fresh references"""
+    lines = [','.join(LEDGER_COLUMNS)]
+    lines += [f'{fx.today},paid,materials,{100 + i}.00,completed,mpesa,BENCH{i:05d},Cement' for i in range(200)]
+    return SimpleUploadedFile('ledger.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+
+# ==================== CASES ====================
+@dataclass(frozen=True)
+class ViewCase:
+    """One request to a base.urls view; 'anon', 'owner' (a client) or 'staff' (a worker) sends it"""
+    url_name: str
+    as_user: str = 'owner'
+    method: str = 'get'
+    args: Callable = None
+    data: Callable = None
+    # Run in a transaction rolled back after each repeat, so every repeat sees the same rows
+    writes: bool = False
+    content_type: str = None
+
+
+def _window(fx, days=30):
+    return {'start': fx.today.isoformat(), 'end': (fx.today + timedelta(days=days)).isoformat()}
+
+
+VIEW_CASES = [
+    ViewCase('home', as_user='anon'),
+    ViewCase('login_view', as_user='anon'),
+    ViewCase('register', as_user='anon'),
+    ViewCase('staff_login', as_user='anon'),
+    ViewCase('dashboard'),
+    ViewCase('projects'),
+    ViewCase('project_detail', args=lambda fx: [fx.project.pk]),
+    ViewCase('project_matches', args=lambda fx: [fx.project.pk]),
+    ViewCase('delete_project', args=lambda fx: [fx.project.pk], writes=True),
+    ViewCase('workers'),
+    ViewCase('worker_search', data=lambda fx: {'skill': 'plumbing,roofing', 'limit': 50}),
+    ViewCase('available_workers', data=lambda fx: {**_window(fx), 'trade': 'mason'}),
+    ViewCase('worker_conflicts', args=lambda fx: [fx.worker.pk], data=_window),
+    ViewCase('delete_worker', as_user='staff', args=lambda fx: [fx.worker.pk], writes=True),
+    ViewCase('payments'),
+    ViewCase('delete_payment', args=lambda fx: [fx.payment.pk], writes=True),
+    ViewCase('import_payments', method='post', writes=True, data=lambda fx: {'file': _ledger_csv(fx)}),
+    ViewCase('export_payments'),
+    ViewCase('run_payroll', method='post', writes=True, data=lambda fx: {
+        'period_start': (fx.today - timedelta(days=13)).isoformat(), 'period_end': fx.today.isoformat()}),
+    ViewCase('schedule'),
+    ViewCase('delete_task', args=lambda fx: [fx.task.pk], writes=True),
+    ViewCase('complete_task', args=lambda fx: [fx.task.pk], writes=True),
+    ViewCase('calendar_range', data=_window),
+    ViewCase('calendar_feed'),
+    ViewCase('reset_calendar_feed', method='post', writes=True),
+    ViewCase('complete_occurrence', method='post', writes=True,
+             args=lambda fx: [fx.rule.pk, fx.rule_day.isoformat()]),
+    ViewCase('search', data=lambda fx: {'q': 'villa'}),
+    ViewCase('support'),
+    ViewCase('api_list', args=lambda fx: ['payments'], data=lambda fx: {'limit': 100}),
+    ViewCase('api_detail', args=lambda fx: ['projects', fx.project.pk]),
+    ViewCase('staff_portal', as_user='staff'),
+    ViewCase('staff_estimates', as_user='staff'),
+    ViewCase('staff_projects', as_user='staff'),
+    ViewCase('staff_workers', as_user='staff'),
+    ViewCase('staff_materials', as_user='staff'),
+    ViewCase('staff_schedule', as_user='staff'),
+    ViewCase('staff_invoices', as_user='staff'),
+    ViewCase('staff_payments', as_user='staff'),
+    ViewCase('cash_flow', as_user='staff', data=lambda fx: {'format': 'json'}),
+    ViewCase('metrics', as_user='staff'),
+    ViewCase('apply_for_job', as_user='staff', method='post', writes=True, args=lambda fx: [fx.open_project.pk]),
+    ViewCase('respond_to_application', method='post', writes=True, args=lambda fx: [fx.application.pk],
+             data=lambda fx: {'action': 'reject'}),
+    ViewCase('staff_bookings', as_user='staff'),
+    ViewCase('clock_in', as_user='staff', method='post', writes=True),
+    ViewCase('clock_out', as_user='staff', method='post', writes=True),
+    ViewCase('clock_sync', as_user='staff', method='post', writes=True, content_type='application/json',
+             data=lambda fx: {'events': [
+                 {'key': f'bench-{i}', 'worker_id': fx.worker.pk, 'kind': kind,
+                  'timestamp': f'{fx.today - timedelta(days=400)}T{8 + i}:00:00Z'}
+                 for i, kind in enumerate(['in', 'out'])]}),
+]
+# Views left out, and why
+SKIPPED_VIEWS = {
+    'logout': 'ends the session the other cases share',
+}
+
+
+@dataclass(frozen=True)
+class QueryCase:
+    name: str
+    run: Callable
+
+
+QUERY_CASES = [
+    QueryCase('dashboard_stats', lambda fx: get_dashboard_stats(fx.owner, fx.today)),
+    QueryCase('user_totals', lambda fx: user_totals(fx.owner, fx.today)),
+    QueryCase('ledger_drift', lambda fx: find_drift(fx.owner)),
+    QueryCase('payments_first_page', lambda fx: KeysetPaginator(
+        Payment.objects.filter(user=fx.owner), ('-date', '-created_at', 'id')).page(None)),
+    QueryCase('project_financials', lambda fx: project_financials(Project.objects.filter(user=fx.owner))),
+    QueryCase('cash_flow_report', lambda fx: cash_flow_report('month', 'category')),
+    QueryCase('search_workers', lambda fx: search_workers(skills=['plumbing', 'roofing'], limit=50)),
+    QueryCase('ranked_applicants', lambda fx: ranked_applicants(fx.project)),
+    QueryCase('availability_build', lambda fx: AvailabilityIndex.build([])),
+    QueryCase('free_workers', lambda fx: free_workers(fx.today, fx.today + timedelta(days=14), trade='mason')),
+    QueryCase('calendar_month', lambda fx: calendar_events(fx.owner, fx.today, fx.today + timedelta(days=30))),
+    QueryCase('full_text_search', lambda fx: search(fx.owner, 'villa')),
+]
+
+
+def uncovered_views():
+    """URL names in base.urls with neither a case nor a reason to skip them"""
+    from . import urls
+
+    names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern) and pattern.name}
+    return sorted(names - {case.url_name for case in VIEW_CASES} - set(SKIPPED_VIEWS))
+
+
+# ==================== RUNNER ====================
+@contextmanager
+def counting_queries():
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(func, repeat, writes=False):
+    """Timings of repeat calls after one warm-up, and the queries of the last call"""
+    timings, result, queries = [], None, 0
+    for i in range(repeat + 1):
+        with ExitStack() as stack:
+            if writes:
+                stack.enter_context(rolled_back())
+            counter = stack.enter_context(counting_queries())
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        if i:
+            timings.append(elapsed * 1000)
+        queries = counter.count
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': queries,
+    }, result
+
+
+def _request(client, case, fx):
+    url = reverse(case.url_name, args=case.args(fx) if case.args else None)
+
+    def send():
+        # Built per request: an upload can only be read once
+        data = case.data(fx) if case.data else None
+        if case.content_type:
+            response = client.generic(case.method.upper(), url, data=json.dumps(data),
+                                      content_type=case.content_type)
+        else:
+            response = getattr(client, case.method)(url, data)
+        if response.streaming:
+            # Time the whole body, not just the first byte
+            b''.join(response.streaming_content)
+        return response
+    return send
+
+
+def run_suite(repeat=5, only=None):
+    """
+    Time every view case and query case against the current database.
+
+    Returns {case name: {median_ms, min_ms, max_ms, queries[, status]}};
+    case names are 'view:<url name>' and 'orm:<name>'.
+    """
+    fx = Fixtures.load()
+    clients = {'anon': Client(), 'owner': Client(), 'staff': Client()}
+    clients['owner'].force_login(fx.owner)
+    clients['staff'].force_login(fx.staff)
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for case in VIEW_CASES:
+            name = f'view:{case.url_name}'
+            if only and not any(part in name for part in only):
+                continue
+            stats, response = measure(_request(clients[case.as_user], case, fx), repeat, writes=case.writes)
+            results[name] = {**stats, 'status': response.status_code}
+    for case in QUERY_CASES:
+        name = f'orm:{case.name}'
+        if only and not any(part in name for part in only):
+            continue
+        stats, _ = measure(lambda: case.run(fx), repeat)
+        results[name] = stats
+    return results
+
+
+def environment():
+    connection = connections['default']
+    info = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+    }
+    if connection.vendor == 'sqlite':
+        import sqlite3
+        info['sqlite'] = sqlite3.sqlite_version
+    return info
+
+
+# ==================== COMPARISON ====================
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE, min_ms=MIN_REGRESSION_MS):
+    """
+    Regressions of a benchmark report against a baseline report.
+
+    A case regresses when it runs more queries than before, or when its
+    median is more than tolerance slower and by at least min_ms. Cases
+    missing from either report are ignored.
+    """
+    regressions = []
+    for scale, run in current.get('scales', {}).items():
+        before_cases = baseline.get('scales', {}).get(scale, {}).get('cases', {})
+        for name, now in run.get('cases', {}).items():
+            before = before_cases.get(name)
+            if before is None:
+                continue
+            if now['queries'] > before['queries']:
+                regressions.append({'scale': scale, 'case': name, 'metric': 'queries',
+                                    'baseline': before['queries'], 'current': now['queries']})
+            slower = now['median_ms'] - before['median_ms']
+            if slower >= min_ms and now['median_ms'] > before['median_ms'] * (1 + tolerance):
+                regressions.append({'scale': scale, 'case': name, 'metric': 'median_ms',
+                                    'baseline': before['median_ms'], 'current': now['median_ms']})
+    return regressions
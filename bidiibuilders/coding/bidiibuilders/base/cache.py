@@ -0,0 +1,97 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Project, Worker
+
+
+# Bump to orphan every cached entry after a change to what gets cached
+CACHE_VERSION = 1
+
+# Global scopes shared by every user
+WORKERS_SCOPE = 'workers'
+JOBS_SCOPE = 'jobs'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+# ==================== GENERATIONS ====================
+def _generation_key(scope):
+    return f'gen:{scope}'
+
+
+def get_generations(*scopes):
+    """
+    Return the current generation of each scope.
+
+    A scope's generation changes whenever data in it is written, so keys
+    built from it are never reused after a write. Missing generations
+    (first use or eviction) start from the clock so they can't collide
+    with a generation that was evicted.
+    """
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def bump(*scopes):
+    """Invalidate everything cached under the given scopes"""
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_on_commit(*scopes, using=None):
+    """bump() once the writing transaction commits (at once outside one)"""
+    # Bumping before commit would let a concurrent reader cache the old rows
+    # under the new generation, where they'd be served until they expire
+    transaction.on_commit(lambda: bump(*scopes), using=using)
+
+
+# ==================== KEYS ====================
+def make_key(name, *parts, scopes=()):
+    """Versioned cache key for a named fragment, its vary-on parts and scopes"""
+    generations = get_generations(*scopes)
+    tail = ':'.join(str(part) for part in (*parts, *generations))
+    return f'v{CACHE_VERSION}:{name}:{tail}'
+
+
+def cached(name, builder, *parts, scopes=(), timeout=None):
+    """Return the cached value for (name, parts, scopes), building it on a miss"""
+    key = make_key(name, *parts, scopes=scopes)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout or settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
+
+
+# ==================== INVALIDATION ====================
+def invalidate_for_instance(sender, instance, using=None, **kwargs):
+    """post_save/post_delete: bump the scopes a Project/Worker/Payment/Task write affects"""
+    scopes = [user_scope(instance.user_id)]
+    if sender is Worker:
+        scopes.append(WORKERS_SCOPE)
+    elif sender is Project:
+        scopes.append(JOBS_SCOPE)
+    bump_on_commit(*scopes, using=using)
+
+
+def invalidate_for_user(sender, instance, created=True, using=None, **kwargs):
+    """A new or deleted user must not inherit entries cached under a reused id"""
+    # Plain saves (e.g. last_login on every login) don't change cached data
+    if created:
+        bump_on_commit(user_scope(instance.pk), JOBS_SCOPE, using=using)
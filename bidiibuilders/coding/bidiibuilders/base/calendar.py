@@ -0,0 +1,268 @@
+import secrets
+from calendar import monthrange
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import CalendarFeed, RecurringTask, Task
+
+
+# Longest window calendar_events() expands, so open-ended rules stay cheap
+MAX_WINDOW_DAYS = 366
+# The .ics feed carries one-off tasks from this long ago onwards
+FEED_PAST_DAYS = 90
+# Tasks have a start time only; calendars show them this long
+EVENT_DURATION = timedelta(hours=1)
+PRODID = '-//Bidii Builders//Schedule//EN'
+# iCalendar PRIORITY: 1 highest, 9 lowest
+ICS_PRIORITY = {'urgent': 1, 'high': 3, 'medium': 5, 'low': 9}
+
+EVENT_FIELDS = ('id', 'title', 'type', 'time', 'description', 'priority', 'project_id', 'project__name',
+                'updated_at')
+TASK_FIELDS = (*EVENT_FIELDS, 'date', 'completed', 'recurrence_id')
+RULE_FIELDS = (*EVENT_FIELDS, 'frequency', 'interval', 'start_date', 'until')
+
+
+class CalendarError(ValueError):
+    pass
+
+
+# ==================== RECURRENCE ====================
+def _month_offset(first, later):
+    return (later.year - first.year) * 12 + later.month - first.month
+
+
+def occurrence_dates(rule, start, end):
+    """
+    Lazily yield the dates a rule (RecurringTask or dict of RULE_FIELDS)
+    falls on between start and end, inclusive.
+
+    Jumps straight to the first step on or after start, so the cost is the
+    number of dates yielded, not the rule's age. Monthly rules skip months
+    too short for their day, as iCalendar does.
+    """
+    get = rule.get if isinstance(rule, dict) else rule.__getattribute__
+    first, step, until = get('start_date'), get('interval'), get('until')
+    last = min(end, until) if until else end
+    if last < max(first, start):
+        return
+    frequency = get('frequency')
+    if frequency in ('daily', 'weekly'):
+        days = step * (7 if frequency == 'weekly' else 1)
+        # Ceiling division: the first step landing on or after start
+        day = first + timedelta(days=max(0, -(-(start - first).days // days)) * days)
+        while day <= last:
+            yield day
+            day += timedelta(days=days)
+        return
+
+    n = max(0, _month_offset(first, start) // step)
+    while True:
+        year, month = divmod(first.month - 1 + n * step, 12)
+        year, month = first.year + year, month + 1
+        if date(year, month, 1) > last:
+            return
+        if first.day <= monthrange(year, month)[1]:
+            day = date(year, month, first.day)
+            if day >= start:
+                yield day
+        n += 1
+
+
+# ==================== RANGE QUERY ====================
+def _event(row, day, completed=False, recurrence_id=None, task_id=None):
+    return {
+        'id': f'task-{task_id}' if task_id else f'recurring-{recurrence_id}-{day.isoformat()}',
+        'task_id': task_id,
+        'recurrence_id': recurrence_id,
+        'title': row['title'],
+        'type': row['type'],
+        'priority': row['priority'],
+        'date': day,
+        'time': row['time'],
+        'project_id': row['project_id'],
+        'project': row['project__name'],
+        'completed': completed,
+    }
+
+
+def calendar_events(user, start, end):
+    """
+    A user's tasks and recurring-task occurrences from start to end,
+    ordered by date and time. Two queries, whatever the window holds.
+
+    Stored occurrences (a completed one, say) replace the expanded ones.
+    """
+    if end < start:
+        raise CalendarError('end is before start')
+    if (end - start).days >= MAX_WINDOW_DAYS:
+        raise CalendarError(f'The window can be at most {MAX_WINDOW_DAYS} days')
+
+    tasks = Task.objects.filter(user=user, date__gte=start, date__lte=end).values(*TASK_FIELDS)
+    rules = RecurringTask.objects.filter(
+        Q(until__isnull=True) | Q(until__gte=start), user=user, start_date__lte=end,
+    ).values(*RULE_FIELDS)
+
+    events, stored = [], set()
+    for task in tasks:
+        events.append(_event(task, task['date'], task['completed'], task['recurrence_id'], task['id']))
+        if task['recurrence_id']:
+            stored.add((task['recurrence_id'], task['date']))
+    for rule in rules:
+        events.extend(
+            _event(rule, day, recurrence_id=rule['id'])
+            for day in occurrence_dates(rule, start, end) if (rule['id'], day) not in stored
+        )
+    events.sort(key=lambda event: (event['date'], event['time'], event['title']))
+    return events
+
+
+def store_occurrence(rule, day, **changes):
+    """The Task standing in for the rule's occurrence on day, created on first change"""
+    if day not in occurrence_dates(rule, day, day):
+        raise CalendarError(f'{rule.title} does not occur on {day}')
+    task, _ = Task.objects.update_or_create(
+        recurrence=rule, date=day,
+        defaults=changes,
+        create_defaults={
+            'user_id': rule.user_id, 'title': rule.title, 'type': rule.type, 'time': rule.time,
+            'description': rule.description, 'project_id': rule.project_id, 'priority': rule.priority,
+            **changes,
+        },
+    )
+    return task
+
+
+# ==================== ICALENDAR FEED ====================
+def _new_feed_key():
+    return secrets.token_urlsafe(32)
+
+
+def feed_token(user):
+    """Token that lets a calendar app, which can't log in, fetch the user's feed"""
+    feed, _ = CalendarFeed.objects.get_or_create(user=user, defaults={'key': _new_feed_key()})
+    return feed.key
+
+
+def reset_feed_token(user):
+    """Revoke the user's feed URL; returns the new token"""
+    feed, _ = CalendarFeed.objects.update_or_create(user=user, defaults={'key': _new_feed_key()})
+    return feed.key
+
+
+def feed_user(token):
+    feed = CalendarFeed.objects.select_related('user').filter(key=token, user__is_active=True).first()
+    return feed.user if feed else None
+
+
+def _feed_start():
+    return timezone.localdate() - timedelta(days=FEED_PAST_DAYS)
+
+
+def feed_tasks(user):
+    return Task.objects.filter(user=user, date__gte=_feed_start())
+
+
+def feed_rules(user):
+    return RecurringTask.objects.filter(Q(until__isnull=True) | Q(until__gte=_feed_start()), user=user)
+
+
+def feed_validators(user):
+    """(ETag parts, last modified) of a user's feed, from one aggregate per table"""
+    parts, newest = [], None
+    for queryset in (feed_tasks(user), feed_rules(user)):
+        # Events carry their project's name as LOCATION, so a renamed project changes the feed
+        state = queryset.order_by().aggregate(last=Max('updated_at'), count=Count('id'),
+                                              project=Max('project__updated_at'))
+        parts += [state['last'], state['count'], state['project']]
+        for changed in (state['last'], state['project']):
+            if changed and (newest is None or changed > newest):
+                newest = changed
+    # The window moves daily
+    return [_feed_start(), *parts], newest
+
+
+def _escape(text):
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Split a content line into 75-octet pieces, as RFC 5545 requires"""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + '\r\n'
+    pieces, piece = [], b''
+    for char in line:
+        encoded = char.encode()
+        if len(piece) + len(encoded) > (75 if not pieces else 74):
+            pieces.append(piece.decode())
+            piece = b''
+        piece += encoded
+    pieces.append(piece.decode())
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _local(day, at):
+    # Tasks are wall-clock times on site, so they are written as floating times
+    return datetime.combine(day, at or time()).strftime('%Y%m%dT%H%M%S')
+
+
+def _utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(row, uid, day, extra=()):
+    start = datetime.combine(day, row['time'] or time())
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{_utc(row["updated_at"])}',
+        f'LAST-MODIFIED:{_utc(row["updated_at"])}',
+        f'DTSTART:{_local(day, row["time"])}',
+        f'DTEND:{(start + EVENT_DURATION).strftime("%Y%m%dT%H%M%S")}',
+        f'SUMMARY:{_escape(row["title"])}',
+        f'CATEGORIES:{_escape(row["type"])}',
+        f'PRIORITY:{ICS_PRIORITY.get(row["priority"], 0)}',
+        *extra,
+    ]
+    if row['project__name']:
+        lines.append(f'LOCATION:{_escape(row["project__name"])}')
+    if row['description']:
+        lines.append(f'DESCRIPTION:{_escape(row["description"])}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def _rrule(rule):
+    parts = [f'FREQ={rule["frequency"].upper()}', f'INTERVAL={rule["interval"]}']
+    if rule['until']:
+        parts.append(f'UNTIL={rule["until"].strftime("%Y%m%d")}T235959')
+    return 'RRULE:' + ';'.join(parts)
+
+
+def ics_chunks(user, host):
+    """
+    The user's feed as an iterable of text chunks, one per event, for a
+    streaming response. Rows are read in chunks rather than all at once.
+
+    Recurring tasks go out once with an RRULE for the calendar app to
+    expand; stored occurrences override theirs via RECURRENCE-ID.
+    """
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(user.get_full_name() or user.username)} - Schedule',
+    ))
+    for rule in feed_rules(user).order_by('id').values(*RULE_FIELDS).iterator(chunk_size=500):
+        yield _vevent(rule, f'recurring-{rule["id"]}@{host}', rule['start_date'], [_rrule(rule)])
+    tasks = feed_tasks(user).order_by('date', 'time', 'id').values(*TASK_FIELDS, 'recurrence__time')
+    for task in tasks.iterator(chunk_size=500):
+        extra = ['X-BIDII-COMPLETED:TRUE'] if task['completed'] else []
+        if task['recurrence_id']:
+            # Identifies the occurrence by its original start, even if the copy was moved to another time
+            extra.append(f'RECURRENCE-ID:{_local(task["date"], task["recurrence__time"])}')
+            yield _vevent(task, f'recurring-{task["recurrence_id"]}@{host}', task['date'], extra)
+        else:
+            yield _vevent(task, f'task-{task["id"]}@{host}', task['date'], extra)
+    yield _fold('END:VCALENDAR')
@@ -0,0 +1,41 @@
+from django.utils.dateparse import parse_date
+
+from .models import Payment
+
+
+PAYMENT_CHOICE_FILTERS = {
+    'type': Payment.PAYMENT_TYPE_CHOICES,
+    'category': Payment.CATEGORY_CHOICES,
+    'status': Payment.STATUS_CHOICES,
+    'method': Payment.PAYMENT_METHOD_CHOICES,
+}
+
+
+def filter_payments(queryset, params):
+    """
+    Apply the ledger filters from a GET QueryDict.
+
+    Supports type, category, status, method and a date_from/date_to range.
+    Unknown choices and malformed dates are ignored. Returns the filtered
+    queryset and a dict of the filters that were applied.
+    """
+    applied = {}
+    for param, choices in PAYMENT_CHOICE_FILTERS.items():
+        value = params.get(param, '')
+        if value in dict(choices):
+            applied[param] = value
+
+    for param in ('date_from', 'date_to'):
+        try:
+            value = parse_date(params.get(param, ''))
+        except ValueError:
+            value = None
+        if value:
+            applied[param] = value
+
+    lookups = {
+        'type': 'type', 'category': 'category', 'status': 'status', 'method': 'payment_method',
+        'date_from': 'date__gte', 'date_to': 'date__lte',
+    }
+    queryset = queryset.filter(**{lookups[key]: value for key, value in applied.items()})
+    return queryset, applied
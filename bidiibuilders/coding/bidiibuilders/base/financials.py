@@ -0,0 +1,367 @@
+import threading
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from itertools import groupby
+from operator import itemgetter, or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Payment, ProjectCost, TimeLog
+from .payroll import CENT, ZERO, overtime_multiplier, standard_day_hours
+
+
+# Expense categories of Payment that count as project spend; wages are
+# accrued from time logs instead, so worker_wages payments are not counted
+PAYMENT_COST_CATEGORIES = ('materials', 'equipment', 'transport')
+WAGES = 'wages'
+BURN_RATE_DAYS = 30
+
+
+# ==================== COST KEYS ====================
+def payment_cost(payment):
+    """Return ((project_id, date, category), amount) of a payment, or None if it isn't project spend"""
+    if (not payment.project_id or payment.type != 'paid' or payment.status == 'cancelled'
+            or payment.category not in PAYMENT_COST_CATEGORIES):
+        return None
+    date = Payment._meta.get_field('date').to_python(payment.date)
+    return (payment.project_id, date, payment.category), Decimal(payment.amount)
+
+
+def _log_date(log):
+    return TimeLog._meta.get_field('date').to_python(log.date)
+
+
+def _costed(log):
+    return log is not None and log.project_id and log.hours_worked is not None
+
+
+def wage_rows(logs):
+    """
+    (worker_id, date, owner_id, project_id, hours, rate) of closed logs, in
+    worker-day order; logs closed before they stored a rate use the worker's
+    """
+    return logs.filter(project__isnull=False, hours_worked__isnull=False).order_by(
+        'worker_id', 'date', 'project__user_id',
+    ).values_list('worker_id', 'date', 'project__user_id', 'project_id', 'hours_worked',
+                  Coalesce('daily_rate', 'worker__daily_rate'))
+
+
+def day_wages(rows):
+    """
+    Price wage_rows() into {(project_id, date, 'wages'): amount}.
+
+    As in payroll, overtime is counted per worker-day across one owner's
+    projects and shared between them in proportion to their hours; each
+    shift is priced at its own rate. Amounts are rounded per worker-day and
+    project, so re-pricing a single day reproduces its share exactly.
+    """
+    standard, premium = standard_day_hours(), overtime_multiplier() - 1
+    costs = defaultdict(Decimal)
+    for (_, date, _), day in groupby(rows, key=itemgetter(0, 1, 2)):
+        day = list(day)
+        total = sum(Decimal(hours) for *_, hours, _ in day)
+        share = max(total - standard, ZERO) / total if total else ZERO
+        amounts = defaultdict(Decimal)
+        for *_, project_id, hours, rate in day:
+            hours = Decimal(hours)
+            amounts[project_id] += Decimal(rate or ZERO) / standard * (hours + hours * share * premium)
+        for project_id, amount in amounts.items():
+            costs[(project_id, date, WAGES)] += amount.quantize(CENT)
+    return costs
+
+
+def day_costs(days, exclude=()):
+    """Wage costs of the given (worker_id, date) pairs, leaving out the excluded log ids"""
+    if not days:
+        return {}
+    logs = TimeLog.objects.filter(reduce(or_, (Q(worker_id=worker_id, date=date) for worker_id, date in days)))
+    return day_wages(wage_rows(logs.exclude(pk__in=exclude)))
+
+
+def cost_changes(before, after):
+    """(key, delta) pairs turning the before costs into the after costs"""
+    return ((key, after.get(key, ZERO) - before.get(key, ZERO)) for key in before.keys() | after.keys())
+
+
+def apply_cost(key, amount, create=True):
+    """Add amount to one cost bucket, creating it if needed (and create is true)"""
+    if not amount:
+        return
+    project_id, date, category = key
+    fields = {'project_id': project_id, 'date': date, 'category': category}
+    with transaction.atomic():
+        if ProjectCost.objects.filter(**fields).update(amount=F('amount') + amount) or not create:
+            return
+        try:
+            with transaction.atomic():
+                ProjectCost.objects.create(amount=amount, **fields)
+        except IntegrityError:
+            # Another writer created the bucket first
+            ProjectCost.objects.filter(**fields).update(amount=F('amount') + amount)
+
+
+def apply_costs(costs, sign=1, create=True):
+    """Fold (key, amount) pairs into the cost table, one write per bucket"""
+    deltas = defaultdict(Decimal)
+    for cost in costs:
+        if cost is not None:
+            key, amount = cost
+            deltas[key] += amount * sign
+    for key, amount in deltas.items():
+        apply_cost(key, amount, create)
+
+
+def record_time_logs(logs):
+    """
+    Accrue the wages of time logs closed without signals.
+
+    clock_out and the offline sync close shifts with update()/bulk_update(),
+    so they call this with the logs they closed. Their worker-days are
+    priced with and without them, and the difference is applied.
+    """
+    logs = [log for log in logs if _costed(log)]
+    if not logs:
+        return
+    days = {(log.worker_id, _log_date(log)) for log in logs}
+    before = day_costs(days, exclude=[log.pk for log in logs])
+    apply_costs(cost_changes(before, day_costs(days)))
+
+
+# ==================== SIGNAL HANDLERS ====================
+def remember_previous_cost(sender, instance, raw=False, **kwargs):
+    """pre_save (Payment): stash the cost the stored row contributes so post_save can replace it"""
+    instance._cost_previous = None
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._cost_previous = payment_cost(previous)
+
+
+def cost_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_costs([getattr(instance, '_cost_previous', None)], sign=-1)
+    apply_costs([payment_cost(instance)])
+    instance._cost_previous = None
+
+
+def cost_deleted(sender, instance, **kwargs):
+    # Deletes only take cost away; never create a bucket, which could
+    # belong to a project the same cascade has removed
+    apply_costs([payment_cost(instance)], sign=-1, create=False)
+
+
+def _log_days(sender, instance):
+    """The (worker_id, date) pairs a write to the log re-prices; open shifts cost nothing"""
+    previous = None
+    if instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).only(
+            'worker_id', 'project_id', 'date', 'hours_worked').first()
+    return {(log.worker_id, _log_date(log)) for log in (previous, instance) if _costed(log)}
+
+
+def remember_previous_days(sender, instance, raw=False, **kwargs):
+    """pre_save (TimeLog): price the log's worker-days before the write"""
+    instance._cost_days = None
+    if raw:
+        return
+    days = _log_days(sender, instance)
+    if days:
+        instance._cost_days = (days, day_costs(days))
+
+
+def days_saved(sender, instance, raw=False, **kwargs):
+    """post_save (TimeLog): apply how the log's worker-days were re-priced"""
+    if raw or not getattr(instance, '_cost_days', None):
+        return
+    days, before = instance._cost_days
+    instance._cost_days = None
+    apply_costs(cost_changes(before, day_costs(days)))
+
+
+# Worker-days priced before a delete, for the delete call (its origin) in
+# progress. Deleting several logs (a queryset, a cascade) sends every
+# pre_delete before any row goes, so a day shared by the logs is priced
+# once and re-priced by the first post_delete. A delete that raised in
+# between leaves nothing behind for the next call.
+_deleting = threading.local()
+
+
+def _pending_days(origin, fresh=False):
+    if fresh or getattr(_deleting, 'origin', None) is not origin:
+        _deleting.origin, _deleting.days = origin, {}
+    return _deleting.days
+
+
+def remember_deleted_days(sender, instance, origin=None, **kwargs):
+    """pre_delete (TimeLog)"""
+    # A log deleted on its own is always a new call, even when retried
+    pending = _pending_days(origin, fresh=origin is instance)
+    instance._cost_deleted_days = {(instance.worker_id, _log_date(instance))} if _costed(instance) else ()
+    days = frozenset(day for day in instance._cost_deleted_days if day not in pending)
+    if days:
+        pending.update(dict.fromkeys(days, (days, day_costs(days))))
+
+
+def days_deleted(sender, instance, origin=None, **kwargs):
+    """post_delete (TimeLog)"""
+    pending = _pending_days(origin)
+    for day in getattr(instance, '_cost_deleted_days', ()):
+        if day in pending:
+            days, before = pending[day]
+            for priced in days:
+                del pending[priced]
+            # A cascade from the project may have removed its buckets already
+            apply_costs(cost_changes(before, day_costs(days)), create=False)
+    instance._cost_deleted_days = ()
+    if not pending:
+        _deleting.origin = None
+
+
+# ==================== SUMMARIES ====================
+@dataclass(frozen=True)
+class ProjectFinancials:
+    budget: Decimal
+    wages: Decimal
+    materials: Decimal
+    equipment: Decimal
+    transport: Decimal
+
+    @property
+    def spent(self):
+        return self.wages + self.materials + self.equipment + self.transport
+
+    @property
+    def remaining(self):
+        return self.budget - self.spent
+
+    @property
+    def burn_percent(self):
+        if not self.budget:
+            return 0
+        return round(float(self.spent / self.budget * 100), 1)
+
+    @property
+    def over_budget(self):
+        return self.spent > self.budget
+
+    def as_dict(self):
+        data = {key: str(value) for key, value in asdict(self).items()}
+        data.update(spent=str(self.spent), remaining=str(self.remaining),
+                    burn_percent=self.burn_percent, over_budget=self.over_budget)
+        return data
+
+
+def project_financials(projects):
+    """Budget vs. actual for each project, from the cost table in one query"""
+    budgets = {project.pk: project.budget for project in projects}
+    totals = {
+        row['project_id']: row for row in
+        ProjectCost.objects.filter(project_id__in=budgets).order_by().values('project_id').annotate(**{
+            category: Sum('amount', filter=Q(category=category))
+            for category, _ in ProjectCost.CATEGORY_CHOICES
+        })
+    }
+    return {
+        project_id: ProjectFinancials(budget=Decimal(budget), **{
+            category: Decimal(totals.get(project_id, {}).get(category) or ZERO).quantize(CENT)
+            for category, _ in ProjectCost.CATEGORY_CHOICES
+        })
+        for project_id, budget in budgets.items()
+    }
+
+
+def burn_down(project, today):
+    """
+    Daily cumulative spend against the budget, plus the recent burn rate.
+
+    The burn rate is the average daily spend over the last BURN_RATE_DAYS
+    days; at that rate the remaining budget runs out on projected_exhaustion
+    (None when nothing is being spent or the budget is already gone).
+    """
+    rows = (
+        project.costs.order_by(F('date').asc(nulls_first=True)).values('date')
+        .annotate(spent=Sum('amount'))
+    )
+    budget = Decimal(project.budget)
+    cumulative = ZERO
+    recent = ZERO
+    since = today - timedelta(days=BURN_RATE_DAYS)
+    series = []
+    for row in rows:
+        spent = Decimal(row['spent']).quantize(CENT)
+        cumulative += spent
+        if row['date'] and since < row['date'] <= today:
+            recent += spent
+        series.append({'date': row['date'].isoformat() if row['date'] else None, 'spent': str(spent),
+                       'cumulative': str(cumulative), 'remaining': str(budget - cumulative)})
+
+    burn_rate = (recent / BURN_RATE_DAYS).quantize(CENT)
+    remaining = budget - cumulative
+    projected = None
+    if burn_rate > 0 and remaining > 0:
+        projected = (today + timedelta(days=int(remaining / burn_rate))).isoformat()
+    return {'series': series, 'burn_rate': str(burn_rate), 'projected_exhaustion': projected}
+
+
+# ==================== REBUILD / DRIFT ====================
+def computed_costs(project=None):
+    """Recompute {(project_id, date, category): amount} from Payment and TimeLog"""
+    payments = Payment.objects.filter(project__isnull=False, type='paid',
+                                      category__in=PAYMENT_COST_CATEGORIES).exclude(status='cancelled')
+    logs = TimeLog.objects.filter(project__isnull=False, hours_worked__isnull=False)
+    if project is not None:
+        payments = payments.filter(project=project)
+        logs = logs.filter(project=project)
+
+    costs = defaultdict(Decimal)
+    for row in payments.order_by().values('project_id', 'date', 'category').annotate(total=Sum('amount')):
+        costs[(row['project_id'], row['date'], row['category'])] += Decimal(row['total'])
+    # Overtime depends on the whole worker-day, so a project's wages are
+    # priced from every log its owner's projects have on those days
+    if project is not None:
+        logs = TimeLog.objects.filter(project__user_id=project.user_id, worker_id__in=logs.values('worker_id'))
+    for key, amount in day_wages(wage_rows(logs).iterator(chunk_size=5000)).items():
+        if project is None or key[0] == project.pk:
+            costs[key] += amount
+    return {key: amount.quantize(CENT) for key, amount in costs.items() if amount}
+
+
+def stored_costs(project=None):
+    costs = ProjectCost.objects.all()
+    if project is not None:
+        costs = costs.filter(project=project)
+    return {(c.project_id, c.date, c.category): c.amount for c in costs}
+
+
+def find_cost_drift(project=None):
+    """Return [(key, stored, expected)] for every bucket that disagrees with its sources"""
+    expected = computed_costs(project)
+    stored = stored_costs(project)
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, have = expected.get(key, ZERO), stored.get(key, ZERO)
+        if Decimal(want) != Decimal(have):
+            drift.append((key, have, want))
+    return drift
+
+
+@transaction.atomic
+def rebuild_project_costs(project=None):
+    """Recompute the cost table from scratch; returns the number of buckets"""
+    costs = ProjectCost.objects.all()
+    if project is not None:
+        costs = costs.filter(project=project)
+    costs.delete()
+    rows = [
+        ProjectCost(project_id=project_id, date=date, category=category, amount=amount)
+        for (project_id, date, category), amount in computed_costs(project).items()
+    ]
+    ProjectCost.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,244 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import slowqueries
+from .models import BackgroundJob
+
+
+logger = logging.getLogger(__name__)
+
+# Retry n waits RETRY_BASE * 2**(n-1), up to MAX_RETRY_DELAY
+RETRY_BASE = timedelta(seconds=10)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# A job still running after this long lost its worker and is handed out again
+LOCK_TIMEOUT = timedelta(minutes=10)
+# Finished jobs are kept this long for inspection
+DONE_RETENTION = timedelta(days=7)
+# How often a worker looks for stale jobs and purges finished ones
+MAINTENANCE_INTERVAL = timedelta(minutes=1)
+# Serializes claims on PostgreSQL so per-job concurrency limits hold across workers
+CLAIM_LOCK_ID = 718_2025
+CLAIM_ORDER = ('-priority', 'run_at', 'id')
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    func: Callable
+    priority: int = 0
+    max_attempts: int = 3
+    # Copies of this job allowed to run at once across all workers (0 = no limit)
+    concurrency: int = 0
+
+
+REGISTRY = {}
+
+
+def job(name=None, priority=0, max_attempts=3, concurrency=0):
+    """Register a function as a background job; it is called with the payload as keyword arguments"""
+    def decorator(func):
+        job_type = JobType(name or func.__name__, func, priority, max_attempts, concurrency)
+        REGISTRY[job_type.name] = job_type
+        func.job_type = job_type
+        return func
+    return decorator
+
+
+def _job_type(name):
+    name = getattr(getattr(name, 'job_type', None), 'name', name)
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown job '{name}'")
+
+
+# ==================== ENQUEUE ====================
+def enqueue(name, payload=None, priority=None, delay=None, unique_key=''):
+    """
+    Queue a job (by name or decorated function) and return its row.
+
+    The row is written in the caller's transaction: queued inside the
+    atomic() block of the writes it follows, the job is rolled back with
+    them and never runs. With unique_key, a job of the same name
+    and key that is still waiting is returned instead of queueing another.
+    """
+    job_type = _job_type(name)
+    if unique_key:
+        waiting = BackgroundJob.objects.filter(name=job_type.name, unique_key=unique_key, status='queued').first()
+        if waiting is not None:
+            return waiting
+    return BackgroundJob.objects.create(
+        name=job_type.name, payload=payload or {}, unique_key=unique_key,
+        priority=job_type.priority if priority is None else priority,
+        max_attempts=job_type.max_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+# ==================== CLAIM / RUN ====================
+def requeue_stale(now):
+    """Hand out again the jobs of workers that died mid-run, or fail them if out of attempts"""
+    stale = BackgroundJob.objects.filter(status='running', locked_at__lt=now - LOCK_TIMEOUT)
+    fields = {'locked_by': '', 'locked_at': None, 'last_error': 'Worker lost while running', 'updated_at': now}
+    stale.filter(attempts__lt=F('max_attempts')).update(status='queued', run_at=now, **fields)
+    stale.update(status='failed', finished_at=now, **fields)
+
+
+@transaction.atomic
+def claim(worker, limit, now=None):
+    """
+    Mark up to limit due jobs as running under this worker and return them.
+
+    Honours each job type's concurrency limit against the jobs already
+    running. One short transaction per batch: SQLite serializes it on the
+    write lock, PostgreSQL on an advisory lock.
+    """
+    now = now or timezone.now()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK_ID])
+
+    limits = {name: job_type.concurrency for name, job_type in REGISTRY.items() if job_type.concurrency}
+    running = dict(
+        BackgroundJob.objects.filter(status='running', name__in=limits).order_by()
+        .values_list('name').annotate(Count('id'))
+    ) if limits else {}
+    candidates = (
+        BackgroundJob.objects.filter(status='queued', run_at__lte=now).order_by(*CLAIM_ORDER)
+        .values_list('id', 'name')
+    )
+    if limits:
+        # Leave out job types already at their limit; the rest is checked per row below
+        full = [name for name, limit_ in limits.items() if running.get(name, 0) >= limit_]
+        candidates = candidates.exclude(name__in=full)
+
+    ids = []
+    for job_id, name in candidates[:limit * 4 if limits else limit]:
+        if name in limits:
+            if running.get(name, 0) >= limits[name]:
+                continue
+            running[name] = running.get(name, 0) + 1
+        ids.append(job_id)
+        if len(ids) == limit:
+            break
+    if not ids:
+        return []
+    BackgroundJob.objects.filter(id__in=ids).update(
+        status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1, updated_at=now,
+    )
+    return list(BackgroundJob.objects.filter(id__in=ids).order_by(*CLAIM_ORDER))
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome; returns the new status"""
+    close_old_connections()
+    try:
+        _job_type(job.name).func(**job.payload)
+    except Exception as e:
+        now = timezone.now()
+        error = ''.join(traceback.format_exception(e))[-4000:]
+        mine = BackgroundJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by)
+        if job.attempts >= job.max_attempts:
+            logger.error('Job %s #%s failed for good: %s', job.name, job.pk, e)
+            status, fields = 'failed', {'finished_at': now}
+        else:
+            logger.warning('Job %s #%s failed (attempt %s), retrying: %s', job.name, job.pk, job.attempts, e)
+            status, fields = 'queued', {'run_at': now + retry_delay(job.attempts)}
+        mine.update(status=status, locked_by='', locked_at=None, last_error=error, updated_at=now, **fields)
+    else:
+        now = timezone.now()
+        status = 'done'
+        # A job reclaimed after LOCK_TIMEOUT belongs to the other worker now
+        BackgroundJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+            status=status, finished_at=now, updated_at=now, last_error='',
+        )
+    finally:
+        # Slow queries the job ran in autocommit wait for a flush
+        slowqueries.flush()
+        close_old_connections()
+    return status
+
+
+def purge_finished(before):
+    """Delete jobs that finished successfully before the given time"""
+    deleted, _ = BackgroundJob.objects.filter(status='done', finished_at__lt=before).delete()
+    return deleted
+
+
+# ==================== WORKER ====================
+class JobWorker:
+    """
+    Claim and run jobs on a pool of threads.
+
+    At most concurrency jobs run at once in this process. Jobs are claimed
+    in batches of at least concurrency, keeping up to one batch waiting
+    behind the running jobs so the threads never idle on a claim. Job
+    types' own concurrency limits count claimed jobs and apply across every
+    worker process.
+    """
+
+    def __init__(self, concurrency=4, poll_interval=1.0, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.stats = {'done': 0, 'retried': 0, 'failed': 0}
+        self.last_maintenance = None
+
+    def _record(self, future):
+        try:
+            status = future.result()
+        except Exception:
+            # Recording the outcome failed; LOCK_TIMEOUT will hand the job out again
+            logger.exception('Lost track of a job')
+            status = 'failed'
+        self.stats['retried' if status == 'queued' else status] += 1
+
+    def maintain(self):
+        now = timezone.now()
+        if self.last_maintenance is None or now - self.last_maintenance > MAINTENANCE_INTERVAL:
+            requeue_stale(now)
+            purge_finished(now - DONE_RETENTION)
+            self.last_maintenance = now
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, burst=False):
+        """Work until stop() is called; with burst, return once no job is due"""
+        in_hand = set()
+        capacity = 2 * self.concurrency
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                self.maintain()
+                free = capacity - len(in_hand)
+                jobs = claim(self.name, free) if free >= self.concurrency else []
+                in_hand.update(pool.submit(run_job, job) for job in jobs)
+                if not in_hand:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                done, _ = wait(in_hand, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_hand.discard(future)
+                    self._record(future)
+            for future in wait(in_hand).done:
+                self._record(future)
+        close_old_connections()
+        return self.stats
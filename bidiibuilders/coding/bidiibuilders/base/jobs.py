@@ -0,0 +1,67 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, send_mail
+
+from .jobqueue import job
+from .ledger import find_drift, rebuild_rollups
+from .matching import refresh_project, refresh_worker
+from .models import JobApplication, Project, Worker
+from .reports import cash_flow_report
+
+
+# Mail servers are slow and rate limited; a couple at a time is plenty
+@job(priority=5, max_attempts=5, concurrency=2)
+def notify_application(application_id, event):
+    """Email the other side of a job application: the client on 'applied', the worker on a response"""
+    application = (
+        JobApplication.objects.select_related('worker__user', 'project__user')
+        .filter(pk=application_id).first()
+    )
+    if application is None:
+        return  # Withdrawn since
+    worker, project = application.worker, application.project
+    if event == 'applied':
+        recipient = project.user.email
+        subject = f'New application for {project.name}'
+        body = f'{worker.name} ({worker.get_role_display()}) applied for {project.name}.'
+    else:
+        recipient = worker.user.email
+        subject = f'Your application for {project.name} was {application.status}'
+        body = f'{project.name}: {application.get_status_display()}.\n\n{application.notes or ""}'.rstrip()
+    if recipient:
+        send_mail(subject, body, None, [recipient])
+
+
+@job(priority=-5)
+def reconcile_ledger(user_id):
+    """Rebuild a user's payment rollups if they drifted from the payments"""
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None and find_drift(user):
+        rebuild_rollups(user)
+
+
+@job(priority=-1)
+def refresh_match_scores(project_id=None, worker_id=None):
+    """Recompute cached applicant scores after a project, worker or application changed"""
+    if project_id is not None:
+        project = Project.objects.filter(pk=project_id).first()
+        if project is not None:
+            refresh_project(project)
+    if worker_id is not None:
+        worker = Worker.objects.filter(pk=worker_id).first()
+        if worker is not None:
+            refresh_worker(worker)
+
+
+@job(max_attempts=2, concurrency=1)
+def email_cash_flow_report(user_id, period='month', group_by=None, date_from=None, date_to=None):
+    """Build the cash-flow report and email it to the staff user who asked for it as CSV"""
+    user = User.objects.get(pk=user_id)
+    report = cash_flow_report(period, group_by,
+                              date.fromisoformat(date_from) if date_from else None,
+                              date.fromisoformat(date_to) if date_to else None)
+    message = EmailMessage(f'Cash flow by {report.period} and {report.group_by}',
+                           'The requested cash-flow report is attached.', None, [user.email])
+    message.attach(f'cash-flow-{report.period}-{report.group_by}.csv', ''.join(report.csv_lines()), 'text/csv')
+    message.send()
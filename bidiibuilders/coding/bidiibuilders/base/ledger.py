@@ -0,0 +1,175 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .cache import bump_on_commit, user_scope
+from .models import Payment, PaymentRollup
+
+
+# ==================== ROLLUP KEYS ====================
+def rollup_key(payment):
+    """Return the (user_id, year, month, type, status, category) bucket of a payment"""
+    # Views assign raw POST strings; the field only converts them on reload
+    date = Payment._meta.get_field('date').to_python(payment.date)
+    year = date.year if date else 0
+    month = date.month if date else 0
+    return (payment.user_id, year, month, payment.type, payment.status, payment.category)
+
+
+def _key_filter(key):
+    user_id, year, month, type_, status, category = key
+    return {'user_id': user_id, 'year': year, 'month': month,
+            'type': type_, 'status': status, 'category': category}
+
+
+def apply_delta(key, amount, count, create=True):
+    """Add amount/count to one rollup bucket, creating it if needed (and create is true)"""
+    if not amount and not count:
+        return
+    fields = _key_filter(key)
+    with transaction.atomic():
+        updated = PaymentRollup.objects.filter(**fields).update(
+            total=F('total') + amount, count=F('count') + count
+        )
+        if updated or not create:
+            return
+        try:
+            with transaction.atomic():
+                PaymentRollup.objects.create(total=amount, count=count, **fields)
+        except IntegrityError:
+            # Another writer created the bucket first
+            PaymentRollup.objects.filter(**fields).update(
+                total=F('total') + amount, count=F('count') + count
+            )
+
+
+def apply_payments(payments, sign=1):
+    """
+    Fold a batch of payments into the rollup table.
+
+    Signals do not fire for bulk_create, so bulk writers call this with the
+    created rows (sign=1) or removed rows (sign=-1). One write per bucket.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for payment in payments:
+        delta = deltas[rollup_key(payment)]
+        delta[0] += Decimal(payment.amount) * sign
+        delta[1] += sign
+    for key, (amount, count) in deltas.items():
+        apply_delta(key, amount, count)
+    # bulk writes skip the post_save cache invalidation too
+    bump_on_commit(*{user_scope(key[0]) for key in deltas})
+
+
+# ==================== SIGNAL HANDLERS ====================
+def remember_previous(sender, instance, raw=False, **kwargs):
+    """pre_save: stash the stored bucket and amount so post_save can move them"""
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    previous = Payment.objects.filter(pk=instance.pk).values(
+        'user_id', 'date', 'type', 'status', 'category', 'amount'
+    ).first()
+    if previous:
+        date = previous['date']
+        key = (previous['user_id'], date.year if date else 0, date.month if date else 0,
+               previous['type'], previous['status'], previous['category'])
+        instance._rollup_previous = (key, previous['amount'])
+
+
+def payment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    key = rollup_key(instance)
+    amount = Decimal(instance.amount)
+    if previous is None:
+        apply_delta(key, amount, 1)
+    elif previous[0] == key:
+        apply_delta(key, amount - previous[1], 0)
+    else:
+        apply_delta(previous[0], -previous[1], -1)
+        apply_delta(key, amount, 1)
+    instance._rollup_previous = None
+
+
+def payment_deleted(sender, instance, **kwargs):
+    # Never creates: when the user is deleted, the cascade has already
+    # removed their buckets and a new one would point at the deleted user
+    apply_delta(rollup_key(instance), -Decimal(instance.amount), -1, create=False)
+
+
+# ==================== TOTALS ====================
+def user_totals(user, today):
+    """Received/paid/pending/this-month totals of one user, read from the rollup"""
+    return rollup_totals(PaymentRollup.objects.filter(user=user), today)
+
+
+def rollup_totals(rollups, today):
+    totals = rollups.aggregate(
+        total_received=Sum('total', filter=Q(type='received')),
+        total_paid=Sum('total', filter=Q(type='paid')),
+        total_pending=Sum('total', filter=Q(status='pending')),
+        monthly_total=Sum('total', filter=Q(year=today.year, month=today.month)),
+    )
+    return {key: value or Decimal('0') for key, value in totals.items()}
+
+
+# ==================== REBUILD / DRIFT ====================
+def computed_rollups(user=None):
+    """Aggregate the Payment table into {key: (total, count)}"""
+    payments = Payment.objects.all()
+    if user is not None:
+        payments = payments.filter(user=user)
+    rows = (
+        payments.order_by()
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('user_id', 'year', 'month', 'type', 'status', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    return {
+        (r['user_id'], r['year'] or 0, r['month'] or 0, r['type'], r['status'], r['category']):
+            (r['total'], r['count'])
+        for r in rows
+    }
+
+
+def stored_rollups(user=None):
+    rollups = PaymentRollup.objects.all()
+    if user is not None:
+        rollups = rollups.filter(user=user)
+    return {
+        (r.user_id, r.year, r.month, r.type, r.status, r.category): (r.total, r.count)
+        for r in rollups
+    }
+
+
+def find_drift(user=None):
+    """Return [(key, stored, expected)] for every bucket that disagrees with Payment"""
+    expected = computed_rollups(user)
+    stored = stored_rollups(user)
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(key, (Decimal('0'), 0))
+        have = stored.get(key, (Decimal('0'), 0))
+        if Decimal(want[0]) != Decimal(have[0]) or want[1] != have[1]:
+            drift.append((key, have, want))
+    return drift
+
+
+@transaction.atomic
+def rebuild_rollups(user=None):
+    """Recompute the rollup table from scratch; returns the number of buckets"""
+    rollups = PaymentRollup.objects.all()
+    if user is not None:
+        rollups = rollups.filter(user=user)
+    rollups.delete()
+    rows = [
+        PaymentRollup(total=total, count=count, **_key_filter(key))
+        for key, (total, count) in computed_rollups(user).items()
+    ]
+    PaymentRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
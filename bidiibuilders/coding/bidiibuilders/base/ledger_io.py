@@ -0,0 +1,207 @@
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .ledger import apply_payments
+from .models import Payment
+
+
+# Column order of the ledger CSV, used for both export and import
+LEDGER_COLUMNS = ['date', 'type', 'category', 'amount', 'status', 'payment_method', 'reference', 'description']
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y']
+MAX_REPORTED_ERRORS = 1000
+MAX_AMOUNT = Decimal('9999999999.99')
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def as_dict(self):
+        return {'created': self.created, 'duplicates': self.duplicates,
+                'error_count': self.error_count, 'errors': self.errors}
+
+
+# ==================== FIELD PARSING ====================
+def parse_date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"unrecognised date '{value}'")
+
+
+def parse_amount(value, signed=False):
+    """signed: the column's sign only says which way the money went, so read its absolute value"""
+    text = (value or '').strip().replace(',', '')
+    if not text:
+        return None
+    try:
+        amount = Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"invalid amount '{value}'")
+    if not amount.is_finite():
+        raise RowError(f"invalid amount '{value}'")
+    if signed:
+        amount = abs(amount)
+    if amount < 0 or amount > MAX_AMOUNT:
+        raise RowError(f"amount out of range '{value}'")
+    return amount
+
+
+def parse_choice(value, choices, name, default=None):
+    value = (value or '').strip().lower() or default
+    if value not in dict(choices):
+        raise RowError(f"invalid {name} '{value}'")
+    return value
+
+
+# ==================== ROW FORMATS ====================
+def ledger_row(row):
+    """A row of the ledger CSV (see LEDGER_COLUMNS) as Payment field values"""
+    amount = parse_amount(row.get('amount'))
+    if amount is None:
+        raise RowError('amount is required')
+    return {
+        'date': parse_date(row.get('date')),
+        'type': parse_choice(row.get('type'), Payment.PAYMENT_TYPE_CHOICES, 'type'),
+        'category': parse_choice(row.get('category'), Payment.CATEGORY_CHOICES, 'category', 'other'),
+        'amount': amount,
+        'status': parse_choice(row.get('status'), Payment.STATUS_CHOICES, 'status', 'completed'),
+        'payment_method': parse_choice(row.get('payment_method'), Payment.PAYMENT_METHOD_CHOICES,
+                                       'payment_method', 'other'),
+        'reference': (row.get('reference') or '').strip()[:100] or None,
+        'description': (row.get('description') or '').strip() or None,
+    }
+
+
+MPESA_STATUS = {'completed': 'completed', 'pending': 'pending', 'failed': 'cancelled', 'cancelled': 'cancelled'}
+
+
+def mpesa_row(row):
+    """A row of an M-Pesa statement export (Receipt No., Completion Time, Details, ...)"""
+    paid_in = parse_amount(row.get('Paid In'))
+    # Statements list withdrawals as negative amounts (-3,500.00)
+    withdrawn = parse_amount(row.get('Withdrawn'), signed=True)
+    if paid_in:
+        payment_type, category, amount = 'received', 'client_payment', paid_in
+    elif withdrawn:
+        payment_type, category, amount = 'paid', 'other', withdrawn
+    else:
+        raise RowError('neither Paid In nor Withdrawn has an amount')
+    status = (row.get('Transaction Status') or 'completed').strip().lower()
+    if status not in MPESA_STATUS:
+        raise RowError(f"invalid Transaction Status '{status}'")
+    receipt = (row.get('Receipt No.') or row.get('Receipt No') or '').strip()
+    if not receipt:
+        raise RowError('Receipt No. is required')
+    return {
+        'date': parse_date(row.get('Completion Time')),
+        'type': payment_type,
+        'category': category,
+        'amount': amount,
+        'status': MPESA_STATUS[status],
+        'payment_method': 'mpesa',
+        'reference': receipt[:100],
+        'description': (row.get('Details') or '').strip() or None,
+    }
+
+
+FORMATS = {
+    'ledger': ledger_row,
+    'mpesa': mpesa_row,
+}
+
+
+# ==================== IMPORT ====================
+def _text_stream(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def _flush(user, batch, result):
+    """De-duplicate one batch against the database and insert what is new"""
+    references = {values['reference'] for _, values in batch if values['reference']}
+    existing = set(
+        Payment.objects.filter(user=user, reference__in=references).values_list('reference', flat=True)
+    ) if references else set()
+
+    payments = []
+    for line, values in batch:
+        reference = values['reference']
+        if reference and reference in existing:
+            result.duplicates += 1
+            continue
+        if reference:
+            existing.add(reference)
+        payments.append(Payment(user=user, **values))
+
+    with transaction.atomic():
+        created = Payment.objects.bulk_create(payments)
+        apply_payments(created)
+    result.created += len(created)
+
+
+def import_payments(user, fileobj, fmt='ledger', batch_size=1000):
+    """
+    Stream a CSV statement into the user's ledger.
+
+    Rows are parsed one at a time and written with bulk_create in batches,
+    so memory stays flat however long the file is. Rows whose reference is
+    already in the ledger (or earlier in the file) are skipped as
+    duplicates; invalid rows are reported by line and skipped. Each batch
+    commits on its own, so a bad row never rolls back good ones.
+    """
+    parse = FORMATS[fmt]
+    result = ImportResult()
+    reader = csv.DictReader(_text_stream(fileobj))
+    batch = []
+    for row in reader:
+        try:
+            batch.append((reader.line_num, parse(row)))
+        except RowError as e:
+            result.add_error(reader.line_num, str(e))
+        if len(batch) >= batch_size:
+            _flush(user, batch, result)
+            batch = []
+    if batch:
+        _flush(user, batch, result)
+    return result
+
+
+# ==================== EXPORT ====================
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer streaming"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield the ledger CSV of a Payment queryset line by line"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(LEDGER_COLUMNS)
+    for values in queryset.values_list(*LEDGER_COLUMNS).iterator(chunk_size=chunk_size):
+        yield writer.writerow(['' if value is None else value for value in values])
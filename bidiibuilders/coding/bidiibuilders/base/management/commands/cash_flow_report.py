@@ -0,0 +1,36 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.reports import GROUPS, PERIODS, cash_flow_report
+
+
+class Command(BaseCommand):
+    help = 'Print the company-wide cash-flow report as CSV or JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=list(PERIODS), default='month')
+        parser.add_argument('--group', choices=[group for group in GROUPS if group],
+                            help='Split each period by category, payment method or project')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Last day, YYYY-MM-DD')
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            report = cash_flow_report(options['period'], options['group'], options['date_from'], options['date_to'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['format'] == 'json':
+            lines = [json.dumps(report.as_dict(), indent=2) + '\n']
+        else:
+            lines = report.csv_lines()
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
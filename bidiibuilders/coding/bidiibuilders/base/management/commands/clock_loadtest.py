@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from base.models import TimeLog, Worker
+
+
+USERNAME_PREFIX = 'loadtest-clock-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent clock-ins/outs at the async time-clock views through the ASGI handler '
+        'and report throughput. Creates throwaway staff workers; run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=500, help='Concurrent workers clocking in')
+        parser.add_argument('--taps', type=int, default=2,
+                            help='Simultaneous clock-in requests per worker (duplicates must be rejected)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and time logs')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['taps'] < 1:
+            raise CommandError('--workers and --taps must be positive')
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(f'Leftover {USERNAME_PREFIX}* users found; delete them first')
+
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i}', is_staff=True) for i in range(options['workers'])
+        ])
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+        Worker.objects.bulk_create([Worker(user=user, name=user.username, role='laborer') for user in users])
+
+        try:
+            # The in-process client talks to the ASGI handler as 'testserver'
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                report = asyncio.run(self.run(users, options['taps']))
+            report['open_shifts_after_clock_out'] = TimeLog.objects.filter(
+                worker__user__in=users, clock_out_time__isnull=True).count()
+            self.stdout.write(json.dumps(report, indent=2))
+            if report['clock_in'].get('success') != len(users) or report['open_shifts_after_clock_out']:
+                raise CommandError('One-open-shift invariant violated')
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    async def run(self, users, taps):
+        clients = []
+        for user in users:
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+
+        clock_in = await self.burst([c for c in clients for _ in range(taps)], reverse('clock_in'))
+        clock_out = await self.burst(clients, reverse('clock_out'))
+        return {'workers': len(users), 'taps_per_worker': taps, 'clock_in': clock_in, 'clock_out': clock_out}
+
+    async def burst(self, clients, url):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[client.post(url) for client in clients])
+        elapsed = time.perf_counter() - started
+        statuses = {}
+        for response in responses:
+            if response.get('Content-Type') == 'application/json':
+                status = response.json()['status']
+            else:
+                status = f'http_{response.status_code}'
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            'requests': len(responses),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(responses) / elapsed, 1),
+            **statuses,
+        }
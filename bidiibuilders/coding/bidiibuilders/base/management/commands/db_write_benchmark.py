@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from base import slowqueries
+from base.benchmarks import postgres_connections, scratch_sqlite
+from base.models import Payment, TimeLog, Worker
+
+
+USERNAME = 'benchmark-db-writes'
+# SQLite settings compared by --sqlite-modes: (journal_mode, synchronous, transaction_mode)
+SQLITE_MODES = {
+    'rollback': ('DELETE', 'FULL', None),
+    'wal': ('WAL', 'NORMAL', None),
+    'wal-immediate': ('WAL', 'NORMAL', 'IMMEDIATE'),
+}
+# PostgreSQL connection handling compared by --pg-modes: (CONN_MAX_AGE, pool)
+POSTGRES_MODES = {
+    'connect': (0, None),
+    'persistent': (60, None),
+    'pooled': (0, {'min_size': 2, 'max_size': 10, 'timeout': 10}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure write throughput under concurrency: writer threads record payments and clock shifts '
+        'while reader threads aggregate. Runs against the configured database, with --sqlite-modes '
+        'against a fresh scratch SQLite file per journal/synchronous/transaction mode, or with --pg-modes '
+        'against the configured PostgreSQL database per connection mode, each transaction ending like a request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--readers', type=int, default=2, help='Concurrent reader threads')
+        parser.add_argument('--writes', type=int, default=200, help='Transactions per writer')
+        parser.add_argument('--sqlite-modes', default='',
+                            help=f"Comma-separated SQLite modes to compare ({', '.join(SQLITE_MODES)})")
+        parser.add_argument('--pg-modes', default='',
+                            help=f"Comma-separated PostgreSQL connection modes to compare ({', '.join(POSTGRES_MODES)})")
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['writes'] < 1 or options['readers'] < 0:
+            raise CommandError('--writers and --writes must be positive')
+        modes = [mode.strip() for mode in options['sqlite_modes'].split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in SQLITE_MODES]
+        if unknown:
+            raise CommandError(f"Unknown SQLite mode(s): {', '.join(unknown)}")
+        pg_modes = [mode.strip() for mode in options['pg_modes'].split(',') if mode.strip()]
+        unknown = [mode for mode in pg_modes if mode not in POSTGRES_MODES]
+        if unknown:
+            raise CommandError(f"Unknown PostgreSQL mode(s): {', '.join(unknown)}")
+        if modes and pg_modes:
+            raise CommandError('--sqlite-modes and --pg-modes are separate runs')
+
+        if pg_modes:
+            report = {}
+            for mode in pg_modes:
+                try:
+                    with postgres_connections(*POSTGRES_MODES[mode]):
+                        report[mode] = self.run(options, per_request=True)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+        elif not modes:
+            report = {'configured': self.run(options)}
+        else:
+            report = {}
+            for mode in modes:
+                with tempfile.TemporaryDirectory() as directory:
+                    journal_mode, synchronous, transaction_mode = SQLITE_MODES[mode]
+                    with scratch_sqlite(os.path.join(directory, 'bench.sqlite3'), journal_mode, synchronous,
+                                        transaction_mode):
+                        call_command('migrate', verbosity=0)
+                        report[mode] = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options, per_request=False):
+        """per_request: end each transaction as a request does, so the connection is kept, closed or pooled"""
+        if User.objects.filter(username=USERNAME).exists():
+            raise CommandError(f"Leftover '{USERNAME}' user found; delete it first")
+        user = User.objects.create(username=USERNAME, is_staff=True)
+        worker = Worker.objects.create(user=user, name=USERNAME, role='laborer', daily_rate=Decimal('800'))
+        stop = threading.Event()
+        stats = {'writes': 0, 'locked': 0, 'reads': 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                stats[key] += 1
+            if per_request:
+                # Each counted transaction or read stands for a request, which ends like this
+                close_old_connections()
+
+        def write(index):
+            try:
+                for i in range(options['writes']):
+                    try:
+                        with transaction.atomic():
+                            # Payment signals update the ledger rollup in the same transaction
+                            Payment.objects.create(user=user, type='received', category='client_payment',
+                                                   amount=Decimal('100.00'), status='completed',
+                                                   date=timezone.localdate(), reference=f'bench-{index}-{i}')
+                        count('writes')
+                        if i % 4 == 0:
+                            # A closed shift, as the offline clock sync writes them
+                            now = timezone.now()
+                            TimeLog.objects.create(worker=worker, clock_in_time=now, clock_out_time=now,
+                                                   hours_worked=Decimal('0.00'))
+                            count('writes')
+                    except OperationalError:
+                        count('locked')
+            finally:
+                connections.close_all()
+
+        def read():
+            try:
+                while not stop.is_set():
+                    try:
+                        Payment.objects.filter(user=user).aggregate(total=Sum('amount'), count=Count('id'))
+                        count('reads')
+                    except OperationalError:
+                        count('locked')
+            finally:
+                connections.close_all()
+
+        writers = [threading.Thread(target=write, args=(i,)) for i in range(options['writers'])]
+        readers = [threading.Thread(target=read) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in readers:
+            thread.join()
+        close_old_connections()
+
+        try:
+            return {
+                'vendor': connections['default'].vendor,
+                'writers': options['writers'], 'readers': options['readers'],
+                'seconds': round(elapsed, 3),
+                'transactions': stats['writes'],
+                'transactions_per_second': round(stats['writes'] / elapsed, 1),
+                'reads_per_second': round(stats['reads'] / elapsed, 1),
+                'locked_errors': stats['locked'],
+            }
+        finally:
+            # Slow reads ran in autocommit and are still pending
+            slowqueries.flush()
+            User.objects.filter(pk=user.pk).delete()
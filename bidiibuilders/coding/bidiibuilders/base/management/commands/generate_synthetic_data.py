@@ -0,0 +1,37 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.synthetic import PASSWORD, USERNAME_PREFIX, flush, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with deterministic synthetic clients, workers, projects, payments, tasks, '
+        'applications, time logs and bookings. --rows is the number of payments; the other tables scale with it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Payment rows to generate')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--flush', action='store_true',
+                            help=f'Delete the existing {USERNAME_PREFIX}* users and their data first')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--rows and --batch-size must be positive')
+        if options['flush']:
+            self.stdout.write(f'Deleted {flush()} synthetic row(s)')
+
+        started = time.perf_counter()
+        try:
+            counts = generate(options['rows'], options['seed'], options['batch_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(json.dumps(counts, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s; '
+            f"users {USERNAME_PREFIX}* have the password '{PASSWORD}'"
+        ))
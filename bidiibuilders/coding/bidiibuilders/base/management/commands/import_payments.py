@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.ledger_io import FORMATS, import_payments
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV ledger or M-Pesa statement into a user\'s payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ledger')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        with open(options['path'], 'rb') as fileobj:
+            result = import_payments(user, fileobj, fmt=options['format'], batch_size=options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['message']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} payment(s); {result.duplicates} duplicate(s) skipped, '
+            f'{result.error_count} row(s) with errors'
+        ))
@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.ledger import find_drift, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the PaymentRollup table from Payment, or check it for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report buckets that disagree with Payment; exit 1 on drift')
+        parser.add_argument('--user', help='Limit to one username')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        if options['check']:
+            drift = find_drift(user)
+            for key, stored, expected in drift:
+                self.stdout.write(f'{key}: stored={stored} expected={expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} rollup bucket(s) out of sync')
+            self.stdout.write(self.style.SUCCESS('Payment rollups are in sync'))
+            return
+
+        count = rebuild_rollups(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} payment rollup bucket(s)'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.financials import find_cost_drift, rebuild_project_costs
+from base.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProjectCost table from payments and time logs, or check it for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report buckets that disagree with their sources; exit 1 on drift')
+        parser.add_argument('--project', type=int, help='Limit to one project id')
+
+    def handle(self, *args, **options):
+        project = None
+        if options['project']:
+            try:
+                project = Project.objects.get(pk=options['project'])
+            except Project.DoesNotExist:
+                raise CommandError(f"Project {options['project']} does not exist")
+
+        if options['check']:
+            drift = find_cost_drift(project)
+            for key, stored, expected in drift:
+                self.stdout.write(f'{key}: stored={stored} expected={expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} project cost bucket(s) out of sync')
+            self.stdout.write(self.style.SUCCESS('Project costs are in sync'))
+            return
+
+        count = rebuild_project_costs(project)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} project cost bucket(s)'))
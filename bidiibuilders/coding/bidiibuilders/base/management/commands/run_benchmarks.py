@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.benchmarks import (DEFAULT_TOLERANCE, MIN_REGRESSION_MS, compare, environment, run_suite, scratch_sqlite,
+                             uncovered_views)
+from base.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every view and the main ORM queries against synthetic data at one or more scales, each in a '
+        'fresh scratch SQLite database. Writes a JSON report and, given a baseline report, fails on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1000',
+                            help='Comma-separated payment row counts, e.g. 1000,100000,1000000')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case, after one warm-up')
+        parser.add_argument('--seed', type=int, default=0, help='Synthetic data seed')
+        parser.add_argument('--only', default='', help='Comma-separated substrings of the case names to run')
+        parser.add_argument('--configured', action='store_true',
+                            help='Time the configured database as it is (after generate_synthetic_data)')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help='Allowed median slowdown as a fraction of the baseline')
+        parser.add_argument('--min-ms', type=float, default=MIN_REGRESSION_MS,
+                            help='Smallest median slowdown, in milliseconds, reported as a regression')
+
+    def handle(self, *args, **options):
+        missing = uncovered_views()
+        if missing:
+            raise CommandError(f"Views without a benchmark case: {', '.join(missing)}")
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError('--scales must be comma-separated integers')
+        if not options['configured'] and (not scales or min(scales) < 1):
+            raise CommandError('--scales must be positive')
+        only = [part.strip() for part in options['only'].split(',') if part.strip()]
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        report = {
+            'meta': {
+                **environment(), 'seed': options['seed'], 'repeat': options['repeat'],
+                'timestamp': timezone.now().isoformat(),
+            },
+            'scales': {},
+        }
+        if options['configured']:
+            report['scales']['configured'] = {'rows': None, 'cases': self.run(options, only)}
+        else:
+            for rows in scales:
+                with tempfile.TemporaryDirectory() as directory:
+                    with scratch_sqlite(os.path.join(directory, 'bench.sqlite3')):
+                        call_command('migrate', verbosity=0)
+                        started = time.perf_counter()
+                        counts = generate(rows, options['seed'])
+                        report['scales'][str(rows)] = {
+                            'rows': counts,
+                            'generate_seconds': round(time.perf_counter() - started, 3),
+                            'cases': self.run(options, only),
+                        }
+                self.stderr.write(f'Scale {rows}: done')
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(baseline, report, options['tolerance'], options['min_ms'])
+            for r in regressions:
+                self.stderr.write(f"{r['scale']} {r['case']}: {r['metric']} {r['baseline']} -> {r['current']}")
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stderr.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
+
+    def run(self, options, only):
+        # Start every scale cold, so no case is served from an earlier scale's cache
+        cache.clear()
+        return run_suite(options['repeat'], only)
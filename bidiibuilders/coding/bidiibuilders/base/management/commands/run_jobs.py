@@ -0,0 +1,35 @@
+import json
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.jobqueue import JobWorker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs. Runs until SIGINT/SIGTERM, then finishes the jobs in hand; '
+        'start several processes (or raise --concurrency) for more throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once by this process')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--concurrency and --poll-interval must be positive')
+        worker = JobWorker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        signal.signal(signal.SIGINT, worker.stop)
+        signal.signal(signal.SIGTERM, worker.stop)
+
+        started = time.perf_counter()
+        stats = worker.run(burst=options['burst'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(json.dumps({
+            'worker': worker.name, **stats, 'seconds': round(elapsed, 3),
+            'jobs_per_second': round(sum(stats.values()) / elapsed, 1) if elapsed else 0,
+        }))
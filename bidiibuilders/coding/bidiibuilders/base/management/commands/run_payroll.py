@@ -0,0 +1,33 @@
+import json
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.payroll import PayrollError, run_payroll
+
+
+class Command(BaseCommand):
+    help = "Compute a pay period's wages from time logs and post them as pending wage payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner of the projects and the wage payments')
+        parser.add_argument('period_start', type=date.fromisoformat, help='First day, YYYY-MM-DD')
+        parser.add_argument('period_end', type=date.fromisoformat, help='Last day, YYYY-MM-DD')
+        parser.add_argument('--full', action='store_true',
+                            help='Reprice every worker instead of only those with new or changed logs')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        started = time.perf_counter()
+        try:
+            result = run_payroll(user, options['period_start'], options['period_end'], full=options['full'])
+        except PayrollError as e:
+            raise CommandError(str(e))
+        report = {**result.as_dict(), 'seconds': round(time.perf_counter() - started, 3)}
+        self.stdout.write(json.dumps(report, indent=2))
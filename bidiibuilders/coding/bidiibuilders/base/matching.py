@@ -0,0 +1,220 @@
+import heapq
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .jobqueue import enqueue
+from .models import JobApplication, MatchScore, Worker
+from .skills import normalize_skills
+
+
+# Share of the 0-100 score each component carries
+WEIGHTS = {
+    'skills': 0.35,
+    'rating': 0.20,
+    'experience': 0.15,
+    'track_record': 0.10,
+    'availability': 0.10,
+    'rate': 0.10,
+}
+# Years of experience / completed projects that earn the full component
+EXPERIENCE_CAP = 10
+TRACK_RECORD_CAP = 20
+AVAILABILITY = {'available': 1.0, 'busy': 0.4, 'on_leave': 0.1, 'inactive': 0.0}
+# Projects needing at least this many workers get workers proposed to them
+LARGE_PROJECT_CREW = 5
+PROPOSALS_PER_SEAT = 2
+
+WORKER_FIELDS = ('id', 'name', 'role', 'skills', 'rating', 'experience_years', 'completed_projects', 'status',
+                 'daily_rate', 'updated_at')
+COMPONENTS = tuple(WEIGHTS)
+
+
+@dataclass(frozen=True)
+class ProjectNeeds:
+    skills: frozenset
+    # Budget per worker-day, when the budget, dates and crew size give one
+    affordable_rate: Decimal = None
+
+
+def project_needs(project):
+    affordable = None
+    if project.budget and project.start_date and project.end_date and project.end_date >= project.start_date:
+        days = (project.end_date - project.start_date).days + 1
+        affordable = Decimal(project.budget) / (max(project.crew_size, 1) * days)
+    return ProjectNeeds(frozenset(normalize_skills(project.required_skills)), affordable)
+
+
+def is_large(project):
+    return project.crew_size >= LARGE_PROJECT_CREW
+
+
+# ==================== SCORING ====================
+def rate_fit(daily_rate, affordable_rate):
+    """1 within what the budget affords per worker-day, falling off proportionally above it"""
+    if affordable_rate is None or not daily_rate:
+        return 1.0
+    daily_rate = Decimal(daily_rate)
+    return 1.0 if daily_rate <= affordable_rate else float(affordable_rate / daily_rate)
+
+
+def score_components(needs, worker):
+    """(matched skill count, {component: 0-1}) of a worker row (a dict of WORKER_FIELDS)"""
+    matched = len(needs.skills & normalize_skills(worker['skills']))
+    return matched, {
+        # Without required skills every worker fits equally
+        'skills': matched / len(needs.skills) if needs.skills else 1.0,
+        'rating': float(worker['rating'] or 0) / 5,
+        'experience': min((worker['experience_years'] or 0) / EXPERIENCE_CAP, 1.0),
+        'track_record': min((worker['completed_projects'] or 0) / TRACK_RECORD_CAP, 1.0),
+        'availability': AVAILABILITY.get(worker['status'], 0.0),
+        'rate': rate_fit(worker['daily_rate'], needs.affordable_rate),
+    }
+
+
+def total_score(components):
+    return round(100 * sum(WEIGHTS[name] * value for name, value in components.items()), 2)
+
+
+def build_scores(project, workers, now, proposed=False):
+    """Unsaved MatchScore rows for worker rows"""
+    needs = project_needs(project)
+    scores = []
+    for worker in workers:
+        matched, components = score_components(needs, worker)
+        scores.append(MatchScore(project=project, worker_id=worker['id'], score=total_score(components),
+                                 matched_skills=matched, proposed=proposed, computed_at=now, **components))
+    return scores
+
+
+def save_scores(scores, proposed=False):
+    """Upsert scores; proposed=False leaves the rows' proposal flag alone"""
+    fields = ['score', 'matched_skills', 'computed_at', *COMPONENTS] + (['proposed'] if proposed else [])
+    MatchScore.objects.bulk_create(scores, batch_size=500, update_conflicts=True,
+                                   unique_fields=['project', 'worker'], update_fields=fields)
+
+
+def _is_stale(score, worker_updated_at, project):
+    return score is None or score.computed_at < max(worker_updated_at, project.updated_at)
+
+
+def _as_dict(score, worker):
+    return {
+        'worker': {name: worker[name] for name in ('id', 'name', 'role', 'daily_rate', 'rating', 'status')},
+        'score': score.score, 'matched_skills': score.matched_skills,
+        'components': {name: round(getattr(score, name), 3) for name in COMPONENTS},
+    }
+
+
+# ==================== APPLICANTS ====================
+def ranked_applicants(project):
+    """
+    The project's applications, best match first.
+
+    Cached scores are used as they are; missing or stale ones (older than
+    the worker or the project) are recomputed and saved first, so the
+    ranking is always current even if no refresh job has run yet.
+    """
+    applications = list(
+        JobApplication.objects.filter(project=project).order_by('applied_at')
+        .values('id', 'status', 'applied_at', *[f'worker__{name}' for name in WORKER_FIELDS])
+    )
+    workers = {app['worker__id']: {name: app[f'worker__{name}'] for name in WORKER_FIELDS} for app in applications}
+    cached = {s.worker_id: s for s in MatchScore.objects.filter(project=project, worker_id__in=workers)}
+
+    stale = [w for worker_id, w in workers.items() if _is_stale(cached.get(worker_id), w['updated_at'], project)]
+    if stale:
+        fresh = build_scores(project, stale, timezone.now())
+        save_scores(fresh)
+        cached.update((score.worker_id, score) for score in fresh)
+
+    ranked = [
+        {'application_id': app['id'], 'status': app['status'], 'applied_at': app['applied_at'],
+         **_as_dict(cached[app['worker__id']], workers[app['worker__id']])}
+        for app in applications
+    ]
+    # Stable sort: equal scores keep application order
+    ranked.sort(key=lambda item: -item['score'])
+    return ranked
+
+
+# ==================== PROPOSALS ====================
+def candidate_workers(project, needs):
+    """Workers who could join but haven't applied; with required skills, only those having one"""
+    workers = Worker.objects.exclude(status='inactive').exclude(job_applications__project=project)
+    if needs.skills:
+        workers = workers.filter(skill_index__skill__in=needs.skills).distinct()
+    return workers.values(*WORKER_FIELDS)
+
+
+@transaction.atomic
+def propose_workers(project, limit=None):
+    """
+    Score every candidate and keep the best limit (two per crew seat by
+    default) as the project's proposals. Returns them best first.
+    """
+    limit = limit or project.crew_size * PROPOSALS_PER_SEAT
+    candidates = list(candidate_workers(project, project_needs(project)))
+    now = timezone.now()
+    best = heapq.nlargest(limit, zip(build_scores(project, candidates, now, proposed=True), candidates),
+                          key=lambda pair: (pair[0].score, -pair[0].worker_id))
+
+    MatchScore.objects.filter(project=project, proposed=True).exclude(
+        worker_id__in=[score.worker_id for score, _ in best]).update(proposed=False)
+    save_scores([score for score, _ in best], proposed=True)
+    return [_as_dict(score, worker) for score, worker in best]
+
+
+def proposed_workers(project):
+    """The cached proposals, recomputed when the project or a proposed worker changed since"""
+    rows = list(
+        MatchScore.objects.filter(project=project, proposed=True).select_related('worker')
+        .order_by('-score', 'worker_id')
+    )
+    if not rows or any(_is_stale(row, row.worker.updated_at, project) for row in rows):
+        return propose_workers(project)
+    return [_as_dict(row, {name: getattr(row.worker, name) for name in WORKER_FIELDS}) for row in rows]
+
+
+# ==================== REFRESH ====================
+def refresh_project(project):
+    """Rescore a project's applicants, and its proposals if it is large"""
+    ranked_applicants(project)
+    if is_large(project):
+        propose_workers(project)
+    else:
+        MatchScore.objects.filter(project=project, proposed=True).update(proposed=False)
+
+
+def refresh_worker(worker):
+    """Rescore a worker everywhere it has a cached score"""
+    scores = MatchScore.objects.filter(worker=worker).select_related('project')
+    now = timezone.now()
+    row = {name: getattr(worker, name) for name in WORKER_FIELDS}
+    save_scores([new for score in scores for new in build_scores(score.project, [row], now)])
+
+
+# ==================== SIGNAL HANDLERS ====================
+# Scores are refreshed off the request path by the refresh_match_scores
+# job; reads recompute anything still stale, so a missed job costs time,
+# never correctness.
+def _queue_refresh(kind, pk):
+    enqueue('refresh_match_scores', {f'{kind}_id': pk}, unique_key=f'{kind}:{pk}')
+
+
+def project_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _queue_refresh('project', instance.pk)
+
+
+def worker_saved(sender, instance, raw=False, created=False, **kwargs):
+    # A new worker has no scores yet; large projects pick it up on their next refresh
+    if not raw and not created:
+        _queue_refresh('worker', instance.pk)
+
+
+def application_saved(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and created:
+        _queue_refresh('project', instance.project_id)
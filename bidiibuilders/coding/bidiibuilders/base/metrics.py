@@ -0,0 +1,315 @@
+"""
+Per-request metrics (latency, SQL, templates, response size) by URL name,
+served in the Prometheus text format.
+
+Recording takes a lock: samples go to one of SHARDS striped shards, each
+guarded by its own threading.Lock, rather than lock-free per-thread
+buffers. Per-thread buffers would grow with every thread a
+thread-per-request server starts, so threads share a fixed set of shards,
+and threads sharing a shard need the lock not to lose counts or corrupt a
+ring buffer. Threads are spread over the shards round-robin, so the lock a
+request takes is rarely contended. Scrapes read the shards without it.
+"""
+import itertools
+import threading
+from array import array
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+
+# Latest samples kept per shard, route and metric for the recent quantiles
+RING_SIZE = 256
+# Fixed, so thread-per-request servers don't grow the registry with every thread
+SHARDS = 16
+QUANTILES = (0.5, 0.9, 0.99)
+PREFIX = 'bidii'
+UNRESOLVED = '<unresolved>'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# (name, bucket bounds, help)
+METRICS = (
+    ('request_duration_seconds', SECONDS, 'Wall time from the first middleware to the response'),
+    ('sql_queries', (0, 1, 2, 5, 10, 20, 50, 100, 250), 'SQL queries run per request'),
+    ('sql_duration_seconds', SECONDS, 'Time spent in SQL per request'),
+    ('template_duration_seconds', SECONDS, 'Time spent rendering templates per request'),
+    ('response_size_bytes', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304), 'Response body size'),
+)
+BOUNDS = {name: bounds for name, bounds, _ in METRICS}
+
+
+class RequestStats:
+    """What one request has used so far; filled in by the SQL and template hooks"""
+    __slots__ = ('queries', 'sql_time', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+
+# The running request's stats; copied into sync_to_async threads, so async views are covered too
+_current = ContextVar('request_stats', default=None)
+
+
+# ==================== SERIES ====================
+class Series:
+    """
+    Samples of one metric for one route, written under its shard's lock.
+
+    Holds Prometheus histogram buckets (non-cumulative here), count and
+    sum, and a ring buffer of the latest RING_SIZE samples.
+    """
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'ring', 'position')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.ring = array('d')
+        self.position = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if len(self.ring) < RING_SIZE:
+            self.ring.append(value)
+        else:
+            self.ring[self.position] = value
+            self.position = (self.position + 1) % RING_SIZE
+
+
+class Registry:
+    """
+    SHARDS shards of {(route, metric): Series}, each with its own lock.
+
+    A thread is given a shard round-robin when it first records, so
+    concurrent requests rarely share a lock; a scrape reads every shard
+    and adds them up. A shard's counts may be a sample behind while it is
+    written, which a scrape tolerates. Shards outlive the threads that
+    used them, so counters never go back, and their rings hold the latest
+    samples of whichever threads use them now.
+    """
+
+    def __init__(self):
+        self.shards = [{} for _ in range(SHARDS)]
+        self.locks = [threading.Lock() for _ in range(SHARDS)]
+        self.assigned = itertools.count()
+        self.local = threading.local()
+
+    def shard(self):
+        """This thread's shard index"""
+        index = getattr(self.local, 'index', None)
+        if index is None:
+            # next() on itertools.count is atomic under the GIL
+            index = self.local.index = next(self.assigned) % SHARDS
+        return index
+
+    def observe(self, route, samples):
+        index = self.shard()
+        shard = self.shards[index]
+        with self.locks[index]:
+            for metric, value in samples:
+                series = shard.get((route, metric))
+                if series is None:
+                    series = shard[(route, metric)] = Series(BOUNDS[metric])
+                series.observe(value)
+
+    def collect(self):
+        """{(route, metric): (cumulative buckets, count, sum, recent samples)} across every shard"""
+        merged = {}
+        for shard in self.shards:
+            for key, series in list(shard.items()):
+                buckets, count, total, recent = merged.get(key) or ([0] * (len(series.bounds) + 1), 0, 0.0, [])
+                for i, n in enumerate(series.buckets):
+                    buckets[i] += n
+                recent.extend(series.ring)
+                merged[key] = (buckets, count + series.count, total + series.total, recent)
+        for key, (buckets, count, total, recent) in merged.items():
+            running = 0
+            for i, n in enumerate(buckets):
+                running += n
+                buckets[i] = running
+            merged[key] = (buckets, count, total, recent)
+        return merged
+
+
+registry = Registry()
+
+
+def reset():
+    """Forget every sample (tests)"""
+    global registry
+    registry = Registry()
+
+
+# ==================== HOOKS ====================
+def time_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_time += perf_counter() - started
+        stats.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created: time every query on the connection"""
+    if time_query not in connection.execute_wrappers:
+        # Innermost, and out of the way of execute_wrapper() blocks, which pop the last wrapper
+        connection.execute_wrappers.insert(0, time_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render for the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# ==================== MIDDLEWARE ====================
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, SQL count and time, template time and response size
+    per resolved URL name. Put it first so the other middleware count too.
+
+    A streamed response's size is recorded once its last chunk is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, perf_counter() - started)
+
+    def record(self, request, response, stats, elapsed):
+        route = _route(request)
+        samples = [
+            ('request_duration_seconds', elapsed),
+            ('sql_queries', stats.queries),
+            ('sql_duration_seconds', stats.sql_time),
+            ('template_duration_seconds', stats.template_time),
+        ]
+        if not response.streaming:
+            samples.append(('response_size_bytes', len(response.content)))
+        elif response.is_async:
+            response.streaming_content = self._acount(response.streaming_content, route)
+        else:
+            response.streaming_content = self._count(response.streaming_content, route)
+        registry.observe(route, samples)
+        return response
+
+    def _count(self, chunks, route):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        registry.observe(route, [('response_size_bytes', size)])
+
+    async def _acount(self, chunks, route):
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        registry.observe(route, [('response_size_bytes', size)])
+
+
+# ==================== EXPOSITION ====================
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _quantile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def prometheus_text():
+    """Every series in the Prometheus text exposition format (0.0.4)"""
+    collected = registry.collect()
+    lines = []
+    for metric, bounds, help_text in METRICS:
+        name = f'{PREFIX}_{metric}'
+        keys = sorted(route for route, m in collected if m == metric)
+        lines += [f'# HELP {name} {help_text}, by URL name', f'# TYPE {name} histogram']
+        for route in keys:
+            buckets, count, total, _ = collected[(route, metric)]
+            label = f'route="{_label(route)}"'
+            for bound, n in zip((*bounds, '+Inf'), buckets):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {n}')
+            lines.append(f'{name}_sum{{{label}}} {_number(total)}')
+            lines.append(f'{name}_count{{{label}}} {count}')
+
+        recent = f'{name}_recent'
+        lines += [f'# HELP {recent} Quantiles of the latest {RING_SIZE} samples of each of the {SHARDS} shards',
+                  f'# TYPE {recent} gauge']
+        for route in keys:
+            ordered = sorted(collected[(route, metric)][3])
+            if not ordered:
+                continue
+            for q in QUANTILES:
+                lines.append(f'{recent}{{route="{_label(route)}",quantile="{q}"}} {_number(_quantile(ordered, q))}')
+    return '\n'.join(lines) + '\n'
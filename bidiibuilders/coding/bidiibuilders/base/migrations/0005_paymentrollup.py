@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_rollups(apps, schema_editor):
+    Payment = apps.get_model('base', 'Payment')
+    PaymentRollup = apps.get_model('base', 'PaymentRollup')
+    rows = (
+        Payment.objects.order_by()
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('user_id', 'year', 'month', 'type', 'status', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    PaymentRollup.objects.bulk_create([
+        PaymentRollup(
+            user_id=r['user_id'], year=r['year'] or 0, month=r['month'] or 0,
+            type=r['type'], status=r['status'], category=r['category'],
+            total=r['total'], count=r['count'],
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_alter_skill_options_alter_team_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelog',
+            name='clock_in_time',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='timelog',
+            name='date',
+            field=models.DateField(auto_now_add=True),
+        ),
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('type', models.CharField(choices=[('received', 'Income - Received'), ('paid', 'Expense - Paid')], max_length=20)),
+                ('status', models.CharField(choices=[('completed', 'Completed'), ('pending', 'Pending'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('category', models.CharField(choices=[('client_payment', 'Client Payment'), ('worker_wages', 'Worker Wages'), ('materials', 'Materials'), ('equipment', 'Equipment Rental'), ('transport', 'Transport'), ('utilities', 'Utilities'), ('other', 'Other')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Payment Rollup',
+                'verbose_name_plural': 'Payment Rollups',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('user', 'year', 'month', 'type', 'status', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
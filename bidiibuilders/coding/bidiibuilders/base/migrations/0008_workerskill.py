@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_skill_index(apps, schema_editor):
+    Worker = apps.get_model('base', 'Worker')
+    WorkerSkill = apps.get_model('base', 'WorkerSkill')
+    rows = []
+    for worker_id, skills in Worker.objects.values_list('id', 'skills'):
+        if isinstance(skills, list):
+            names = {str(skill).strip().lower() for skill in skills if str(skill).strip()}
+            rows.extend(WorkerSkill(worker_id=worker_id, skill=name) for name in names)
+    WorkerSkill.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skill', models.CharField(max_length=100)),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_index', to='base.worker')),
+            ],
+            options={
+                'verbose_name': 'Worker Skill',
+                'verbose_name_plural': 'Worker Skills',
+                'ordering': ['skill'],
+                'indexes': [models.Index(fields=['skill', 'worker'], name='workerskill_skill_idx')],
+                'unique_together': {('worker', 'skill')},
+            },
+        ),
+        migrations.RunPython(populate_skill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:25
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def close_duplicate_open_shifts(apps, schema_editor):
+    """Keep each worker's latest open shift; close older ones at zero hours"""
+    TimeLog = apps.get_model('base', 'TimeLog')
+    open_logs = TimeLog.objects.filter(clock_out_time__isnull=True)
+    workers = (
+        open_logs.order_by().values('worker_id').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('worker_id', flat=True)
+    )
+    for worker_id in workers:
+        latest = open_logs.filter(worker_id=worker_id).order_by('-clock_in_time', '-id').first()
+        open_logs.filter(worker_id=worker_id).exclude(pk=latest.pk).update(
+            clock_out_time=F('clock_in_time'), hours_worked=0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_payment_reference_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelog',
+            name='timelog_open_shift_idx',
+        ),
+        migrations.RunPython(close_duplicate_open_shifts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='timelog',
+            constraint=models.UniqueConstraint(condition=models.Q(('clock_out_time__isnull', True)), fields=('worker',), name='timelog_one_open_shift'),
+        ),
+    ]
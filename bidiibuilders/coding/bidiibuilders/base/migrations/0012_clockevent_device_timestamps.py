@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_timelog_one_open_shift'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelog',
+            name='clock_in_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='timelog',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.CreateModel(
+            name='ClockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('in', 'Clock In'), ('out', 'Clock Out')], max_length=3)),
+                ('timestamp', models.DateTimeField()),
+                ('result', models.CharField(choices=[('applied', 'Applied'), ('rejected', 'Rejected')], max_length=10)),
+                ('message', models.CharField(blank=True, default='', max_length=200)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('time_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='clock_events', to='base.timelog')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clock_events', to='base.worker')),
+            ],
+            options={
+                'verbose_name': 'Clock Event',
+                'verbose_name_plural': 'Clock Events',
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
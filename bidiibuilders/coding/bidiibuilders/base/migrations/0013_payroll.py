@@ -0,0 +1,87 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_clockevent_device_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days_worked', models.PositiveIntegerField(default=0)),
+                ('regular_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('overtime_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('daily_rate', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Payroll Line',
+                'verbose_name_plural': 'Payroll Lines',
+                'ordering': ['worker_id', 'project_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Payroll Run',
+                'verbose_name_plural': 'Payroll Runs',
+                'ordering': ['-period_start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['date', 'updated_at'], name='timelog_date_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll_lines', to='base.payment'),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_lines', to='base.project'),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='worker',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_lines', to='base.worker'),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_runs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='base.payrollrun'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='payrollrun',
+            unique_together={('user', 'period_start', 'period_end')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='payrollline',
+            unique_together={('run', 'worker', 'project')},
+        ),
+    ]
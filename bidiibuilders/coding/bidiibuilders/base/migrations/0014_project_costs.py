@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:42
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_wage_costs(apps, schema_editor):
+    # Payments have no project yet, so only time logs carry cost
+    TimeLog = apps.get_model('base', 'TimeLog')
+    ProjectCost = apps.get_model('base', 'ProjectCost')
+    standard = Decimal(str(settings.PAYROLL_STANDARD_DAY_HOURS))
+    premium = Decimal(str(settings.PAYROLL_OVERTIME_MULTIPLIER)) - 1
+    costs = defaultdict(Decimal)
+    rows = TimeLog.objects.filter(project__isnull=False, hours_worked__isnull=False).values_list(
+        'project_id', 'date', 'hours_worked', 'worker__daily_rate')
+    for project_id, date, hours, rate in rows.iterator(chunk_size=5000):
+        overtime = max(hours - standard, Decimal('0'))
+        costs[(project_id, date)] += (rate / standard * (hours + overtime * premium)).quantize(Decimal('0.01'))
+    ProjectCost.objects.bulk_create([
+        ProjectCost(project_id=project_id, date=date, category='wages', amount=amount)
+        for (project_id, date), amount in costs.items() if amount
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_payroll'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='base.project'),
+        ),
+        migrations.CreateModel(
+            name='ProjectCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(blank=True, null=True)),
+                ('category', models.CharField(choices=[('wages', 'Wages'), ('materials', 'Materials'), ('equipment', 'Equipment Rental'), ('transport', 'Transport')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costs', to='base.project')),
+            ],
+            options={
+                'verbose_name': 'Project Cost',
+                'verbose_name_plural': 'Project Costs',
+                'ordering': ['project', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('project', 'date', 'category'), name='projectcost_bucket'), models.UniqueConstraint(condition=models.Q(('date__isnull', True)), fields=('project', 'category'), name='projectcost_undated_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_wage_costs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:12
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+fulltext = importlib.import_module('base.migrations.0009_fulltext_search')
+
+
+def restore_project_fts_triggers(apps, schema_editor):
+    # Adding columns with defaults makes SQLite rebuild base_project, which
+    # drops the full-text triggers created in 0009; put them back
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    table = 'base_project'
+    for sql in fulltext.fts_sql(table, dict(fulltext.FTS_TABLES)[table]):
+        if not sql.startswith('CREATE VIRTUAL TABLE'):
+            schema_editor.execute(sql.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='crew_size',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='required_skills',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(restore_project_fts_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='MatchScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('skills', models.FloatField(default=0)),
+                ('rating', models.FloatField(default=0)),
+                ('experience', models.FloatField(default=0)),
+                ('track_record', models.FloatField(default=0)),
+                ('availability', models.FloatField(default=0)),
+                ('rate', models.FloatField(default=0)),
+                ('matched_skills', models.PositiveSmallIntegerField(default=0)),
+                ('proposed', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_scores', to='base.project')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_scores', to='base.worker')),
+            ],
+            options={
+                'verbose_name': 'Match Score',
+                'verbose_name_plural': 'Match Scores',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['project', '-score'], name='matchscore_project_score_idx')],
+                'unique_together': {('project', 'worker')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_match_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project'), ('leave', 'Leave'), ('hold', 'Hold')], default='project', max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('note', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('application', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking', to='base.jobapplication')),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='base.project')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='base.worker')),
+            ],
+            options={
+                'verbose_name': 'Worker Booking',
+                'verbose_name_plural': 'Worker Bookings',
+                'ordering': ['start_date'],
+                'indexes': [models.Index(fields=['worker', 'start_date', 'end_date'], name='booking_worker_dates_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='booking_ends_after_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_recurring_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('statement', models.TextField()),
+                ('database', models.CharField(default='default', max_length=50)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('sample_sql', models.TextField(blank=True, default='')),
+                ('sample_params', models.TextField(blank=True, default='')),
+                ('view', models.CharField(blank=True, default='', max_length=200)),
+                ('location', models.CharField(blank=True, default='', max_length=300)),
+                ('plan', models.TextField(blank=True, default='')),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:32
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def stamp_rates_and_reprice_wages(apps, schema_editor):
+    # Closed shifts take the rate their worker has today; wage buckets were
+    # priced per shift and are re-priced with overtime per worker-day
+    TimeLog = apps.get_model('base', 'TimeLog')
+    Worker = apps.get_model('base', 'Worker')
+    ProjectCost = apps.get_model('base', 'ProjectCost')
+    TimeLog.objects.filter(hours_worked__isnull=False).update(
+        daily_rate=Subquery(Worker.objects.filter(pk=OuterRef('worker_id')).values('daily_rate')[:1]))
+
+    standard = Decimal(str(settings.PAYROLL_STANDARD_DAY_HOURS))
+    premium = Decimal(str(settings.PAYROLL_OVERTIME_MULTIPLIER)) - 1
+    costs = defaultdict(Decimal)
+    rows = TimeLog.objects.filter(project__isnull=False, hours_worked__isnull=False).order_by(
+        'worker_id', 'date', 'project__user_id').values_list(
+        'worker_id', 'date', 'project__user_id', 'project_id', 'hours_worked', 'daily_rate')
+    for (_, date, _), day in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0, 1, 2)):
+        day = list(day)
+        total = sum(hours for *_, hours, _ in day)
+        share = max(total - standard, Decimal('0')) / total if total else Decimal('0')
+        amounts = defaultdict(Decimal)
+        for *_, project_id, hours, rate in day:
+            amounts[project_id] += rate / standard * (hours + hours * share * premium)
+        for project_id, amount in amounts.items():
+            costs[(project_id, date)] += amount.quantize(Decimal('0.01'))
+    ProjectCost.objects.filter(category='wages').delete()
+    ProjectCost.objects.bulk_create([
+        ProjectCost(project_id=project_id, date=date, category='wages', amount=amount)
+        for (project_id, date), amount in costs.items() if amount
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelog',
+            name='daily_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(stamp_rates_and_reprice_wages, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -39,6 +39,9 @@ class Project(models.Model):
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     progress = models.IntegerField(default=0, validators=[MinValueValidator(0), MaxValueValidator(100)])
+    # Applicant matching (base.matching): skills the crew needs and its size
+    required_skills = models.JSONField(default=list, blank=True)
+    crew_size = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -46,6 +49,18 @@ class Project(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Project'
         verbose_name_plural = 'Projects'
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='project_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='project_user_status_idx'),
+            # Staff job board: active projects, newest first
+            models.Index(fields=['status', '-created_at'], name='project_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='project_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Its bookings follow its dates (base.availability); a clash undoes the whole save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} - {self.client_name or 'No Client'}"
@@ -96,6 +111,13 @@ class Worker(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Worker'
         verbose_name_plural = 'Workers'
+        indexes = [
+            # Worker directory, best rated first, optionally by trade/status
+            models.Index(fields=['-rating', 'name'], name='worker_rating_idx'),
+            models.Index(fields=['status', '-rating'], name='worker_status_rating_idx'),
+            models.Index(fields=['role', 'status', '-rating'], name='worker_role_status_idx'),
+            models.Index(fields=['user', 'status'], name='worker_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.role}"
@@ -105,6 +127,31 @@ class Worker(models.Model):
         return dict(self.ROLE_CHOICES).get(self.role, self.role)
 
 
+# ==================== WORKER SKILL INDEX ====================
+class WorkerSkill(models.Model):
+    """
+    One row per skill in Worker.skills.
+
+    The JSON list cannot be indexed on SQLite, so skill searches go through
+    this table instead. Rows are rewritten by base.skills whenever a Worker
+    is saved; never edit them directly.
+    """
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='skill_index')
+    skill = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['skill']
+        unique_together = ('worker', 'skill')
+        indexes = [
+            models.Index(fields=['skill', 'worker'], name='workerskill_skill_idx'),
+        ]
+        verbose_name = 'Worker Skill'
+        verbose_name_plural = 'Worker Skills'
+
+    def __str__(self):
+        return f"{self.worker_id}: {self.skill}"
+
+
 # ==================== SKILL MODEL ====================
 class Skill(models.Model):
     SKILL_CHOICES = [
@@ -164,6 +211,7 @@ class Payment(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
+    project = models.ForeignKey(Project, on_delete=models.SET_NULL, related_name='payments', null=True, blank=True)
     type = models.CharField(max_length=20, choices=PAYMENT_TYPE_CHOICES)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
@@ -179,11 +227,95 @@ class Payment(models.Model):
         ordering = ['-date', '-created_at']
         verbose_name = 'Payment'
         verbose_name_plural = 'Payments'
+        indexes = [
+            models.Index(fields=['-date', '-created_at'], name='payment_date_idx'),
+            # Ledger keyset pagination: (-date, -created_at, id) per user
+            models.Index(fields=['user', '-date', '-created_at', 'id'], name='payment_user_ledger_idx'),
+            # Ledger filters, each still served in ledger order
+            models.Index(fields=['user', 'type', '-date'], name='payment_user_type_idx'),
+            models.Index(fields=['user', 'category', '-date'], name='payment_user_category_idx'),
+            models.Index(fields=['user', 'status', '-date'], name='payment_user_status_idx'),
+            models.Index(fields=['user', 'payment_method', '-date'], name='payment_user_method_idx'),
+            # De-duplication of imported statements
+            models.Index(fields=['user', 'reference'], name='payment_user_reference_idx'),
+            # Admin lookup of a payment by its reference
+            models.Index(fields=['reference'], name='payment_reference_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} - KES {self.amount} ({self.date})"
 
 
+# ==================== PAYMENT ROLLUP MODEL ====================
+class PaymentRollup(models.Model):
+    """
+    Materialized monthly totals of a user's payments.
+
+    One row per (user, year, month, type, status, category). Kept up to date
+    by the signal handlers in base.ledger; payments without a date are
+    filed under year 0, month 0.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payment_rollups')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    type = models.CharField(max_length=20, choices=Payment.PAYMENT_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    category = models.CharField(max_length=50, choices=Payment.CATEGORY_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = ('user', 'year', 'month', 'type', 'status', 'category')
+        verbose_name = 'Payment Rollup'
+        verbose_name_plural = 'Payment Rollups'
+        indexes = [
+            # Covers company-wide totals without touching the table
+            models.Index(fields=['type', 'status', 'year', 'month', 'total'], name='rollup_totals_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.year}-{self.month:02d} {self.type}/{self.status}/{self.category}: KES {self.total}"
+
+
+# ==================== PROJECT COST MODEL ====================
+class ProjectCost(models.Model):
+    """
+    Materialized daily spend of a project per cost category.
+
+    One row per (project, date, category): wages accrue from closed time
+    logs, the other categories from expense payments linked to the project.
+    Kept up to date by base.financials; undated payments have date NULL.
+    """
+    CATEGORY_CHOICES = [
+        ('wages', 'Wages'),
+        ('materials', 'Materials'),
+        ('equipment', 'Equipment Rental'),
+        ('transport', 'Transport'),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='costs')
+    date = models.DateField(null=True, blank=True)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['project', 'date']
+        verbose_name = 'Project Cost'
+        verbose_name_plural = 'Project Costs'
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'date', 'category'], name='projectcost_bucket'),
+            # NULLs are distinct in a unique index, so undated buckets need their own
+            models.UniqueConstraint(fields=['project', 'category'], condition=models.Q(date__isnull=True),
+                                    name='projectcost_undated_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} {self.date or 'undated'} {self.category}: KES {self.amount}"
+
+
 # ==================== TASK MODEL ====================
 class Task(models.Model):
     TASK_TYPE_CHOICES = [
@@ -213,6 +345,9 @@ class Task(models.Model):
     completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
+    # Set on the stored copy of one occurrence of a recurring task (e.g. once completed)
+    recurrence = models.ForeignKey('RecurringTask', on_delete=models.CASCADE, null=True, blank=True,
+                                   related_name='occurrences')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -227,11 +362,83 @@ class Task(models.Model):
         ordering = ['date', 'time']
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
+        indexes = [
+            models.Index(fields=['user', 'date', 'time'], name='task_user_date_idx'),
+            models.Index(fields=['user', 'completed', 'date'], name='task_user_completed_idx'),
+            models.Index(fields=['date', 'time'], name='task_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recurrence', 'date'], name='task_one_per_occurrence',
+                                    condition=models.Q(recurrence__isnull=False)),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.date}"
 
 
+class RecurringTask(models.Model):
+    """
+    A task repeating every interval days, weeks or months from start_date.
+
+    Occurrences are expanded on demand (base.calendar); only those that
+    were changed, e.g. completed, are stored, as Tasks pointing back here.
+    """
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_tasks')
+    title = models.CharField(max_length=200)
+    type = models.CharField(max_length=20, choices=Task.TASK_TYPE_CHOICES)
+    time = models.TimeField()
+    description = models.TextField(blank=True, null=True)
+    project = models.ForeignKey(Project, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='recurring_tasks')
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, default='medium')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    start_date = models.DateField()
+    # Last day an occurrence may fall on; open-ended when empty
+    until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['start_date', 'time']
+        verbose_name = 'Recurring Task'
+        verbose_name_plural = 'Recurring Tasks'
+        indexes = [
+            # Rules active in a window: start_date <= window end, until empty or >= window start
+            models.Index(fields=['user', 'start_date', 'until'], name='recurring_user_dates_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(interval__gte=1), name='recurring_interval_positive'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.frequency} from {self.start_date})"
+
+
+class CalendarFeed(models.Model):
+    """
+    The secret in a user's calendar feed URL (base.calendar). Calendar apps
+    can't log in, so the URL is the credential; a new key revokes the old URL.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed')
+    key = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Calendar Feed'
+        verbose_name_plural = 'Calendar Feeds'
+
+    def __str__(self):
+        return f"Calendar feed of {self.user}"
+
+
 # ==================== TEAM MEMBER MODEL ====================
 class TeamMember(models.Model):
     ROLE_CHOICES = [
@@ -284,6 +491,11 @@ class JobApplication(models.Model):
         unique_together = ('worker', 'project')
         verbose_name = 'Job Application'
         verbose_name_plural = 'Job Applications'
+        indexes = [
+            models.Index(fields=['project', '-applied_at'], name='jobapp_project_applied_idx'),
+            # Admin changelist order and date hierarchy
+            models.Index(fields=['-applied_at'], name='jobapp_applied_idx'),
+        ]
 
     def __str__(self):
         return f"{self.worker.name} - {self.project.name} ({self.status})"
@@ -292,10 +504,13 @@ class JobApplication(models.Model):
 class TimeLog(models.Model):
     worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='time_logs')
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='time_logs', null=True, blank=True)
-    date = models.DateField(auto_now_add=True)
-    clock_in_time = models.DateTimeField(auto_now_add=True)
+    # Defaults rather than auto_now_add so synced offline events keep their device time
+    date = models.DateField(default=timezone.localdate)
+    clock_in_time = models.DateTimeField(default=timezone.now)
     clock_out_time = models.DateTimeField(null=True, blank=True)
     hours_worked = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # The worker's rate when the shift closed, so later raises don't reprice it
+    daily_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -304,13 +519,272 @@ class TimeLog(models.Model):
         ordering = ['-date', '-clock_in_time']
         verbose_name = 'Time Log'
         verbose_name_plural = 'Time Logs'
+        indexes = [
+            models.Index(fields=['worker', 'date', 'clock_out_time'], name='timelog_worker_date_idx'),
+            # Pay-period scans and "changed since the last payroll run"
+            models.Index(fields=['date', 'updated_at'], name='timelog_date_updated_idx'),
+        ]
+        constraints = [
+            # At most one open shift per worker; its partial unique index
+            # also serves the clock-in/out lookup
+            models.UniqueConstraint(fields=['worker'], condition=models.Q(clock_out_time__isnull=True),
+                                    name='timelog_one_open_shift'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.clock_in_time and self.clock_out_time:
             delta = self.clock_out_time - self.clock_in_time
             self.hours_worked = round(delta.total_seconds() / 3600, 2)
+        if self.hours_worked is not None and self.daily_rate is None:
+            self.daily_rate = Worker.objects.filter(pk=self.worker_id).values_list('daily_rate', flat=True).first()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'daily_rate'}
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.worker.name} - {self.date} ({self.hours_worked or '?' } hrs)"
 
+
+# ==================== CLOCK EVENT MODEL ====================
+class ClockEvent(models.Model):
+    """
+    A clock-in/out event received from an offline device.
+
+    The device-generated key makes batch uploads idempotent: an event whose
+    key is already stored is reported as a duplicate and not applied again.
+    """
+    KIND_CHOICES = [
+        ('in', 'Clock In'),
+        ('out', 'Clock Out'),
+    ]
+
+    RESULT_CHOICES = [
+        ('applied', 'Applied'),
+        ('rejected', 'Rejected'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='clock_events')
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES)
+    timestamp = models.DateTimeField()
+    time_log = models.ForeignKey(TimeLog, on_delete=models.SET_NULL, related_name='clock_events',
+                                 null=True, blank=True)
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES)
+    message = models.CharField(max_length=200, blank=True, default='')
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        verbose_name = 'Clock Event'
+        verbose_name_plural = 'Clock Events'
+
+    def __str__(self):
+        return f"{self.worker_id} {self.kind} @ {self.timestamp} ({self.result})"
+
+
+# ==================== PAYROLL MODELS ====================
+class PayrollRun(models.Model):
+    """Wages owed for the time logged on a user's projects over one pay period"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payroll_runs')
+    period_start = models.DateField()
+    period_end = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-period_start']
+        unique_together = ('user', 'period_start', 'period_end')
+        verbose_name = 'Payroll Run'
+        verbose_name_plural = 'Payroll Runs'
+
+    def __str__(self):
+        return f"{self.user.username} payroll {self.period_start} - {self.period_end}"
+
+
+class PayrollLine(models.Model):
+    """One worker's pay for one project within a payroll run"""
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='lines')
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='payroll_lines')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='payroll_lines')
+    days_worked = models.PositiveIntegerField(default=0)
+    regular_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    daily_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # The wage payment still carrying this line; a new one is raised for
+    # any increase once it has been settled
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, related_name='payroll_lines',
+                                null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['worker_id', 'project_id']
+        unique_together = ('run', 'worker', 'project')
+        verbose_name = 'Payroll Line'
+        verbose_name_plural = 'Payroll Lines'
+
+    def __str__(self):
+        return f"{self.worker_id} on {self.project_id}: {self.amount}"
+
+
+
+# ==================== BACKGROUND JOB MODEL ====================
+class BackgroundJob(models.Model):
+    """
+    A unit of deferred work, run by the run_jobs worker command.
+
+    Workers claim queued jobs whose run_at has passed, highest priority
+    first. A failed job is retried with exponential backoff until it has
+    used max_attempts.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Coalesces repeats: enqueueing a key that is still queued is a no-op
+    unique_key = models.CharField(max_length=200, blank=True, default='')
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Background Job'
+        verbose_name_plural = 'Background Jobs'
+        indexes = [
+            # The claim query: queued jobs by priority, then due time
+            models.Index(fields=['-priority', 'run_at', 'id'], name='job_claim_idx',
+                         condition=models.Q(status='queued')),
+            models.Index(fields=['name', 'status'], name='job_name_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# ==================== MATCH SCORE MODEL ====================
+class MatchScore(models.Model):
+    """
+    Cached fit of one worker for one project, 0-100, with its components (0-1).
+
+    Written by base.matching for a project's applicants and, for large
+    projects, its proposed workers. A row older than either the worker or
+    the project is stale and is recomputed before use.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='match_scores')
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='match_scores')
+    score = models.FloatField(default=0)
+    skills = models.FloatField(default=0)
+    rating = models.FloatField(default=0)
+    experience = models.FloatField(default=0)
+    track_record = models.FloatField(default=0)
+    availability = models.FloatField(default=0)
+    rate = models.FloatField(default=0)
+    matched_skills = models.PositiveSmallIntegerField(default=0)
+    # Among the workers proposed to the project without having applied
+    proposed = models.BooleanField(default=False)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('project', 'worker')
+        indexes = [
+            models.Index(fields=['project', '-score'], name='matchscore_project_score_idx'),
+        ]
+        verbose_name = 'Match Score'
+        verbose_name_plural = 'Match Scores'
+
+    def __str__(self):
+        return f"{self.worker_id} for {self.project_id}: {self.score:.1f}"
+
+
+# ==================== WORKER BOOKING MODEL ====================
+class WorkerBooking(models.Model):
+    """
+    Days a worker is taken, start and end inclusive.
+
+    Accepted applications book the worker for the project's dates; workers
+    book their own leave. A worker's bookings never overlap (base.availability).
+    """
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('leave', 'Leave'),
+        ('hold', 'Hold'),
+    ]
+
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='bookings')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='project')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='bookings', null=True, blank=True)
+    application = models.OneToOneField(JobApplication, on_delete=models.CASCADE, related_name='booking',
+                                       null=True, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    note = models.CharField(max_length=200, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['start_date']
+        verbose_name = 'Worker Booking'
+        verbose_name_plural = 'Worker Bookings'
+        indexes = [
+            # Overlap check for one worker: start_date <= end AND end_date >= start
+            models.Index(fields=['worker', 'start_date', 'end_date'], name='booking_worker_dates_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_date__gte=models.F('start_date')),
+                                   name='booking_ends_after_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.worker_id} {self.kind} {self.start_date} - {self.end_date}"
+
+
+# ==================== SLOW QUERY MODEL ====================
+class SlowQuery(models.Model):
+    """
+    SQL statements that ran over settings.SLOW_QUERY_MS, one row per
+    fingerprint (the statement with its literals and placeholders
+    normalised). The sample, caller and plan are the slowest run's.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True)
+    statement = models.TextField()
+    database = models.CharField(max_length=50, default='default')
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    # The slowest run
+    sample_sql = models.TextField(blank=True, default='')
+    sample_params = models.TextField(blank=True, default='')
+    view = models.CharField(max_length=200, blank=True, default='')
+    location = models.CharField(max_length=300, blank=True, default='')
+    plan = models.TextField(blank=True, default='')
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name = 'Slow Query'
+        verbose_name_plural = 'Slow Queries'
+
+    def __str__(self):
+        return f"{self.statement[:80]} ({self.calls}x, max {self.max_ms:.0f} ms)"
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.calls if self.calls else 0
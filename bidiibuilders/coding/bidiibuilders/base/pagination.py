@@ -0,0 +1,186 @@
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+
+# Tables estimated smaller than this are still counted exactly
+EXACT_COUNT_BELOW = 50000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+    has_next: bool = False
+    ordering: tuple = field(default=())
+
+
+class KeysetPaginator:
+    """
+    Cursor (keyset) pagination over a fixed ordering.
+
+    Instead of OFFSET, each page continues strictly after the sort key of the
+    previous page's last row, so fetching page N costs the same as page 1
+    when an index matches the ordering. The last ordering field must be
+    unique (normally 'id'). NULLs always sort last.
+    """
+
+    def __init__(self, queryset, ordering, page_size=50):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.model = queryset.model
+
+    def _fields(self):
+        for name in self.ordering:
+            yield name.lstrip('-'), name.startswith('-')
+
+    def order_by(self):
+        ordering = []
+        for name, descending in self._fields():
+            if not self.model._meta.get_field(name).null:
+                # Plain ordering lets the database walk a matching index
+                ordering.append(f'-{name}' if descending else name)
+            elif descending:
+                ordering.append(F(name).desc(nulls_last=True))
+            else:
+                ordering.append(F(name).asc(nulls_last=True))
+        return ordering
+
+    # ---------- cursor encoding ----------
+    def encode(self, obj):
+        values = []
+        for name, _ in self._fields():
+            # Rows fetched with values() are dicts
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            fields = list(self._fields())
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError('cursor length mismatch')
+            return [
+                None if value is None else self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except Exception as e:
+            raise InvalidCursor(f'Invalid cursor: {cursor!r}') from e
+
+    # ---------- filtering ----------
+    def after(self, values):
+        """Q matching rows that sort strictly after the given key"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self._fields(), values):
+            if value is None:
+                # Nothing sorts after NULL within this column, only ties
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            lookup = 'lt' if descending else 'gt'
+            beyond = Q(**{f'{name}__{lookup}': value})
+            if self.model._meta.get_field(name).null:
+                beyond |= Q(**{f'{name}__isnull': True})
+            condition |= equal & beyond
+            equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.order_by())
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode(cursor)))
+        rows = list(queryset[:self.page_size + 1])
+        has_next = len(rows) > self.page_size
+        items = rows[:self.page_size]
+        next_cursor = self.encode(items[-1]) if has_next else None
+        return KeysetPage(items=items, next_cursor=next_cursor, has_next=has_next, ordering=self.ordering)
+
+
+def paginate_request(request, queryset, ordering, page_size=50, param='cursor'):
+    """
+    Fetch the page named by request.GET[param].
+
+    Returns the KeysetPage plus query strings for the first and next pages
+    that keep every other GET parameter (filters, other lists' cursors).
+    A malformed cursor falls back to the first page.
+    """
+    paginator = KeysetPaginator(queryset, ordering, page_size=page_size)
+    try:
+        page = paginator.page(request.GET.get(param))
+    except InvalidCursor:
+        page = paginator.page()
+    return page, page_links(request, page, param)
+
+
+def page_links(request, page, param='cursor'):
+    """Query strings for the first and next pages of a KeysetPage"""
+    query = request.GET.copy()
+    is_first_page = not query.pop(param, None)
+    first_query = query.urlencode()
+    next_query = None
+    if page.has_next:
+        query[param] = page.next_cursor
+        next_query = query.urlencode()
+
+    return {'first_query': first_query, 'next_query': next_query, 'is_first_page': is_first_page}
+
+
+def estimated_count(model, using='default'):
+    """
+    Rows in the model's table according to the database's planner
+    statistics (ANALYZE), or None where it keeps none. Stale by design.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [connection.ops.quote_name(table)]),
+        # One row per index, each starting with the rows it covers
+        'sqlite': ('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]),
+        'mysql': ('SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() '
+                  'AND table_name = %s', [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # SQLite has no sqlite_stat1 until the first ANALYZE
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    # PostgreSQL reports -1 for a table never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Django Paginator that counts an unfiltered queryset from the planner's
+    estimate instead of COUNT(*), which scans the whole table. Filtered
+    querysets, and tables estimated under EXACT_COUNT_BELOW rows, are
+    counted exactly; the last page of an estimate may come up short.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where and not queryset.query.combinator:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+                return estimate
+        return super().count
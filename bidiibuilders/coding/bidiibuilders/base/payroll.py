@@ -0,0 +1,243 @@
+import copy
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .ledger import apply_payments
+from .models import Payment, PayrollLine, PayrollRun, Project, TimeLog, Worker
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+LINE_FIELDS = ['days_worked', 'regular_hours', 'overtime_hours', 'daily_rate', 'amount', 'payment', 'updated_at']
+
+
+class PayrollError(ValueError):
+    pass
+
+
+@dataclass
+class PayrollResult:
+    run: PayrollRun
+    incremental: bool = False
+    workers: int = 0
+    lines_created: int = 0
+    lines_updated: int = 0
+    lines_removed: int = 0
+    payments_created: int = 0
+    payments_updated: int = 0
+    # Decreases that hit an already settled payment and need a manual refund
+    overpaid: Decimal = ZERO
+
+    def as_dict(self):
+        return {
+            'run_id': self.run.pk, 'period_start': str(self.run.period_start),
+            'period_end': str(self.run.period_end), 'total': str(self.run.total),
+            'incremental': self.incremental, 'workers': self.workers,
+            'lines_created': self.lines_created, 'lines_updated': self.lines_updated,
+            'lines_removed': self.lines_removed, 'payments_created': self.payments_created,
+            'payments_updated': self.payments_updated, 'overpaid': str(self.overpaid.quantize(CENT)),
+        }
+
+
+def standard_day_hours():
+    return Decimal(str(settings.PAYROLL_STANDARD_DAY_HOURS))
+
+
+def overtime_multiplier():
+    return Decimal(str(settings.PAYROLL_OVERTIME_MULTIPLIER))
+
+
+# ==================== AGGREGATION ====================
+def payable_logs(run):
+    """Closed time logs on the run's projects within its period"""
+    return TimeLog.objects.filter(
+        project__user_id=run.user_id,
+        date__range=(run.period_start, run.period_end),
+        clock_out_time__isnull=False,
+        hours_worked__isnull=False,
+    )
+
+
+def line_hours(logs):
+    """
+    Aggregate time logs into one row per (worker, project) in SQL.
+
+    Hours are first summed per worker, project and day; a window over the
+    worker's day gives the day total, and hours beyond the standard day are
+    counted as overtime, shared between that day's projects in proportion
+    to their hours. Yields (worker_id, project_id, days, hours, overtime,
+    daily_rate, worker_name, project_name).
+    """
+    days_sql, params = (
+        logs.order_by().values('worker_id', 'project_id', 'date').annotate(hours=Sum('hours_worked'))
+        .query.sql_with_params()
+    )
+    # A float so SQLite compares it numerically (it binds Decimal as text)
+    standard = float(standard_day_hours())
+    sql = f"""
+        SELECT d.worker_id, d.project_id, COUNT(*), SUM(d.hours),
+               SUM(CASE WHEN d.day_hours > %s THEN d.hours * (d.day_hours - %s) / d.day_hours ELSE 0 END),
+               w.daily_rate, w.name, p.name
+        FROM (
+            SELECT days.worker_id, days.project_id, days.hours,
+                   SUM(days.hours) OVER (PARTITION BY days.worker_id, days.date) AS day_hours
+            FROM ({days_sql}) days
+        ) d
+        JOIN {Worker._meta.db_table} w ON w.id = d.worker_id
+        JOIN {Project._meta.db_table} p ON p.id = d.project_id
+        GROUP BY d.worker_id, d.project_id, w.daily_rate, w.name, p.name
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [standard, standard, *params])
+        yield from cursor
+
+
+def _decimal(value):
+    # SQLite sums decimals as floats
+    return Decimal(str(value)).quantize(CENT)
+
+
+def compute_lines(rows):
+    """
+    Price aggregated hours into {(worker_id, project_id): line values}.
+
+    The daily rate pays a standard day; overtime hours earn the overtime
+    multiplier.
+    """
+    standard, multiplier = standard_day_hours(), overtime_multiplier()
+    lines = {}
+    for worker_id, project_id, days, hours, overtime, rate, worker_name, project_name in rows:
+        overtime = _decimal(overtime)
+        regular = _decimal(hours) - overtime
+        rate = _decimal(rate)
+        lines[(worker_id, project_id)] = {
+            'days_worked': days, 'regular_hours': regular, 'overtime_hours': overtime, 'daily_rate': rate,
+            'amount': (rate / standard * (regular + overtime * multiplier)).quantize(CENT),
+            'worker_name': worker_name, 'project_name': project_name,
+        }
+    return lines
+
+
+# ==================== RUNS ====================
+def get_run(user, period_start, period_end):
+    """The user's run for exactly this period, refusing overlaps with other runs"""
+    if period_start > period_end:
+        raise PayrollError('Pay period start must not be after its end')
+    overlapping = PayrollRun.objects.filter(
+        user=user, period_start__lte=period_end, period_end__gte=period_start,
+    ).exclude(period_start=period_start, period_end=period_end)
+    if overlapping.exists():
+        raise PayrollError('Pay period overlaps an existing payroll run')
+    run, _ = PayrollRun.objects.get_or_create(user=user, period_start=period_start, period_end=period_end)
+    return run
+
+
+def _wage_payment(run, amount, key, line):
+    return Payment(
+        user_id=run.user_id, project_id=key[1], type='paid', category='worker_wages', amount=amount, status='pending',
+        date=run.period_end, reference=f'payroll-{run.pk}',
+        description=(f"Wages: {line['worker_name']} on {line['project_name']} "
+                     f"({run.period_start} to {run.period_end})"),
+    )
+
+
+@transaction.atomic
+def run_payroll(user, period_start, period_end, full=False):
+    """
+    Compute (or re-compute) a pay period and post the wage payments.
+
+    The first run prices every worker. Later runs are incremental: only
+    workers with time logs written since the previous run are recomputed,
+    so late-arriving logs cost a few rows. Increases are added to a line's
+    still-pending payment, or raised as a new pending payment once the
+    earlier one has been settled. Pass full=True to reprice everyone
+    (e.g. after rate changes or deleted logs).
+    """
+    run = get_run(user, period_start, period_end)
+    run = PayrollRun.objects.select_for_update().get(pk=run.pk)
+    started = timezone.now()
+    result = PayrollResult(run=run, incremental=bool(run.computed_at) and not full)
+
+    logs = payable_logs(run)
+    existing = run.lines.select_related('payment')
+    if result.incremental:
+        changed = payable_logs(run).filter(updated_at__gte=run.computed_at).values('worker_id')
+        logs = logs.filter(worker_id__in=changed)
+        existing = existing.filter(worker_id__in=changed)
+
+    computed = compute_lines(line_hours(logs))
+    existing = {(line.worker_id, line.project_id): line for line in existing}
+    result.workers = len({worker_id for worker_id, _ in computed.keys() | existing.keys()})
+
+    new_lines, changed_lines, removed_lines = [], [], []
+    new_payments, updated_payments, previous_payments, dropped_payments = [], [], [], []
+    for key in computed.keys() | existing.keys():
+        values = computed.get(key)
+        line = existing.get(key)
+        if line is None:
+            line = PayrollLine(run=run, worker_id=key[0], project_id=key[1])
+            new_lines.append(line)
+            old_amount = ZERO
+        else:
+            old_amount = line.amount
+        values = values or {'days_worked': 0, 'regular_hours': ZERO, 'overtime_hours': ZERO,
+                            'daily_rate': line.daily_rate, 'amount': ZERO}
+        if line.pk and all(getattr(line, name) == values[name] for name in LINE_FIELDS[:5]):
+            continue
+        for name in LINE_FIELDS[:5]:
+            setattr(line, name, values[name])
+
+        delta = values['amount'] - old_amount
+        payment = line.payment
+        if payment is not None and payment.status == 'pending' and delta:
+            remaining = payment.amount + delta
+            if remaining > 0:
+                previous_payments.append(copy.copy(payment))
+                payment.amount = remaining
+                updated_payments.append(payment)
+            else:
+                dropped_payments.append(payment)
+                line.payment = None
+                result.overpaid -= remaining
+        elif delta > 0:
+            line.payment = _wage_payment(run, delta, key, values)
+            new_payments.append(line.payment)
+        elif delta < 0:
+            result.overpaid -= delta
+
+        if line.pk is None:
+            continue
+        if not values['days_worked'] and line.payment is None and not line.amount:
+            removed_lines.append(line)
+        else:
+            changed_lines.append(line)
+
+    Payment.objects.bulk_create(new_payments, batch_size=1000)
+    apply_payments(new_payments)
+    for payment in updated_payments:
+        payment.updated_at = started
+    Payment.objects.bulk_update(updated_payments, ['amount', 'updated_at'], batch_size=1000)
+    apply_payments(previous_payments, sign=-1)
+    apply_payments(updated_payments)
+    # Deleting fires the ledger's post_delete handler for each payment
+    Payment.objects.filter(pk__in=[p.pk for p in dropped_payments]).delete()
+
+    PayrollLine.objects.bulk_create(new_lines, batch_size=1000)
+    for line in changed_lines:
+        line.updated_at = started
+    PayrollLine.objects.bulk_update(changed_lines, LINE_FIELDS, batch_size=1000)
+    PayrollLine.objects.filter(pk__in=[line.pk for line in removed_lines]).delete()
+
+    result.lines_created, result.lines_updated = len(new_lines), len(changed_lines)
+    result.lines_removed = len(removed_lines)
+    result.payments_created, result.payments_updated = len(new_payments), len(updated_payments)
+
+    run.total = (run.lines.aggregate(total=Sum('amount'))['total'] or ZERO).quantize(CENT)
+    run.computed_at = started
+    run.save(update_fields=['total', 'computed_at', 'updated_at'])
+    return result
@@ -0,0 +1,57 @@
+import logging
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper hook that counts queries on every connection it is installed on"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a view may run.
+
+    Queries are counted with connection.execute_wrapper, so this works with
+    DEBUG off. Going over budget logs a warning, or raises
+    QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is true (tests).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = view(request, *args, **kwargs)
+                # Lazy responses render their template on first access
+                if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                    response.render()
+
+            if counter.count > max_queries:
+                message = (f'{view.__module__}.{view.__name__} ran {counter.count} queries '
+                           f'(budget {max_queries}) for {request.method} {request.path}')
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
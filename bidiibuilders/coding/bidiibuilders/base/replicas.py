@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+
+REPLICA = 'replica'
+# Set after a client's write; its reads stay on the primary until it expires
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# True while a replica_reads view runs; the first write of the request clears it
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    """The replica's alias, or None when no replica is configured"""
+    return REPLICA if REPLICA in connections.settings else None
+
+
+@contextmanager
+def reading_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    Serve a read-only view's queries from the replica.
+
+    For whole-table staff listings and reports, where a few seconds of
+    replication lag is fine. Clients that wrote recently (PIN_COOKIE) read
+    from the primary so they see their own changes.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        with reading_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads of replica_reads views go to the replica; everything else, and every write, to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return None
+        alias = replica_alias()
+        # Inside a transaction the primary has state the replica can't see yet
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Later reads in this request must see the write
+        _use_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class PinPrimaryMiddleware(MiddlewareMixin):
+    """After an unsafe request, keep the client on the primary until the replica has caught up"""
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and replica_alias():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.DB_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
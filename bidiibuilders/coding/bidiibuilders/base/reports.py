@@ -0,0 +1,275 @@
+import csv
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import BigIntegerField, Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractYear, Round, Substr
+
+from .ledger_io import Echo
+from .models import Payment, Project, TimeLog
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the pure-Python path computes the same report
+    np = None
+
+
+PERIODS = {'month': 12, 'quarter': 4}
+# Report dimension -> Payment column; None reports company-wide totals
+GROUPS = {
+    'category': 'category',
+    'method': 'payment_method',
+    'project': 'project_id',
+    None: None,
+}
+REPORT_COLUMNS = ['period', 'group', 'received', 'paid', 'net', 'balance', 'delta', 'hours']
+
+
+@dataclass
+class CashFlowReport:
+    period: str
+    group_by: str
+    periods: list
+    groups: list
+    # (period x group) grids, in cents / hundredths of an hour
+    received: list
+    paid: list
+    net: list
+    balance: list
+    delta: list
+    hours: list
+
+    def rows(self):
+        """One dict per (period, group), amounts as 2-decimal strings"""
+        for p, period in enumerate(self.periods):
+            for g, group in enumerate(self.groups):
+                yield {
+                    'period': period, 'group': group,
+                    'received': _money(self.received[p][g]), 'paid': _money(self.paid[p][g]),
+                    'net': _money(self.net[p][g]), 'balance': _money(self.balance[p][g]),
+                    'delta': _money(self.delta[p][g]), 'hours': _money(self.hours[p][g]),
+                }
+
+    def as_dict(self):
+        return {'period': self.period, 'group_by': self.group_by, 'periods': self.periods,
+                'groups': self.groups, 'rows': list(self.rows())}
+
+    def csv_lines(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(REPORT_COLUMNS)
+        for row in self.rows():
+            yield writer.writerow([row[column] for column in REPORT_COLUMNS])
+
+
+def _money(cents):
+    return str(Decimal(int(cents)).scaleb(-2))
+
+
+def _cents(field):
+    # Whole cents from the database, so no Decimal is built per row
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+
+# ==================== COLUMN PULLS ====================
+def _month_number(vendor):
+    """Months since January 1970 of the row's date, computed in SQL"""
+    if vendor == 'sqlite':
+        # Dates are ISO text there; Extract* would call a Python function per row
+        year = Cast(Substr('date', 1, 4), IntegerField())
+        month = Cast(Substr('date', 6, 2), IntegerField())
+    else:
+        year, month = ExtractYear('date'), ExtractMonth('date')
+    return (year - 1970) * 12 + month - 1
+
+
+def _group_value(group_by):
+    column = GROUPS[group_by]
+    if column is None:
+        return Value('all')
+    if group_by == 'project':
+        return Coalesce(column, 0)
+    return F(column)
+
+
+def payment_columns(group_by, date_from=None, date_to=None):
+    """Completed, dated payments as (month number, group, cents, is_received) columns"""
+    payments = Payment.objects.filter(status='completed', date__isnull=False)
+    if date_from:
+        payments = payments.filter(date__gte=date_from)
+    if date_to:
+        payments = payments.filter(date__lte=date_to)
+    return _columns(payments.order_by().values_list(
+        _month_number(connections[payments.db].vendor), _group_value(group_by), _cents('amount'),
+        Case(When(type='received', then=Value(1)), default=Value(0)),
+    ), 4)
+
+
+def opening_balances(group_by, date_from):
+    """Net of everything completed before the report starts, per group, in cents"""
+    if not date_from:
+        return {}
+    rows = (
+        Payment.objects.filter(status='completed', date__lt=date_from).order_by()
+        .values_list(_group_value(group_by))
+        .annotate(net=Sum(Case(When(type='received', then=_cents('amount')), default=-_cents('amount'))))
+    )
+    return dict(rows)
+
+
+def hour_columns(group_by, date_from=None, date_to=None):
+    """Closed time logs as (month number, group, centi-hours) columns"""
+    logs = TimeLog.objects.filter(hours_worked__isnull=False)
+    if date_from:
+        logs = logs.filter(date__gte=date_from)
+    if date_to:
+        logs = logs.filter(date__lte=date_to)
+    return _columns(logs.order_by().values_list(
+        _month_number(connections[logs.db].vendor), _group_value(group_by), _cents('hours_worked'),
+    ), 3)
+
+
+def _columns(queryset, width):
+    """
+    Run a values_list query on the raw cursor and transpose it into columns.
+
+    Skipping the ORM's per-row converters matters at this volume; the
+    columns hold only ints and strings.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows)]
+
+
+# ==================== VECTOR KERNELS ====================
+def _period_keys(months, period):
+    """Number periods consecutively from January 1970: months, or quarters"""
+    per_month = 3 if period == 'quarter' else 1
+    if np is not None:
+        return np.asarray(months, dtype=np.int64) // per_month
+    return [month // per_month for month in months]
+
+
+def _encode(labels):
+    """(sorted unique labels, index of each label)"""
+    if np is not None:
+        uniques, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        return uniques.tolist(), inverse
+    uniques = sorted(set(labels))
+    position = {label: i for i, label in enumerate(uniques)}
+    return uniques, [position[label] for label in labels]
+
+
+def _grid(period_idx, group_idx, values, shape):
+    """Sum values into a (period x group) grid"""
+    n_periods, n_groups = shape
+    if np is not None:
+        flat = np.bincount(np.asarray(period_idx, dtype=np.int64) * n_groups + np.asarray(group_idx, dtype=np.int64),
+                           weights=np.asarray(values, dtype=np.float64), minlength=n_periods * n_groups)
+        return np.rint(flat).astype(np.int64).reshape(shape)
+    grid = [[0] * n_groups for _ in range(n_periods)]
+    for p, g, value in zip(period_idx, group_idx, values):
+        grid[p][g] += value
+    return grid
+
+
+def _running(grid, opening):
+    """Cumulative sum down the periods, starting from each group's opening balance"""
+    if np is not None:
+        return np.cumsum(grid, axis=0) + np.asarray(opening, dtype=np.int64)
+    totals, running = list(opening), []
+    for row in grid:
+        totals = [total + value for total, value in zip(totals, row)]
+        running.append(totals)
+    return running
+
+
+def _deltas(grid):
+    """Change from the previous period (the first period against zero)"""
+    if np is not None:
+        return np.diff(grid, axis=0, prepend=np.zeros((1, grid.shape[1]), dtype=np.int64))
+    previous, deltas = [0] * (len(grid[0]) if grid else 0), []
+    for row in grid:
+        deltas.append([value - before for value, before in zip(row, previous)])
+        previous = row
+    return deltas
+
+
+def _tolist(grid):
+    return grid.tolist() if np is not None else grid
+
+
+def _label_period(key, period):
+    year, index = divmod(int(key), PERIODS[period])
+    year += 1970
+    return f'{year}-{index + 1:02d}' if period == 'month' else f'{year}-Q{index + 1}'
+
+
+# ==================== REPORT ====================
+def cash_flow_report(period='month', group_by=None, date_from=None, date_to=None):
+    """
+    Company-wide cash flow per period and group.
+
+    Columns are pulled once with values_list (whole cents computed in SQL),
+    bucketed into periods and reduced with bincount/cumsum/diff over a dense
+    period x group grid, so the cost is one pass over the rows whatever
+    the number of groups. received/paid/net are per period; balance is the
+    running net (from the opening balance before date_from); delta is the
+    change in net from the previous period; hours are logged labour.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if group_by not in GROUPS:
+        raise ValueError(f"group must be one of {', '.join(g for g in GROUPS if g)}")
+
+    p_months, p_groups, cents, received = payment_columns(group_by, date_from, date_to)
+    # Hours can't be split by category or payment method
+    with_hours = group_by in (None, 'project')
+    h_months, h_groups, centi_hours = hour_columns(group_by, date_from, date_to) if with_hours else ([], [], [])
+    opening = opening_balances(group_by, date_from)
+
+    n_payments, n_logs = len(p_months), len(h_months)
+    if not n_payments + n_logs:
+        return CashFlowReport(period, group_by or 'all', [], [], [], [], [], [], [], [])
+    keys = _period_keys(p_months + h_months, period)
+    first, last = (int(keys.min()), int(keys.max())) if np is not None else (min(keys), max(keys))
+    n_periods = last - first + 1
+    groups, group_idx = _encode(p_groups + h_groups + list(opening))
+    shape = (n_periods, len(groups))
+
+    if np is not None:
+        period_idx = keys - first
+        cents = np.asarray(cents, dtype=np.int64)
+        is_received = np.asarray(received, dtype=bool)
+        received_cents = np.where(is_received, cents, 0)
+        paid_cents = np.where(is_received, 0, cents)
+    else:
+        period_idx = [key - first for key in keys]
+        received_cents = [c if r else 0 for c, r in zip(cents, received)]
+        paid_cents = [0 if r else c for c, r in zip(cents, received)]
+
+    received_grid = _grid(period_idx[:n_payments], group_idx[:n_payments], received_cents, shape)
+    paid_grid = _grid(period_idx[:n_payments], group_idx[:n_payments], paid_cents, shape)
+    hours_grid = _grid(period_idx[n_payments:], group_idx[n_payments:n_payments + n_logs], centi_hours, shape)
+    if np is not None:
+        net_grid = received_grid - paid_grid
+    else:
+        net_grid = [[r - p for r, p in zip(rr, pr)] for rr, pr in zip(received_grid, paid_grid)]
+    opening_row = [opening.get(group, 0) or 0 for group in groups]
+
+    labels = groups
+    if group_by == 'project':
+        names = dict(Project.objects.filter(id__in=groups).values_list('id', 'name'))
+        labels = [names.get(project_id, 'No project') for project_id in groups]
+    return CashFlowReport(
+        period=period, group_by=group_by or 'all',
+        periods=[_label_period(first + p, period) for p in range(n_periods)],
+        groups=[str(label) for label in labels],
+        received=_tolist(received_grid), paid=_tolist(paid_grid), net=_tolist(net_grid),
+        balance=_tolist(_running(net_grid, opening_row)), delta=_tolist(_deltas(net_grid)),
+        hours=_tolist(hours_grid),
+    )
@@ -0,0 +1,125 @@
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+
+from .models import Project, Task, Payment
+
+
+# Control characters never appear in user text, so they are safe markers
+# for highlight() output until the text has been HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass(frozen=True)
+class SearchEntity:
+    type: str
+    model: type
+    title_column: str
+    snippet_column: str
+    columns: tuple
+    url_name: str
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def fts_table(self):
+        return f'{self.table}_fts'
+
+
+# Column order must match the FTS5 tables created in migration 0009
+ENTITIES = [
+    SearchEntity('project', Project, 'name', 'description',
+                 ('name', 'client_name', 'location', 'description'), 'projects'),
+    SearchEntity('task', Task, 'title', 'description', ('title', 'description'), 'schedule'),
+    SearchEntity('payment', Payment, 'reference', 'description', ('description', 'reference'), 'payments'),
+]
+
+
+def fts_query(text):
+    """
+    Turn free text into a safe FTS5 query.
+
+    Every word is quoted (so FTS5 operators in user input are inert) and
+    prefix-matched; words are ANDed together.
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    return ' '.join(f'"{token}"*' for token in tokens[:10])
+
+
+def render_highlight(text):
+    """HTML-escape FTS output and turn the markers into <mark> tags"""
+    return escape(text or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+# ==================== FTS5 BACKEND ====================
+def _search_entity_fts(entity, user, match, limit):
+    fts = entity.fts_table
+    title_idx = entity.columns.index(entity.title_column)
+    snippet_idx = entity.columns.index(entity.snippet_column)
+    sql = (
+        f"SELECT t.id, highlight({fts}, {title_idx}, %s, %s), "
+        f"snippet({fts}, {snippet_idx}, %s, %s, '…', 16), bm25({fts}) AS rank "
+        f"FROM {fts} JOIN {entity.table} t ON t.id = {fts}.rowid "
+        f"WHERE {fts} MATCH %s AND t.user_id = %s "
+        f"ORDER BY rank LIMIT %s"
+    )
+    params = [MARK_START, MARK_END, MARK_START, MARK_END, match, user.pk, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {'id': pk, 'title': render_highlight(title), 'snippet': render_highlight(snippet), 'rank': rank}
+        for pk, title, snippet, rank in rows
+    ]
+
+
+# ==================== FALLBACK BACKEND ====================
+def _search_entity_like(entity, user, tokens, limit):
+    """Non-SQLite fallback: AND of icontains over the indexed columns, unranked"""
+    queryset = entity.model.objects.filter(user=user)
+    for token in tokens:
+        condition = Q()
+        for column in entity.columns:
+            condition |= Q(**{f'{column}__icontains': token})
+        queryset = queryset.filter(condition)
+    rows = queryset.values('id', entity.title_column, entity.snippet_column)[:limit]
+    return [
+        {'id': row['id'], 'title': escape(row[entity.title_column] or ''),
+         'snippet': escape((row[entity.snippet_column] or '')[:200]), 'rank': 0.0}
+        for row in rows
+    ]
+
+
+def search(user, text, types=None, limit=20):
+    """
+    Full-text search across a user's projects, tasks and payments.
+
+    Returns hits ranked by BM25 (best first), each with HTML-safe title and
+    snippet strings where matches are wrapped in <mark>.
+    """
+    match = fts_query(text)
+    if not match:
+        return []
+
+    hits = []
+    for entity in ENTITIES:
+        if types and entity.type not in types:
+            continue
+        if connection.vendor == 'sqlite':
+            rows = _search_entity_fts(entity, user, match, limit)
+        else:
+            rows = _search_entity_like(entity, user, TOKEN_RE.findall(text.lower())[:10], limit)
+        url = reverse(entity.url_name)
+        for row in rows:
+            row.update({'type': entity.type, 'url': url})
+            hits.append(row)
+
+    hits.sort(key=lambda hit: hit['rank'])
+    return hits[:limit]
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import Count, F, Value
+
+from .models import Worker, WorkerSkill
+
+
+def normalize_skills(skills):
+    """Lower-case, trimmed, de-duplicated skill names from a Worker.skills list"""
+    if not isinstance(skills, (list, tuple)):
+        return set()
+    return {str(skill).strip().lower() for skill in skills if str(skill).strip()}
+
+
+# ==================== INDEX SYNC ====================
+def sync_worker_skills(worker):
+    """Make the WorkerSkill rows of one worker match its skills JSON"""
+    wanted = normalize_skills(worker.skills)
+    current = set(WorkerSkill.objects.filter(worker=worker).values_list('skill', flat=True))
+    if wanted == current:
+        return
+    with transaction.atomic():
+        WorkerSkill.objects.filter(worker=worker, skill__in=current - wanted).delete()
+        WorkerSkill.objects.bulk_create(
+            [WorkerSkill(worker=worker, skill=skill) for skill in wanted - current],
+            ignore_conflicts=True,
+        )
+
+
+def worker_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_worker_skills(instance)
+
+
+@transaction.atomic
+def rebuild_skill_index():
+    """Recreate every WorkerSkill row from Worker.skills; returns the row count"""
+    WorkerSkill.objects.all().delete()
+    rows = [
+        WorkerSkill(worker_id=worker_id, skill=skill)
+        for worker_id, skills in Worker.objects.values_list('id', 'skills').iterator()
+        for skill in normalize_skills(skills)
+    ]
+    WorkerSkill.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ==================== SEARCH ====================
+SEARCH_FIELDS = ('id', 'name', 'role', 'phone', 'daily_rate', 'rating', 'experience_years',
+                 'completed_projects', 'status', 'skills')
+
+
+def search_workers(skills=(), match='any', trade=None, status=None, min_rating=None,
+                   min_experience=None, min_rate=None, max_rate=None, limit=20):
+    """
+    Rank workers for a skill/trade query.
+
+    Workers are ordered by how many of the requested skills they have, then
+    rating, experience and completed projects. match='all' keeps only
+    workers with every requested skill. Returns a list of dicts.
+    """
+    skills = sorted(normalize_skills(list(skills)))
+    workers = Worker.objects.all()
+    if trade:
+        workers = workers.filter(role=trade)
+    if status:
+        workers = workers.filter(status=status)
+    if min_rating is not None:
+        workers = workers.filter(rating__gte=min_rating)
+    if min_experience is not None:
+        workers = workers.filter(experience_years__gte=min_experience)
+    if min_rate is not None:
+        workers = workers.filter(daily_rate__gte=min_rate)
+    if max_rate is not None:
+        workers = workers.filter(daily_rate__lte=max_rate)
+
+    if skills:
+        # Filtering the join first makes Count() count matched skills only
+        workers = workers.filter(skill_index__skill__in=skills).annotate(matched_skills=Count('skill_index'))
+        if match == 'all':
+            workers = workers.filter(matched_skills=len(skills))
+    else:
+        workers = workers.annotate(matched_skills=Value(0))
+
+    ranked = workers.order_by(
+        F('matched_skills').desc(), F('rating').desc(), F('experience_years').desc(nulls_last=True),
+        F('completed_projects').desc(), 'name', 'id',
+    ).values(*SEARCH_FIELDS, 'matched_skills')[:limit]
+    return list(ranked)
@@ -0,0 +1,277 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SlowQuery
+
+
+logger = logging.getLogger(__name__)
+
+# Statements EXPLAIN accepts on every backend
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+MAX_SAMPLE = 10000
+# Frames in these files are the hooks themselves, never the caller
+HOOK_FILES = {os.path.join(os.path.dirname(__file__), name) for name in ('slowqueries.py', 'metrics.py',
+                                                                           'querybudget.py')}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ROWS = re.compile(r'\((?:\?|\.\.\.)\)(?:\s*,\s*\((?:\?|\.\.\.)\))+')
+_SPACE = re.compile(r'\s+')
+
+# The request whose view is running, for the view name
+_request = ContextVar('slow_query_request', default=None)
+# Set while the log runs its own EXPLAINs and writes, which are not logged
+_recording = ContextVar('slow_query_recording', default=False)
+
+# fingerprint -> entry, waiting for flush()
+_pending = {}
+_pending_lock = threading.Lock()
+# fingerprint -> slowest run explained by this process, so a hot statement isn't explained on every run
+_explained = {}
+
+
+def reset():
+    """Forget pending entries and explained statements (tests)"""
+    with _pending_lock:
+        _pending.clear()
+    _explained.clear()
+
+
+# ==================== FINGERPRINTS ====================
+def normalize(sql):
+    """
+    The statement with literals and placeholders as ?, and IN lists and
+    multi-row VALUES collapsed, so its runs share one fingerprint.
+    """
+    sql = _STRING.sub('?', sql).replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    sql = _ROWS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(statement):
+    return hashlib.sha1(statement.encode()).hexdigest()
+
+
+# ==================== CAPTURE ====================
+def _caller():
+    """'path:line in function' of the innermost project frame outside the hooks"""
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename not in HOOK_FILES:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def _view():
+    request = _request.get()
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ''
+    return f'{match.func.__module__}.{match.func.__qualname__}'
+
+
+def _format_plan(connection, rows):
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail): indent each step under its parent
+        depth, lines = {}, []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def _is_data(sql):
+    return sql.lstrip()[:6].upper().startswith(EXPLAINABLE)
+
+
+def explain(connection, sql, params):
+    """
+    The statement's plan, or '' when it can't be explained.
+
+    Runs on a raw cursor, so the EXPLAIN bypasses the execute wrappers and
+    isn't counted as one of the request's queries.
+    """
+    if not _is_data(sql):
+        return ''
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return _format_plan(connection, cursor.fetchall())
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+    finally:
+        cursor.close()
+
+
+def record(connection, sql, params, many, elapsed_ms):
+    """Add one slow run to the pending entries; True if it is the first of its fingerprint since the last flush"""
+    statement = normalize(sql)
+    key = fingerprint(statement)
+    sample = {
+        'max_ms': elapsed_ms,
+        'sample_sql': sql[:MAX_SAMPLE],
+        # executemany's parameter list may already be used up
+        'sample_params': '' if many else repr(params)[:MAX_SAMPLE],
+        'view': _view()[:200],
+        'location': _caller()[:300],
+        'plan': None,
+    }
+    if not many and elapsed_ms > _explained.get(key, 0):
+        _explained[key] = elapsed_ms
+        sample['plan'] = explain(connection, sql, params)
+
+    with _pending_lock:
+        entry = _pending.get(key)
+        first = entry is None
+        if first:
+            entry = _pending[key] = {'statement': statement, 'database': connection.alias, 'calls': 0,
+                                     'total_ms': 0.0, 'max_ms': 0.0}
+        entry['calls'] += 1
+        entry['total_ms'] += elapsed_ms
+        if elapsed_ms > entry['max_ms']:
+            entry.update((name, value) for name, value in sample.items() if value is not None)
+    return first
+
+
+def log_slow_query(execute, sql, params, many, context):
+    """
+    execute_wrapper hook: record queries slower than settings.SLOW_QUERY_MS.
+
+    Transaction control (BEGIN, SAVEPOINT, COMMIT, ...) is not recorded: it
+    is slow only while waiting on a lock, and atomic() runs it where a
+    flush would nest a transaction.
+    """
+    if _recording.get() or not _is_data(sql):
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed_ms = (perf_counter() - started) * 1000
+    if elapsed_ms > settings.SLOW_QUERY_MS:
+        connection = context['connection']
+        token = _recording.set(True)
+        try:
+            first = record(connection, sql, params, many, elapsed_ms)
+        finally:
+            _recording.reset(token)
+        # Outside a request (commands, jobs) there is no request_finished to
+        # flush on, so flush when the transaction commits. In autocommit
+        # on_commit would run now, inside this wrapper and with the
+        # statement's cursor still open; the entry then waits for the next
+        # flush (the job runner's, or the command's own).
+        if first and _request.get() is None and connection.in_atomic_block:
+            transaction.on_commit(flush, using=connection.alias)
+    return result
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """connection_created: log the connection's slow queries"""
+    if log_slow_query not in connection.execute_wrappers:
+        # Out of the way of execute_wrapper() blocks, which pop the last wrapper
+        connection.execute_wrappers.insert(0, log_slow_query)
+
+
+# ==================== STORAGE ====================
+def flush(**kwargs):
+    """
+    Write the pending entries to SlowQuery, adding to each fingerprint's
+    counts; returns how many were written. Also connected to
+    request_finished.
+    """
+    if not _pending:
+        return 0
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    token = _recording.set(True)
+    unwritten = dict(pending)
+    try:
+        now = timezone.now()
+        for key, entry in pending.items():
+            sample = {name: entry[name] for name in ('sample_sql', 'sample_params', 'view', 'location', 'plan')
+                      if name in entry}
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                row, created = SlowQuery.objects.get_or_create(fingerprint=key, defaults={
+                    'statement': entry['statement'], 'database': entry['database'], 'calls': entry['calls'],
+                    'total_ms': entry['total_ms'], 'max_ms': entry['max_ms'], 'last_seen': now, **sample,
+                })
+                if not created:
+                    SlowQuery.objects.filter(pk=row.pk).update(
+                        calls=F('calls') + entry['calls'], total_ms=F('total_ms') + entry['total_ms'],
+                        last_seen=now)
+                    SlowQuery.objects.filter(pk=row.pk, max_ms__lt=entry['max_ms']).update(
+                        max_ms=entry['max_ms'], **sample)
+            del unwritten[key]
+    except DatabaseError as exc:
+        # Never fail the request or job over its slow-query log; keep the
+        # entries for the next flush
+        logger.warning('Could not write %d slow query fingerprint(s): %s', len(unwritten), exc)
+        _restore(unwritten)
+    finally:
+        _recording.reset(token)
+    return len(pending) - len(unwritten)
+
+
+def _restore(entries):
+    """Put entries a flush couldn't write back, merged with runs recorded since"""
+    with _pending_lock:
+        for key, entry in entries.items():
+            newer = _pending.get(key)
+            if newer is None:
+                _pending[key] = entry
+                continue
+            newer['calls'] += entry['calls']
+            newer['total_ms'] += entry['total_ms']
+            if entry['max_ms'] > newer['max_ms']:
+                newer.update((name, value) for name, value in entry.items()
+                             if name not in ('calls', 'total_ms'))
+
+
+# ==================== MIDDLEWARE ====================
+class SlowQueryMiddleware:
+    """Tell the slow-query log which request, and so which view, is running"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SLOW_QUERY_LOG', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
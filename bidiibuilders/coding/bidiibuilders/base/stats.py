@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .ledger import user_totals
+from .models import Project, Worker, Task
+
+
+# ==================== DASHBOARD STATS ====================
+@dataclass(frozen=True)
+class DashboardStats:
+    """KPI summary shown on the client dashboard"""
+    projects_count: int
+    completed_projects: int
+    active_projects: int
+    pending_projects: int
+    total_budget: Decimal
+
+    total_workers: int
+    available_workers: int
+    on_project_workers: int
+
+    monthly_payments: Decimal
+    received_payments: Decimal
+    pending_payments: Decimal
+
+    tasks_this_week: int
+
+    def as_context(self):
+        """Return the stats as a template context dict"""
+        return dict(self.__dict__)
+
+
+def week_bounds(today):
+    """Return the (monday, sunday) dates of the week containing today"""
+    week_start = today - timedelta(days=today.weekday())
+    return week_start, week_start + timedelta(days=6)
+
+
+def project_stats(user):
+    return Project.objects.filter(user=user).aggregate(
+        projects_count=Count('id'),
+        completed_projects=Count('id', filter=Q(status='completed')),
+        active_projects=Count('id', filter=Q(status='active')),
+        pending_projects=Count('id', filter=Q(status='planning')),
+        total_budget=Sum('budget'),
+    )
+
+
+def worker_stats(user):
+    return Worker.objects.filter(user=user).aggregate(
+        total_workers=Count('id'),
+        available_workers=Count('id', filter=Q(status='available')),
+        on_project_workers=Count('id', filter=Q(status='busy')),
+    )
+
+
+def payment_stats(user, today):
+    totals = user_totals(user, today)
+    return {
+        'monthly_payments': totals['monthly_total'],
+        'received_payments': totals['total_received'],
+        'pending_payments': totals['total_pending'],
+    }
+
+
+def task_stats(user, today):
+    week_start, week_end = week_bounds(today)
+    return Task.objects.filter(user=user).aggregate(
+        tasks_this_week=Count('id', filter=Q(date__gte=week_start, date__lte=week_end)),
+    )
+
+
+def get_dashboard_stats(user, today=None):
+    """
+    Compute every dashboard KPI for a user.
+
+    Runs one conditional-aggregation query per model (payments are read
+    from the PaymentRollup table), so the number of queries stays the same
+    however many rows the user owns.
+    """
+    today = today or timezone.localdate()
+    values = {}
+    values.update(project_stats(user))
+    values.update(worker_stats(user))
+    values.update(payment_stats(user, today))
+    values.update(task_stats(user, today))
+
+    # SUM over an empty set comes back as NULL
+    for key in ('total_budget', 'monthly_payments', 'received_payments', 'pending_payments'):
+        values[key] = values[key] or Decimal('0')
+
+    return DashboardStats(**values)
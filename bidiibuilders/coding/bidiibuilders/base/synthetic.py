@@ -0,0 +1,243 @@
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .financials import rebuild_project_costs
+from .ledger import rebuild_rollups
+from .models import (JobApplication, Payment, Project, RecurringTask, Skill, Task, TimeLog, Worker,
+                     WorkerBooking)
+from .skills import rebuild_skill_index
+
+
+USERNAME_PREFIX = 'synthetic-'
+PASSWORD = 'synthetic-pass'
+# The client and the staff worker the benchmarks log in as
+OWNER = f'{USERNAME_PREFIX}client-0'
+STAFF = f'{USERNAME_PREFIX}worker-0'
+# Dates are spread around this day, so runs on different days generate the same rows
+TODAY = date(2025, 6, 30)
+# Share of all rows that belong to OWNER, so its pages grow with the scale
+OWNER_SHARE = 0.5
+
+# Rows per payment row: payments are the largest table and set the scale
+RATIOS = {
+    'clients': 1 / 2000,
+    'workers': 1 / 100,
+    'projects': 1 / 100,
+    'tasks': 1 / 10,
+    'recurring_tasks': 1 / 1000,
+    'applications': 1 / 20,
+    'time_logs': 1 / 5,
+    'bookings': 1 / 50,
+}
+MINIMUM = {'clients': 2, 'workers': 5, 'projects': 4, 'recurring_tasks': 1}
+
+SKILLS = [name for name, _ in Skill.SKILL_CHOICES]
+PLACES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Machakos', 'Nyeri']
+WORDS = ['Villa', 'Apartments', 'Warehouse', 'Clinic', 'School', 'Shop', 'Office', 'Church', 'Hostel', 'Mall']
+FIRST_NAMES = ['Juma', 'Achieng', 'Otieno', 'Wanjiku', 'Kamau', 'Njeri', 'Mwangi', 'Akinyi', 'Kiprop', 'Atieno']
+
+
+@dataclass
+class Counts:
+    rows: dict = field(default_factory=dict)
+
+    def add(self, name, n):
+        self.rows[name] = self.rows.get(name, 0) + n
+
+
+def plan(rows):
+    """Row count per table for a scale of `rows` payments"""
+    sizes = {name: max(int(rows * ratio), MINIMUM.get(name, 0)) for name, ratio in RATIOS.items()}
+    return {'payments': rows, **sizes}
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Generator:
+    """
+    Deterministic synthetic data: the same seed and scale give the same rows.
+
+    Rows are built lazily and written with bulk_create in batches, so
+    memory stays flat at any scale. bulk_create skips signals, so the
+    rollup, cost and skill index tables are rebuilt once at the end.
+    """
+
+    def __init__(self, rows, seed=0, batch_size=5000, today=TODAY):
+        self.sizes = plan(rows)
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today
+        self.counts = Counts()
+
+    def owner_or(self, choices, first=False):
+        # The first row of a table always goes to the owner, so the benchmark cases find one at any scale
+        return choices[0] if first or self.rng.random() < OWNER_SHARE else self.rng.choice(choices)
+
+    def day(self, back=365, ahead=0):
+        return self.today + timedelta(days=self.rng.randint(-back, ahead))
+
+    def save(self, model, objects):
+        created = []
+        for batch in _batches(objects, self.batch_size):
+            created.extend(model.objects.bulk_create(batch))
+        self.counts.add(model._meta.db_table, len(created))
+        return created
+
+    def stream(self, model, objects):
+        """bulk_create without keeping the objects (for the large tables)"""
+        total = 0
+        for batch in _batches(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        self.counts.add(model._meta.db_table, total)
+
+    @transaction.atomic
+    def run(self):
+        password = make_password(PASSWORD)
+        sizes, rng = self.sizes, self.rng
+        clients = self.save(User, (
+            User(username=f'{USERNAME_PREFIX}client-{i}', password=password, email=f'client{i}@example.com',
+                 first_name=rng.choice(FIRST_NAMES))
+            for i in range(sizes['clients'])
+        ))
+        worker_users = self.save(User, (
+            User(username=f'{USERNAME_PREFIX}worker-{i}', password=password, is_staff=True)
+            for i in range(sizes['workers'])
+        ))
+        roles = [role for role, _ in Worker.ROLE_CHOICES]
+        statuses = ['available'] * 6 + ['busy'] * 3 + ['on_leave', 'inactive']
+        workers = self.save(Worker, (
+            Worker(user=user, name=f'{rng.choice(FIRST_NAMES)} {i}', role=rng.choice(roles),
+                   phone=f'07{rng.randrange(10 ** 8):08d}', daily_rate=Decimal(rng.randrange(500, 3000, 50)),
+                   experience_years=rng.randrange(0, 25), skills=rng.sample(SKILLS, rng.randint(1, 4)),
+                   status=rng.choice(statuses), rating=Decimal(rng.randrange(20, 51)) / 10,
+                   completed_projects=rng.randrange(0, 60))
+            for i, user in enumerate(worker_users)
+        ))
+
+        project_statuses = [status for status, _ in Project.STATUS_CHOICES]
+        projects = self.save(Project, (self.project(clients, project_statuses, i) for i in range(sizes['projects'])))
+        by_owner = {}
+        for project in projects:
+            by_owner.setdefault(project.user_id, []).append(project)
+
+        self.stream(Payment, (self.payment(clients, by_owner, i) for i in range(sizes['payments'])))
+        self.stream(Task, (self.task(clients, by_owner, i) for i in range(sizes['tasks'])))
+        self.save(RecurringTask, (
+            RecurringTask(user=self.owner_or(clients, first=not i), title=f'Safety check {i}', type='safety_check',
+                          time=time(rng.randrange(6, 10)), frequency=rng.choice(['daily', 'weekly', 'monthly']),
+                          interval=rng.randint(1, 3), start_date=self.day(365))
+            for i in range(sizes['recurring_tasks'])
+        ))
+
+        # An application to the owner's first project, from someone other than the staff worker
+        pairs = {(len(workers) - 1, 0)}
+        limit = min(sizes['applications'], len(workers) * len(projects))
+        while len(pairs) < limit:
+            pairs.add((rng.randrange(len(workers)), rng.randrange(len(projects))))
+        app_statuses = ['applied'] * 5 + ['accepted'] * 3 + ['rejected', 'completed']
+        self.stream(JobApplication, (
+            JobApplication(worker=workers[w], project=projects[p], status=rng.choice(app_statuses),
+                           cover_letter='Experienced and available.')
+            for w, p in sorted(pairs)
+        ))
+        self.stream(TimeLog, (self.time_log(workers, projects) for _ in range(sizes['time_logs'])))
+        self.stream(WorkerBooking, self.bookings(workers, projects, sizes['bookings']))
+
+        self.counts.add('base_paymentrollup', rebuild_rollups())
+        self.counts.add('base_projectcost', rebuild_project_costs())
+        self.counts.add('base_workerskill', rebuild_skill_index())
+        return self.counts.rows
+
+    def project(self, clients, statuses, i):
+        rng = self.rng
+        start = self.day(540, 60)
+        return Project(
+            user=self.owner_or(clients, first=not i), name=f'{rng.choice(PLACES)} {rng.choice(WORDS)} {i}',
+            location=rng.choice(PLACES), client_name=f'{rng.choice(FIRST_NAMES)} Holdings',
+            budget=Decimal(rng.randrange(100, 50000)) * 1000, status=rng.choice(statuses),
+            description='Construction of a ' + rng.choice(WORDS).lower(),
+            start_date=start, end_date=start + timedelta(days=rng.randrange(14, 365)),
+            progress=rng.randrange(0, 101), required_skills=rng.sample(SKILLS, rng.randint(1, 3)),
+            crew_size=rng.randint(1, 12),
+        )
+
+    def payment(self, clients, by_owner, i):
+        rng = self.rng
+        user = self.owner_or(clients, first=not i)
+        received = rng.random() < 0.4
+        return Payment(
+            user=user, project=rng.choice(by_owner[user.pk]) if user.pk in by_owner and rng.random() < 0.8 else None,
+            type='received' if received else 'paid',
+            category='client_payment' if received else rng.choice(
+                ['worker_wages', 'materials', 'equipment', 'transport', 'utilities', 'other']),
+            amount=Decimal(rng.randrange(100, 500000)) / 100 * (10 if received else 1),
+            date=self.day(730), status=rng.choice(['completed'] * 8 + ['pending', 'cancelled']),
+            payment_method=rng.choice(['cash', 'mpesa', 'mpesa', 'bank', 'cheque']),
+            reference=f'SYN{i:09d}',
+        )
+
+    def task(self, clients, by_owner, i):
+        rng = self.rng
+        user = self.owner_or(clients, first=not i)
+        when = self.day(180, 180)
+        return Task(
+            user=user, title=f'{rng.choice(["Inspect", "Deliver", "Meet", "Pour", "Check"])} '
+                             f'{rng.choice(WORDS).lower()}',
+            type=rng.choice([t for t, _ in Task.TASK_TYPE_CHOICES]), date=when, time=time(rng.randrange(6, 18)),
+            project=rng.choice(by_owner[user.pk]) if user.pk in by_owner else None,
+            priority=rng.choice(['low', 'medium', 'medium', 'high', 'urgent']),
+            completed=when < self.today and rng.random() < 0.7,
+        )
+
+    def time_log(self, workers, projects):
+        rng = self.rng
+        day = self.day(365)
+        clock_in = timezone.make_aware(datetime.combine(day, time(rng.randrange(6, 9), rng.randrange(60))))
+        hours = Decimal(rng.randrange(240, 660)) / 60
+        worker = rng.choice(workers)
+        return TimeLog(worker=worker, project=rng.choice(projects), date=day, clock_in_time=clock_in,
+                       clock_out_time=clock_in + timedelta(hours=float(hours)),
+                       hours_worked=hours.quantize(Decimal('0.01')), daily_rate=worker.daily_rate)
+
+    def bookings(self, workers, projects, count):
+        """Back-to-back, never overlapping bookings, spread over the workers"""
+        rng = self.rng
+        next_free = {}
+        for _ in range(count):
+            worker = rng.choice(workers)
+            start = next_free.get(worker.pk, self.today - timedelta(days=180)) + timedelta(days=rng.randrange(0, 20))
+            end = start + timedelta(days=rng.randrange(0, 30))
+            next_free[worker.pk] = end + timedelta(days=1)
+            project = rng.choice(projects) if rng.random() < 0.8 else None
+            yield WorkerBooking(worker=worker, kind='project' if project else 'leave', project=project,
+                                start_date=start, end_date=end)
+
+
+def generate(rows, seed=0, batch_size=5000):
+    """Generate a scale's worth of rows; returns the row count per table"""
+    if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+        raise ValueError(f'Synthetic data already exists ({USERNAME_PREFIX}* users); flush it first')
+    return Generator(rows, seed, batch_size).run()
+
+
+def flush():
+    """Delete every synthetic user and, by cascade, everything they own"""
+    deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    return deleted
@@ -1,3 +1,1994 @@
-from django.test import TestCase
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import warnings
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core import mail
+from django.core.management.base import CommandError
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import F, Max, Min
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import metrics, slowqueries
+from .benchmarks import compare, run_suite, uncovered_views
+from .availability import BookingConflict, IntervalIndex, book_worker, conflicts, free_workers
+from .cache import bump, make_key, user_scope
+from .calendar import calendar_events, feed_token, occurrence_dates
+from .financials import find_cost_drift, project_financials
+from .jobqueue import claim, enqueue, job, requeue_stale, run_job
+from .ledger import apply_payments, find_drift, user_totals
+from .ledger_io import LEDGER_COLUMNS, import_payments as import_payments_csv
+from .matching import propose_workers, ranked_applicants
+from .models import (SlowQuery, Project, Worker, WorkerSkill, Payment, PaymentRollup, Task, JobApplication, TimeLog,
+                     ClockEvent, PayrollLine, ProjectCost, BackgroundJob, MatchScore, WorkerBooking, RecurringTask)
+from .pagination import EstimatedCountPaginator, InvalidCursor, KeysetPaginator
+from .payroll import PayrollError, run_payroll
+from .querybudget import QueryBudgetExceeded, query_budget
+from .replicas import PIN_COOKIE, REPLICA, PinPrimaryMiddleware, ReplicaRouter, reading_replica, replica_reads
+from .reports import cash_flow_report
+from .search import search
+from .skills import rebuild_skill_index, search_workers
+from .stats import get_dashboard_stats
+from .synthetic import flush, generate, plan
+
+
+def make_payments(user, count, **kwargs):
+    fields = {'type': 'received', 'category': 'client_payment', 'amount': Decimal('100.00'),
+              'date': date(2025, 11, 3)}
+    fields.update(kwargs)
+    apply_payments(Payment.objects.bulk_create(Payment(user=user, **fields) for _ in range(count)))
+
+
+# ==================== DASHBOARD STATS ====================
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.today = date(2025, 11, 5)
+
+    def seed(self, n):
+        Project.objects.bulk_create(
+            Project(user=self.user, name=f'P{i}', budget=1000, status=('active', 'completed', 'planning')[i % 3])
+            for i in range(n)
+        )
+        Worker.objects.bulk_create(
+            Worker(user=self.user, name=f'W{i}', role='mason', status=('available', 'busy')[i % 2])
+            for i in range(n)
+        )
+        make_payments(self.user, n)
+        make_payments(self.user, n, type='paid', category='materials', status='pending', date=date(2025, 10, 1))
+        Task.objects.bulk_create(
+            Task(user=self.user, title=f'T{i}', type='meeting', date=self.today, time=time(9))
+            for i in range(n)
+        )
+
+    def test_totals(self):
+        self.seed(6)
+        stats = get_dashboard_stats(self.user, today=self.today)
+        self.assertEqual(stats.projects_count, 6)
+        self.assertEqual(stats.active_projects, 2)
+        self.assertEqual(stats.completed_projects, 2)
+        self.assertEqual(stats.pending_projects, 2)
+        self.assertEqual(stats.total_budget, Decimal('6000'))
+        self.assertEqual(stats.total_workers, 6)
+        self.assertEqual(stats.available_workers, 3)
+        self.assertEqual(stats.on_project_workers, 3)
+        self.assertEqual(stats.monthly_payments, Decimal('600'))
+        self.assertEqual(stats.received_payments, Decimal('600'))
+        self.assertEqual(stats.pending_payments, Decimal('600'))
+        self.assertEqual(stats.tasks_this_week, 6)
+
+    def test_empty_user_returns_zeroes(self):
+        stats = get_dashboard_stats(self.user, today=self.today)
+        self.assertEqual(stats.projects_count, 0)
+        self.assertEqual(stats.total_budget, Decimal('0'))
+        self.assertEqual(stats.pending_payments, Decimal('0'))
+
+    def test_query_count_is_constant(self):
+        self.seed(2)
+        with self.assertNumQueries(4):
+            get_dashboard_stats(self.user, today=self.today)
+        self.seed(200)
+        with self.assertNumQueries(4):
+            get_dashboard_stats(self.user, today=self.today)
+
+    def test_view_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seed(2)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seed(200)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+
+# ==================== PAYMENT LEDGER ====================
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.today = date(2025, 11, 5)
+
+    def create(self, **kwargs):
+        fields = {'user': self.user, 'type': 'received', 'category': 'client_payment',
+                  'amount': Decimal('250.00'), 'date': date(2025, 11, 1)}
+        fields.update(kwargs)
+        return Payment.objects.create(**fields)
+
+    def test_create_edit_delete_keep_rollup_in_sync(self):
+        payment = self.create()
+        self.create(type='paid', category='materials', status='pending', amount=Decimal('40'))
+        totals = user_totals(self.user, self.today)
+        self.assertEqual(totals['total_received'], Decimal('250'))
+        self.assertEqual(totals['total_paid'], Decimal('40'))
+        self.assertEqual(totals['total_pending'], Decimal('40'))
+        self.assertEqual(totals['monthly_total'], Decimal('290'))
+
+        payment.amount = Decimal('300')
+        payment.save()
+        self.assertEqual(user_totals(self.user, self.today)['total_received'], Decimal('300'))
+
+        payment.date = date(2025, 10, 20)
+        payment.save()
+        self.assertEqual(user_totals(self.user, self.today)['monthly_total'], Decimal('40'))
+
+        payment.delete()
+        self.assertEqual(user_totals(self.user, self.today)['total_received'], Decimal('0'))
+        self.assertEqual(find_drift(self.user), [])
+
+    def test_deleting_a_user_with_payments(self):
+        self.create()
+        self.create(type='paid', category='materials', amount=Decimal('40'))
+        self.user.delete()
+        connection.check_constraints()
+        self.assertFalse(PaymentRollup.objects.exists())
+
+    def test_payment_posted_through_view(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('payments'), {
+            'type': 'paid', 'category': 'transport', 'amount': '75.50',
+            'description': 'Lorry hire', 'date': '2025-11-04',
+        })
+        self.assertEqual(user_totals(self.user, self.today)['total_paid'], Decimal('75.50'))
+        self.assertEqual(find_drift(self.user), [])
+
+    def test_undated_payments_are_bucketed(self):
+        self.create(date=None)
+        rollup = PaymentRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.year, rollup.month, rollup.count), (0, 0, 1))
+        self.assertEqual(find_drift(), [])
+
+    def test_rebuild_command_fixes_drift(self):
+        self.create()
+        PaymentRollup.objects.update(total=Decimal('1'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ledger', '--check', stdout=StringIO())
+        call_command('rebuild_ledger', stdout=StringIO())
+        call_command('rebuild_ledger', '--check', stdout=StringIO())
+        self.assertEqual(user_totals(self.user, self.today)['total_received'], Decimal('250'))
+
+    def test_totals_read_is_independent_of_payment_count(self):
+        make_payments(self.user, 5)
+        with self.assertNumQueries(1):
+            user_totals(self.user, self.today)
+        make_payments(self.user, 500)
+        with self.assertNumQueries(1):
+            totals = user_totals(self.user, self.today)
+        self.assertEqual(totals['total_received'], Decimal('50500'))
+
+
+# ==================== PAYMENT LEDGER PAGINATION ====================
+class PaymentPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.client.force_login(self.user)
+
+    def walk(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, ('-date', '-created_at', 'id'), page_size=page_size)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(p.id for p in page.items)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_walk_visits_every_payment_once_in_order(self):
+        make_payments(self.user, 7, date=date(2025, 11, 3))
+        make_payments(self.user, 5, date=date(2025, 10, 1))
+        make_payments(self.user, 4, date=None)
+        queryset = Payment.objects.filter(user=self.user)
+        seen = self.walk(queryset, page_size=3)
+        expected = [p.id for p in queryset.order_by(
+            F('date').desc(nulls_last=True), F('created_at').desc(), 'id')]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_raises(self):
+        paginator = KeysetPaginator(Payment.objects.all(), ('-date', 'id'))
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-cursor')
+
+    def test_view_filters_and_paginates(self):
+        make_payments(self.user, 60)
+        make_payments(self.user, 3, type='paid', category='materials', payment_method='cash')
+        response = self.client.get(reverse('payments'))
+        self.assertEqual(len(response.context['payments']), 50)
+        self.assertTrue(response.context['has_next'])
+
+        response = self.client.get(reverse('payments') + '?' + response.context['next_query'])
+        self.assertEqual(len(response.context['payments']), 13)
+        self.assertFalse(response.context['has_next'])
+
+        response = self.client.get(reverse('payments'), {'type': 'paid', 'method': 'cash'})
+        self.assertEqual(len(response.context['payments']), 3)
+        response = self.client.get(reverse('payments'), {'date_from': '2025-12-01', 'category': 'bogus'})
+        self.assertEqual(len(response.context['payments']), 0)
+
+    def test_view_query_count_does_not_grow(self):
+        make_payments(self.user, 5)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('payments'))
+        make_payments(self.user, 500)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('payments'))
+        self.assertEqual(len(small), len(large))
+
+
+# ==================== QUERY PLANS ====================
+FULL_SCAN = re.compile(r'\bSCAN (base_\w+)(?!\w| USING COVERING INDEX)')
+# Walking an index in ORDER BY order stops after LIMIT rows, so a page read that way is bounded
+INDEX_ORDER = re.compile(r'\bSCAN base_\w+ USING INDEX ')
+PAGE_LIMIT = re.compile(r' LIMIT \d+$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """Every query a view runs against base_* tables must be served by an index"""
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(username='client', password='pass12345')
+        self.staff_user = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        project = Project.objects.create(user=self.client_user, name='House', status='active')
+        worker = Worker.objects.create(user=self.staff_user, name='Juma', role='mason')
+        JobApplication.objects.create(worker=worker, project=project)
+        TimeLog.objects.create(worker=worker, project=project)
+        Task.objects.create(user=self.client_user, title='Visit', type='inspection',
+                            date=date(2025, 11, 5), time=time(9), project=project)
+        make_payments(self.client_user, 3)
+
+    def full_scans(self, queries):
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'base_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                paged = PAGE_LIMIT.search(sql) and not any('TEMP B-TREE' in detail for detail in plan)
+                for detail in plan:
+                    if FULL_SCAN.search(detail) and not (paged and INDEX_ORDER.search(detail)):
+                        scans.append(f'{detail}\n    {sql}')
+        return scans
+
+    def assert_indexed(self, user, url_names):
+        self.client.force_login(user)
+        for name in url_names:
+            with self.subTest(view=name), CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                self.assertEqual(self.full_scans(ctx.captured_queries), [])
+
+    def test_client_views(self):
+        self.assert_indexed(self.client_user, ['dashboard', 'projects', 'workers', 'payments', 'schedule'])
+
+    def test_staff_views(self):
+        self.assert_indexed(self.staff_user, ['staff_portal', 'staff_projects', 'staff_workers',
+                                              'staff_schedule', 'staff_payments'])
+
+    def test_open_shift_lookup(self):
+        self.client.force_login(self.staff_user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('clock_in'))
+            self.client.post(reverse('clock_out'))
+        self.assertEqual(self.full_scans(ctx.captured_queries), [])
+
+
+# ==================== QUERY BUDGETS ====================
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.staff_user = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        Worker.objects.create(user=self.staff_user, name='Juma', role='mason')
+
+    def seed(self, n):
+        for i in range(n):
+            owner = User.objects.create_user(username=f'owner{User.objects.count()}', first_name='Client')
+            project = Project.objects.create(user=owner, name=f'Job {i}', status='active')
+            Worker.objects.create(user=owner, name=f'W{i}', role='plumber')
+            Task.objects.create(user=owner, title='Visit', type='inspection', date=date(2025, 11, 5),
+                                time=time(9), project=project)
+            make_payments(owner, 2)
+
+    def test_decorator_raises_when_over_budget(self):
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(self.factory.get('/'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_decorator_logs_when_not_strict(self):
+        @query_budget(0)
+        def view(request):
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('base.querybudget', level='WARNING'):
+            view(self.factory.get('/'))
+
+    def test_staff_views_stay_within_budget(self):
+        self.client.force_login(self.staff_user)
+        names = ['staff_portal', 'staff_projects', 'staff_workers', 'staff_schedule', 'staff_payments']
+        for n in (3, 30):
+            self.seed(n)
+            for name in names:
+                with self.subTest(view=name, rows=n):
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_first_payment_stays_within_budget(self):
+        # A user's first payment also creates its rollup bucket and reconcile job
+        self.client.force_login(self.staff_user)
+        response = self.client.post(reverse('payments'), {'type': 'paid', 'category': 'materials', 'amount': '100',
+                                                          'description': 'Sand', 'date': '2025-01-05'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_staff_portal_pages_through_jobs(self):
+        self.seed(25)
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('staff_portal'))
+        first = response.context['available_jobs']
+        self.assertEqual(len(first), 20)
+        response = self.client.get(reverse('staff_portal') + '?' + response.context['jobs_links']['next_query'])
+        second = response.context['available_jobs']
+        self.assertEqual(len(second), 5)
+        self.assertFalse({p.id for p in first} & {p.id for p in second})
+
+    def test_staff_listings_render_their_pager(self):
+        self.seed(25)
+        self.client.force_login(self.staff_user)
+        # 25 projects and tasks, 50 payments, 20 a page
+        for name, key, second in (('staff_projects', 'projects', 5), ('staff_schedule', 'tasks', 5),
+                                  ('staff_payments', 'payments', 20)):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(len(response.context[key]), 20)
+                self.assertNotContains(response, 'First page')
+                next_query = response.context['page_links']['next_query']
+                self.assertContains(response, f'href="?{escape(next_query)}"')
+                response = self.client.get(reverse(name) + '?' + next_query)
+                self.assertEqual(len(response.context[key]), second)
+                self.assertContains(response, 'First page')
+                self.assertEqual('Next page' in response.content.decode(), second == 20)
+
+
+# ==================== WORKER SKILL SEARCH ====================
+class WorkerSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.client.force_login(self.user)
+
+    def worker(self, name, skills, **kwargs):
+        return Worker.objects.create(user=self.user, name=name, role=kwargs.pop('role', 'mason'),
+                                     skills=skills, **kwargs)
+
+    def test_index_follows_skills_json(self):
+        worker = self.worker('Juma', ['Foundation', 'framing', 'framing '])
+        self.assertEqual(set(worker.skill_index.values_list('skill', flat=True)), {'foundation', 'framing'})
+        worker.skills = ['framing', 'roofing']
+        worker.save()
+        self.assertEqual(set(worker.skill_index.values_list('skill', flat=True)), {'framing', 'roofing'})
+
+    def test_rebuild_skill_index(self):
+        worker = self.worker('Juma', ['tile_work'])
+        WorkerSkill.objects.all().delete()
+        self.assertEqual(rebuild_skill_index(), 1)
+        self.assertEqual(list(worker.skill_index.values_list('skill', flat=True)), ['tile_work'])
+
+    def test_ranking_and_filters(self):
+        self.worker('Both', ['wiring', 'plumbing'], rating=Decimal('4.0'))
+        self.worker('Wiring top', ['wiring'], rating=Decimal('4.9'), daily_rate=3000)
+        self.worker('Wiring low', ['wiring'], rating=Decimal('3.0'), daily_rate=800)
+        self.worker('Painter', ['painting'], rating=Decimal('5.0'))
+
+        names = [w['name'] for w in search_workers(skills=['wiring', 'plumbing'])]
+        self.assertEqual(names, ['Both', 'Wiring top', 'Wiring low'])
+        names = [w['name'] for w in search_workers(skills=['wiring', 'plumbing'], match='all')]
+        self.assertEqual(names, ['Both'])
+        names = [w['name'] for w in search_workers(skills=['wiring'], max_rate=Decimal('1000'))]
+        self.assertEqual(names, ['Both', 'Wiring low'])
+
+    def test_search_endpoint(self):
+        self.worker('Juma', ['roofing'], role='carpenter', experience_years=6)
+        response = self.client.get(reverse('worker_search'), {'skill': 'roofing,welding', 'trade': 'carpenter',
+                                                              'min_experience': '5'})
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['matched_skills'], 1)
+        response = self.client.get(reverse('worker_search'), {'min_rating': 'high'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ==================== FULL-TEXT SEARCH ====================
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 search is SQLite specific')
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.other = User.objects.create_user(username='other', password='pass12345')
+        self.client.force_login(self.user)
+
+    def test_ranked_highlighted_hits_for_current_user_only(self):
+        Project.objects.create(user=self.user, name='Kilimani roofing', description='Replace <b>roof</b> sheets')
+        Task.objects.create(user=self.user, title='Roof inspection', type='inspection',
+                            date=date(2025, 11, 5), time=time(9))
+        Payment.objects.create(user=self.user, type='paid', category='materials', amount=10,
+                               description='Roofing nails', reference='MPESA123')
+        Project.objects.create(user=self.other, name='Other roof', description='roof')
+
+        response = self.client.get(reverse('search'), {'q': 'roof'})
+        results = response.json()['results']
+        self.assertEqual({r['type'] for r in results}, {'project', 'task', 'payment'})
+        self.assertEqual(len(results), 3)
+        project = next(r for r in results if r['type'] == 'project')
+        self.assertIn('<mark>roofing</mark>', project['title'])
+        self.assertIn('&lt;b&gt;<mark>roof</mark>&lt;/b&gt;', project['snippet'])
+
+    def test_index_tracks_updates_and_deletes(self):
+        task = Task.objects.create(user=self.user, title='Deliver cement', type='delivery',
+                                   date=date(2025, 11, 5), time=time(9))
+        self.assertEqual(len(search(self.user, 'cement')), 1)
+        task.title = 'Deliver sand'
+        task.save()
+        self.assertEqual(search(self.user, 'cement'), [])
+        self.assertEqual(len(search(self.user, 'sand')), 1)
+        task.delete()
+        self.assertEqual(search(self.user, 'sand'), [])
+
+    def test_operators_in_input_are_inert(self):
+        Payment.objects.create(user=self.user, type='paid', category='other', amount=1, reference='AB-12')
+        self.assertEqual(len(search(self.user, 'AB OR "NEAR(')), 0)
+        self.assertEqual(len(search(self.user, 'ab 12', types=['payment'])), 1)
+        self.assertEqual(search(self.user, '   '), [])
+
+
+# ==================== CACHING ====================
+class CacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.client.force_login(self.user)
+
+    def test_bump_changes_keys(self):
+        key = make_key('fragment', 'a', scopes=[user_scope(self.user.id)])
+        self.assertEqual(key, make_key('fragment', 'a', scopes=[user_scope(self.user.id)]))
+        bump(user_scope(self.user.id))
+        self.assertNotEqual(key, make_key('fragment', 'a', scopes=[user_scope(self.user.id)]))
+
+    def test_dashboard_stats_cached_until_write(self):
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(reverse('dashboard'))
+        self.assertFalse([q for q in warm if 'COUNT' in q['sql']])
+        self.assertEqual(response.context['projects_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(user=self.user, name='House')
+        self.assertEqual(self.client.get(reverse('dashboard')).context['projects_count'], 1)
+
+    def test_writes_bump_once_committed(self):
+        key = make_key('fragment', 'a', scopes=[user_scope(self.user.id)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(user=self.user, name='House')
+            # A reader before the commit still sees (and caches) the old rows under the old key
+            self.assertEqual(key, make_key('fragment', 'a', scopes=[user_scope(self.user.id)]))
+        self.assertNotEqual(key, make_key('fragment', 'a', scopes=[user_scope(self.user.id)]))
+
+    def test_other_users_writes_do_not_invalidate(self):
+        other = User.objects.create_user(username='other')
+        self.client.get(reverse('dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(user=other, name='Elsewhere')
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse([q for q in warm if 'COUNT' in q['sql']])
+
+    def test_worker_directory_fragment(self):
+        Worker.objects.create(user=self.user, name='Juma', role='mason')
+        self.assertContains(self.client.get(reverse('workers')), 'Juma')
+        with CaptureQueriesContext(connection) as warm:
+            self.assertContains(self.client.get(reverse('workers')), 'Juma')
+        self.assertFalse([q for q in warm if 'base_worker' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Worker.objects.create(user=self.user, name='Achieng', role='painter')
+        response = self.client.get(reverse('workers'))
+        self.assertContains(response, 'Achieng')
+        self.assertEqual(response.context['total_workers'], 2)
+
+    def test_worker_directory_pages(self):
+        Worker.objects.bulk_create([Worker(user=self.user, name=f'Crew {i:02}', role='laborer') for i in range(30)])
+        first = self.client.get(reverse('workers'))
+        self.assertEqual(len(first.context['workers']), 24)
+        rest = self.client.get(f"{reverse('workers')}?{first.context['workers_links']['next_query']}")
+        self.assertEqual([w.name for w in rest.context['workers']], [f'Crew {i}' for i in range(24, 30)])
+        self.assertIsNone(rest.context['workers_links']['next_query'])
+
+    def test_bulk_payment_writes_invalidate(self):
+        self.client.get(reverse('dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            make_payments(self.user, 3)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['received_payments'], Decimal('300'))
+
+
+# ==================== PAYMENT IMPORT / EXPORT ====================
+class PaymentImportExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.client.force_login(self.user)
+
+    def upload(self, text, fmt):
+        return self.client.post(reverse('import_payments') + '?format=json', {
+            'format': fmt, 'file': SimpleUploadedFile('statement.csv', text.encode(), content_type='text/csv'),
+        })
+
+    def test_mpesa_statement_import(self):
+        text = (
+            'Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance\n'
+            'QK1,2025-11-03 10:15:00,Payment from client,Completed,"12,000.00",,12000\n'
+            'QK2,2025-11-04 09:00:00,Cement supplier,Completed,,3500.00,8500\n'
+            'QK1,2025-11-03 10:15:00,Payment from client,Completed,"12,000.00",,12000\n'
+            'QK3,yesterday,Bad date,Completed,10,,0\n'
+        )
+        data = self.upload(text, 'mpesa').json()
+        self.assertEqual((data['created'], data['duplicates'], data['error_count']), (2, 1, 1))
+        self.assertEqual(data['errors'][0]['line'], 5)
+        self.assertEqual(user_totals(self.user, date(2025, 11, 5))['total_received'], Decimal('12000'))
+        self.assertEqual(find_drift(self.user), [])
+
+        # Re-importing the same statement is a no-op
+        data = self.upload(text, 'mpesa').json()
+        self.assertEqual((data['created'], data['duplicates']), (0, 3))
+
+    def test_mpesa_signed_withdrawal(self):
+        text = (
+            'Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance\n'
+            'QK4,2025-11-05 08:30:00,Cement supplier,Completed,,"-3,500.00","8,500.00"\n'
+        )
+        data = self.upload(text, 'mpesa').json()
+        self.assertEqual((data['created'], data['error_count']), (1, 0))
+        payment = Payment.objects.get(user=self.user, reference='QK4')
+        self.assertEqual((payment.type, payment.amount), ('paid', Decimal('3500.00')))
+
+    def test_non_finite_amounts_are_row_errors(self):
+        text = (
+            'Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance\n'
+            'QK5,2025-11-05 08:30:00,Client,Completed,NaN,,0\n'
+            'QK6,2025-11-05 08:31:00,Supplier,Completed,,-Infinity,0\n'
+            'QK7,2025-11-05 08:32:00,Client,Completed,Infinity,,0\n'
+        )
+        data = self.upload(text, 'mpesa').json()
+        self.assertEqual((data['created'], data['error_count']), (0, 3))
+        self.assertIn("invalid amount 'NaN'", data['errors'][0]['message'])
+
+    def test_batches_dedupe_against_earlier_batches(self):
+        rows = ''.join(f'2025-11-0{i % 9 + 1},paid,materials,5,completed,cash,REF{i % 7},\n' for i in range(30))
+        result = import_payments_csv(self.user, BytesIO(('\n'.join([','.join(LEDGER_COLUMNS), rows])).encode()),
+                                     batch_size=4)
+        self.assertEqual((result.created, result.duplicates), (7, 23))
+
+    def test_export_round_trips(self):
+        make_payments(self.user, 3, reference=None, description='Deposit, phase 1')
+        response = self.client.get(reverse('export_payments'), {'type': 'received'})
+        self.assertIsInstance(response, StreamingHttpResponse)
+        text = b''.join(response.streaming_content).decode()
+        lines = text.strip().splitlines()
+        self.assertEqual(lines[0], ','.join(LEDGER_COLUMNS))
+        self.assertEqual(len(lines), 4)
+
+        other = User.objects.create_user(username='other')
+        result = import_payments_csv(other, BytesIO(text.encode()))
+        self.assertEqual((result.created, result.error_count), (3, 0))
+        self.assertEqual(Payment.objects.filter(user=other, description='Deposit, phase 1').count(), 3)
+
+
+# ==================== TIME CLOCK ====================
+class TimeClockTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        self.worker = Worker.objects.create(user=self.staff_user, name='Juma', role='mason')
+
+    def test_database_allows_one_open_shift(self):
+        TimeLog.objects.create(worker=self.worker)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TimeLog.objects.create(worker=self.worker)
+
+    async def test_concurrent_clock_ins_open_one_shift(self):
+        await self.async_client.aforce_login(self.staff_user)
+        responses = await asyncio.gather(*[self.async_client.post(reverse('clock_in')) for _ in range(10)])
+        statuses = sorted(r.json()['status'] for r in responses)
+        self.assertEqual(statuses, ['info'] * 9 + ['success'])
+        self.assertEqual(await TimeLog.objects.filter(clock_out_time__isnull=True).acount(), 1)
+
+    async def test_clock_out_closes_earlier_open_shift(self):
+        await self.async_client.aforce_login(self.staff_user)
+        log = await TimeLog.objects.acreate(worker=self.worker)
+        started = timezone.now() - timedelta(days=1, hours=2)
+        await TimeLog.objects.filter(pk=log.pk).aupdate(clock_in_time=started, date=started.date())
+
+        data = (await self.async_client.post(reverse('clock_out'), {'notes': 'late'})).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertAlmostEqual(data['hours_worked'], 26.0, places=1)
+        log = await TimeLog.objects.aget(pk=log.pk)
+        self.assertEqual((log.notes, log.hours_worked), ('late', Decimal('26.00')))
+
+        data = (await self.async_client.post(reverse('clock_in'))).json()
+        self.assertEqual(data['status'], 'success')
+
+    async def test_non_staff_is_redirected(self):
+        user = await User.objects.acreate(username='client')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.post(reverse('clock_in'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ClockSyncTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='foreman', password='pass12345', is_staff=True)
+        self.crew = [
+            Worker.objects.create(user=User.objects.create(username=f'crew{i}'), name=f'Crew {i}', role='laborer')
+            for i in range(20)
+        ]
+        self.site = Project.objects.create(user=self.staff_user, name='Site', status='active')
+        self.client.force_login(self.staff_user)
+        self.day = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def crew_day(self):
+        events = []
+        for worker in self.crew:
+            events.append({'key': f'{worker.id}-in', 'worker_id': worker.id, 'kind': 'in',
+                           'project_id': self.site.id, 'timestamp': self.day.isoformat()})
+            events.append({'key': f'{worker.id}-out', 'worker_id': worker.id, 'kind': 'out',
+                           'timestamp': (self.day + timedelta(hours=8, minutes=30)).isoformat()})
+        # Devices flush queues out of order
+        return events[::-1]
+
+    def sync(self, events):
+        return self.client.post(reverse('clock_sync'), {'events': events}, content_type='application/json')
+
+    def test_crew_day_applies_in_bulk_with_device_times(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.sync(self.crew_day()).json()
+        self.assertEqual((data['applied'], data['rejected']), (40, 0))
+        # Query count doesn't grow with the crew size
+        self.assertLess(len(ctx.captured_queries), 20)
+
+        logs = TimeLog.objects.filter(worker__in=self.crew)
+        self.assertEqual(logs.count(), 20)
+        log = logs.first()
+        self.assertEqual((log.clock_in_time, log.date, log.hours_worked),
+                         (self.day, timezone.localdate(self.day), Decimal('8.50')))
+        self.assertEqual(ClockEvent.objects.filter(time_log=log).count(), 2)
+
+    def test_retried_upload_is_idempotent(self):
+        self.sync(self.crew_day())
+        data = self.sync(self.crew_day()).json()
+        self.assertEqual((data['applied'], data['duplicates']), (0, 40))
+        self.assertEqual(TimeLog.objects.count(), 20)
+
+    def test_closes_shift_opened_online(self):
+        worker = self.crew[0]
+        log = TimeLog.objects.create(worker=worker, project=self.site, clock_in_time=self.day)
+        data = self.sync([{'key': 'k1', 'worker_id': worker.id, 'kind': 'out',
+                           'timestamp': (self.day + timedelta(hours=2)).isoformat(), 'notes': 'rain'}]).json()
+        self.assertEqual(data['results'][0]['status'], 'applied')
+        log.refresh_from_db()
+        self.assertEqual((log.hours_worked, log.notes), (Decimal('2.00'), 'rain'))
+
+    def test_invalid_events_are_rejected_individually(self):
+        worker = self.crew[0]
+        future = (timezone.now() + timedelta(hours=1)).isoformat()
+        data = self.sync([
+            {'key': 'a', 'worker_id': worker.id, 'kind': 'out', 'timestamp': self.day.isoformat()},
+            {'key': 'b', 'worker_id': worker.id, 'kind': 'in', 'timestamp': future},
+            {'key': 'c', 'worker_id': 999999, 'kind': 'in', 'timestamp': self.day.isoformat()},
+            {'key': 'd', 'worker_id': worker.id, 'kind': 'nap', 'timestamp': self.day.isoformat()},
+            {'key': 'e', 'worker_id': worker.id, 'kind': 'in', 'project_id': self.site.id,
+             'timestamp': self.day.isoformat()},
+        ]).json()
+        self.assertEqual([r['status'] for r in data['results']],
+                         ['rejected', 'rejected', 'rejected', 'rejected', 'applied'])
+        self.assertEqual(TimeLog.objects.filter(clock_out_time__isnull=True).count(), 1)
+
+    def test_only_own_profile_or_own_projects(self):
+        other = Project.objects.create(user=User.objects.create(username='rival'), name='Rival', status='active')
+        own = Worker.objects.create(user=self.staff_user, name='Foreman', role='mason')
+        juma, wanjiru, otieno = self.crew[:3]
+        TimeLog.objects.create(worker=otieno, project=other, clock_in_time=self.day)
+        at = self.day.isoformat()
+        data = self.sync([
+            {'key': 'a', 'worker_id': juma.id, 'kind': 'in', 'timestamp': at},
+            {'key': 'b', 'worker_id': juma.id, 'kind': 'in', 'project_id': other.id, 'timestamp': at},
+            {'key': 'c', 'worker_id': otieno.id, 'kind': 'out', 'timestamp': at},
+            {'key': 'd', 'worker_id': wanjiru.id, 'kind': 'in', 'project_id': self.site.id, 'timestamp': at},
+            {'key': 'e', 'worker_id': own.id, 'kind': 'in', 'project_id': other.id, 'timestamp': at},
+        ]).json()
+        self.assertEqual([(r['key'], r['status']) for r in data['results']],
+                         [('a', 'rejected'), ('b', 'rejected'), ('c', 'rejected'), ('d', 'applied'),
+                          ('e', 'applied')])
+        self.assertEqual(data['results'][0]['message'], 'not your worker or project')
+        self.assertFalse(ClockEvent.objects.filter(key__in=['a', 'b', 'c']).exists())
+        self.assertTrue(TimeLog.objects.filter(worker=otieno, clock_out_time__isnull=True).exists())
+
+    def test_oversized_batch_is_refused(self):
+        response = self.sync([{}] * 2001)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAYROLL_STANDARD_DAY_HOURS=8, PAYROLL_OVERTIME_MULTIPLIER='1.5')
+class PayrollTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.house = Project.objects.create(user=self.owner, name='House', client_name='A', location='Nairobi',
+                                            budget=100000, start_date=date(2025, 3, 1))
+        self.shop = Project.objects.create(user=self.owner, name='Shop', client_name='B', location='Nairobi',
+                                           budget=50000, start_date=date(2025, 3, 1))
+        self.juma = Worker.objects.create(user=User.objects.create(username='juma'), name='Juma',
+                                          role='mason', daily_rate=800)
+        self.start, self.end = date(2025, 3, 1), date(2025, 3, 15)
+
+    def shift(self, worker, project, day, hours):
+        clock_in = timezone.make_aware(datetime.combine(day, time(7)))
+        return TimeLog.objects.create(worker=worker, project=project, date=day, clock_in_time=clock_in,
+                                      clock_out_time=clock_in + timedelta(hours=hours))
+
+    def test_daily_overtime_is_shared_between_projects(self):
+        self.shift(self.juma, self.house, date(2025, 3, 3), 8)
+        self.shift(self.juma, self.house, date(2025, 3, 4), 6)
+        self.shift(self.juma, self.shop, date(2025, 3, 4), 4)
+
+        result = run_payroll(self.owner, self.start, self.end)
+        self.assertEqual((result.lines_created, result.payments_created), (2, 2))
+        house = PayrollLine.objects.get(project=self.house)
+        shop = PayrollLine.objects.get(project=self.shop)
+        self.assertEqual((house.days_worked, house.regular_hours, house.overtime_hours),
+                         (2, Decimal('12.80'), Decimal('1.20')))
+        # 100/hour, overtime at 150/hour
+        self.assertEqual((house.amount, shop.amount), (Decimal('1460.00'), Decimal('440.00')))
+        self.assertEqual(result.run.total, Decimal('1900.00'))
+        self.assertEqual((house.payment.category, house.payment.status, house.payment.amount),
+                         ('worker_wages', 'pending', Decimal('1460.00')))
+        self.assertEqual(find_drift(self.owner), [])
+
+    def test_rerun_only_touches_late_logs(self):
+        self.shift(self.juma, self.house, date(2025, 3, 3), 8)
+        other = Worker.objects.create(user=User.objects.create(username='otieno'), name='Otieno',
+                                      role='laborer', daily_rate=500)
+        self.shift(other, self.house, date(2025, 3, 3), 8)
+        run_payroll(self.owner, self.start, self.end)
+
+        result = run_payroll(self.owner, self.start, self.end)
+        self.assertEqual((result.incremental, result.workers, result.lines_updated), (True, 0, 0))
+
+        self.shift(self.juma, self.house, date(2025, 3, 5), 4)
+        result = run_payroll(self.owner, self.start, self.end)
+        self.assertEqual((result.workers, result.lines_updated, result.payments_updated), (1, 1, 1))
+        line = PayrollLine.objects.get(worker=self.juma)
+        self.assertEqual((line.amount, line.payment.amount), (Decimal('1200.00'), Decimal('1200.00')))
+        self.assertEqual(Payment.objects.filter(category='worker_wages').count(), 2)
+        self.assertEqual(find_drift(self.owner), [])
+
+    def test_settled_wages_get_a_top_up_payment(self):
+        self.shift(self.juma, self.house, date(2025, 3, 3), 8)
+        run_payroll(self.owner, self.start, self.end)
+        Payment.objects.filter(category='worker_wages').update(status='completed')
+
+        self.shift(self.juma, self.house, date(2025, 3, 4), 8)
+        result = run_payroll(self.owner, self.start, self.end)
+        self.assertEqual(result.payments_created, 1)
+        amounts = sorted(Payment.objects.filter(category='worker_wages').values_list('amount', flat=True))
+        self.assertEqual(amounts, [Decimal('800.00'), Decimal('800.00')])
+
+    def test_only_owners_projects_are_paid(self):
+        stranger = User.objects.create(username='stranger')
+        elsewhere = Project.objects.create(user=stranger, name='Elsewhere', client_name='C', location='Mombasa',
+                                           budget=1000, start_date=date(2025, 3, 1))
+        self.shift(self.juma, elsewhere, date(2025, 3, 3), 8)
+        self.assertEqual(run_payroll(self.owner, self.start, self.end).lines_created, 0)
+
+    def test_overlapping_period_is_refused(self):
+        run_payroll(self.owner, self.start, self.end)
+        with self.assertRaises(PayrollError):
+            run_payroll(self.owner, date(2025, 3, 10), date(2025, 3, 31))
+
+    def test_run_through_view(self):
+        self.shift(self.juma, self.house, date(2025, 3, 3), 8)
+        self.client.force_login(self.owner)
+        data = self.client.post(reverse('run_payroll'),
+                                {'period_start': '2025-03-01', 'period_end': '2025-03-15'}).json()
+        self.assertEqual((data['status'], data['total']), ('success', '800.00'))
+        response = self.client.post(reverse('run_payroll'), {'period_start': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAYROLL_STANDARD_DAY_HOURS=8, PAYROLL_OVERTIME_MULTIPLIER='1.5')
+class ProjectFinancialsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.project = Project.objects.create(user=self.owner, name='House', client_name='A', location='Nairobi',
+                                              budget=10000, start_date=date(2025, 3, 1))
+        self.staff_user = User.objects.create_user(username='juma', password='pass12345', is_staff=True)
+        self.worker = Worker.objects.create(user=self.staff_user, name='Juma', role='mason', daily_rate=800)
+
+    def financials(self):
+        return project_financials([self.project])[self.project.pk]
+
+    def test_expenses_follow_payment_writes(self):
+        cement = Payment.objects.create(user=self.owner, project=self.project, type='paid', category='materials',
+                                        amount=Decimal('2500'), date=date(2025, 3, 2))
+        Payment.objects.create(user=self.owner, project=self.project, type='paid', category='transport',
+                               amount=Decimal('300'), date=date(2025, 3, 2), status='cancelled')
+        Payment.objects.create(user=self.owner, project=self.project, type='received', category='client_payment',
+                               amount=Decimal('9000'), date=date(2025, 3, 2))
+        self.assertEqual((self.financials().materials, self.financials().spent), (Decimal('2500'), Decimal('2500')))
+
+        cement.category, cement.amount = 'equipment', Decimal('2000')
+        cement.save()
+        self.assertEqual((self.financials().materials, self.financials().equipment), (0, Decimal('2000')))
+        cement.delete()
+        self.assertEqual(self.financials().spent, 0)
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_closed_shifts_accrue_wages_with_overtime(self):
+        clock_in = timezone.make_aware(datetime(2025, 3, 3, 7))
+        TimeLog.objects.create(worker=self.worker, project=self.project, date=date(2025, 3, 3),
+                               clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=10))
+        # 8 hours at 100/hour plus 2 overtime hours at 150/hour
+        self.assertEqual(self.financials().wages, Decimal('1100.00'))
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_shifts_keep_their_rate_through_edits_and_deletes(self):
+        clock_in = timezone.make_aware(datetime(2025, 3, 3, 7))
+        log = TimeLog.objects.create(worker=self.worker, project=self.project, date=date(2025, 3, 3),
+                                     clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=4))
+        Worker.objects.filter(pk=self.worker.pk).update(daily_rate=1600)
+        log.notes = 'Plastering'
+        log.save()
+        self.assertEqual((log.daily_rate, self.financials().wages), (Decimal('800'), Decimal('400.00')))
+        log.delete()
+        self.assertEqual(self.financials().wages, 0)
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_deleting_a_project_with_logged_time(self):
+        garage = Project.objects.create(user=self.owner, name='Garage', client_name='A', location='Nairobi',
+                                        budget=10000, start_date=date(2025, 3, 1))
+        clock_in = timezone.make_aware(datetime(2025, 3, 3, 7))
+        for project, hours in ((self.project, 6), (garage, 4)):
+            TimeLog.objects.create(worker=self.worker, project=project, date=date(2025, 3, 3),
+                                   clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=hours))
+        Payment.objects.create(user=self.owner, project=garage, type='paid', category='materials',
+                               amount=Decimal('500'), date=date(2025, 3, 3))
+        self.client.force_login(self.owner)
+        self.client.get(reverse('delete_project', args=[garage.id]))
+        connection.check_constraints()
+        # Without the garage's hours the day has no overtime left
+        self.assertEqual(self.financials().wages, Decimal('600.00'))
+        self.assertEqual(find_cost_drift(), [])
+
+        self.owner.delete()
+        connection.check_constraints()
+        self.assertFalse(ProjectCost.objects.exists())
+
+    def test_a_failed_delete_leaves_nothing_pending(self):
+        clock_in = timezone.make_aware(datetime(2025, 3, 3, 7))
+        log = TimeLog.objects.create(worker=self.worker, project=self.project, date=date(2025, 3, 3),
+                                     clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=10))
+        with mock.patch('django.db.models.sql.subqueries.DeleteQuery.delete_batch',
+                        side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                TimeLog.objects.filter(pk=log.pk).delete()
+        log.clock_out_time = clock_in + timedelta(hours=4)
+        log.save()
+        TimeLog.objects.filter(pk=log.pk).delete()
+        self.assertEqual(self.financials().wages, 0)
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_overtime_is_counted_per_day_as_payroll_does(self):
+        garage = Project.objects.create(user=self.owner, name='Garage', client_name='A', location='Nairobi',
+                                        budget=10000, start_date=date(2025, 3, 1))
+        clock_in = timezone.make_aware(datetime(2025, 3, 3, 7))
+        for project, hours in ((self.project, 6), (garage, 4)):
+            TimeLog.objects.create(worker=self.worker, project=project, date=date(2025, 3, 3),
+                                   clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=hours))
+        # 10 hours on the day: the 2 overtime hours are shared 6:4
+        self.assertEqual(self.financials().wages, Decimal('660.00'))
+        self.assertEqual(project_financials([garage])[garage.pk].wages, Decimal('440.00'))
+        run_payroll(self.owner, date(2025, 3, 1), date(2025, 3, 15))
+        self.assertEqual(
+            sorted(Payment.objects.filter(category='worker_wages').values_list('amount', flat=True)),
+            [Decimal('440.00'), Decimal('660.00')])
+
+        TimeLog.objects.filter(project=garage).delete()
+        self.assertEqual(self.financials().wages, Decimal('600.00'))
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_clock_out_and_offline_sync_accrue_wages(self):
+        TimeLog.objects.create(worker=self.worker, project=self.project,
+                               clock_in_time=timezone.now() - timedelta(hours=4))
+        self.client.force_login(self.staff_user)
+        self.assertEqual(self.client.post(reverse('clock_out')).json()['status'], 'success')
+        self.assertEqual(self.financials().wages, Decimal('400.00'))
+
+        start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.client.post(reverse('clock_sync'), {'events': [
+            {'key': 'i', 'worker_id': self.worker.id, 'kind': 'in', 'project_id': self.project.id,
+             'timestamp': start.isoformat()},
+            {'key': 'o', 'worker_id': self.worker.id, 'kind': 'out',
+             'timestamp': (start + timedelta(hours=2)).isoformat()},
+        ]}, content_type='application/json')
+        self.assertEqual(self.financials().wages, Decimal('600.00'))
+        self.assertEqual(find_cost_drift(), [])
+
+    def test_project_detail_endpoint(self):
+        Payment.objects.create(user=self.owner, project=self.project, type='paid', category='materials',
+                               amount=Decimal('4000'), date=timezone.localdate())
+        self.client.force_login(self.owner)
+        data = self.client.get(reverse('project_detail', args=[self.project.id])).json()
+        self.assertEqual(data['financials']['remaining'], '6000.00')
+        self.assertEqual(data['financials']['burn_percent'], 40.0)
+        self.assertEqual(data['burn_down']['series'][0]['cumulative'], '4000.00')
+        self.assertIsNotNone(data['burn_down']['projected_exhaustion'])
+
+        other = User.objects.create_user(username='other', password='pass12345')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('project_detail', args=[self.project.id])).status_code, 404)
+
+    def test_projects_page_shows_spend_without_scanning_ledgers(self):
+        ProjectCost.objects.create(project=self.project, date=date(2025, 3, 3), category='materials',
+                                   amount=Decimal('1234'))
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('projects'))
+        self.assertContains(response, 'KES 1234')
+        self.assertContains(response, '12.3%')
+
+
+class CashFlowReportTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        owner = User.objects.create_user(username='owner', password='pass12345')
+        self.house = Project.objects.create(user=owner, name='House', budget=1000, start_date=date(2025, 1, 1))
+        for day, type_, category, method, amount, status, project in [
+            (date(2025, 1, 5), 'received', 'client_payment', 'bank', '1000.10', 'completed', None),
+            (date(2025, 1, 9), 'paid', 'materials', 'mpesa', '300.05', 'completed', self.house),
+            (date(2025, 2, 1), 'paid', 'transport', 'cash', '200', 'completed', self.house),
+            (date(2025, 2, 2), 'paid', 'transport', 'cash', '999', 'cancelled', None),
+            (date(2025, 4, 3), 'received', 'client_payment', 'mpesa', '500', 'completed', None),
+        ]:
+            Payment.objects.create(user=owner, project=project, type=type_, category=category, amount=Decimal(amount),
+                                   payment_method=method, status=status, date=day)
+        worker = Worker.objects.create(user=self.staff_user, name='Juma', role='mason')
+        clock_in = timezone.make_aware(datetime(2025, 2, 3, 7))
+        TimeLog.objects.create(worker=worker, project=self.house, date=date(2025, 2, 3),
+                               clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=7, minutes=30))
+
+    def test_monthly_totals_balance_and_deltas(self):
+        report = cash_flow_report('month')
+        self.assertEqual(report.periods, ['2025-01', '2025-02', '2025-03', '2025-04'])
+        rows = list(report.rows())
+        self.assertEqual([r['net'] for r in rows], ['700.05', '-200.00', '0.00', '500.00'])
+        self.assertEqual([r['balance'] for r in rows], ['700.05', '500.05', '500.05', '1000.05'])
+        self.assertEqual([r['delta'] for r in rows], ['700.05', '-900.05', '200.00', '500.00'])
+        self.assertEqual(rows[1]['hours'], '7.50')
+
+    def test_quarterly_by_category(self):
+        report = cash_flow_report('quarter', 'category')
+        self.assertEqual(report.periods, ['2025-Q1', '2025-Q2'])
+        rows = {(r['period'], r['group']): r for r in report.rows()}
+        self.assertEqual(rows[('2025-Q1', 'transport')]['paid'], '200.00')
+        self.assertEqual(rows[('2025-Q2', 'client_payment')]['balance'], '1500.10')
+
+    def test_by_project_with_opening_balance(self):
+        report = cash_flow_report('month', 'project', date_from=date(2025, 2, 1))
+        self.assertEqual(report.groups, ['No project', 'House'])
+        rows = {(r['period'], r['group']): r for r in report.rows()}
+        self.assertEqual(rows[('2025-02', 'House')]['balance'], '-500.05')
+        self.assertEqual(rows[('2025-02', 'House')]['hours'], '7.50')
+        self.assertEqual(rows[('2025-04', 'No project')]['balance'], '1500.10')
+
+    def test_endpoint_json_and_csv(self):
+        self.client.force_login(self.staff_user)
+        data = self.client.get(reverse('cash_flow'), {'period': 'quarter', 'group': 'method'}).json()
+        self.assertEqual(data['groups'], ['bank', 'cash', 'mpesa'])
+
+        response = self.client.get(reverse('cash_flow'), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'period,group,received,paid,net,balance,delta,hours')
+        self.assertEqual(len(lines), 5)
+
+        self.assertEqual(self.client.get(reverse('cash_flow'), {'period': 'week'}).status_code, 400)
+
+    def test_command_writes_csv(self):
+        out = StringIO()
+        call_command('cash_flow_report', '--period', 'quarter', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1], '2025-Q1,all,1000.10,500.05,500.05,500.05,500.05,7.50')
+
+
+@mock.patch('base.reports.np', None)
+class CashFlowReportFallbackTests(CashFlowReportTests):
+    """The same report without NumPy installed"""
+
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        other = User.objects.create_user(username='other', password='pass12345')
+        make_payments(self.user, 5)
+        make_payments(other, 3)
+        Worker.objects.create(user=other, name='Juma', role='mason', id_number='12345678')
+        self.client.login(username='client', password='pass12345')
+
+    def get(self, resource, **params):
+        return self.client.get(reverse('api_list', args=[resource]), params)
+
+    def test_sparse_fieldset_and_scoping(self):
+        response = self.get('payments', fields='amount,status')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(len(data), 5)
+        self.assertEqual(set(data[0]), {'id', 'amount', 'status'})
+        self.assertEqual(set(Payment.objects.filter(id__in=[d['id'] for d in data]).values_list('user', flat=True)),
+                         {self.user.pk})
+
+    def test_workers_hide_private_columns(self):
+        item = self.get('workers').json()['data'][0]
+        self.assertEqual(item['name'], 'Juma')
+        self.assertNotIn('id_number', item)
+        self.assertEqual(self.get('workers', fields='id_number').status_code, 400)
+
+    def test_errors(self):
+        self.assertEqual(self.get('payments', fields='amount,bogus').status_code, 400)
+        self.assertEqual(self.get('payments', limit='0').status_code, 400)
+        self.assertEqual(self.get('payments', cursor='garbage').status_code, 400)
+        self.assertEqual(self.get('invoices').status_code, 404)
+        other = Payment.objects.exclude(user=self.user).first()
+        self.assertEqual(self.client.get(reverse('api_detail', args=['payments', other.pk])).status_code, 404)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen, url = [], reverse('api_list', args=['payments']) + '?limit=2&fields=id'
+        while url:
+            body = self.client.get(url).json()
+            seen += [item['id'] for item in body['data']]
+            url = body['next']
+        self.assertEqual(seen, sorted(Payment.objects.filter(user=self.user).values_list('id', flat=True)))
+
+    def test_list_conditional_get(self):
+        response = self.get('payments')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('api_list', args=['payments']), HTTP_IF_NONE_MATCH=etag).status_code,
+                         304)
+        self.assertEqual(self.client.get(reverse('api_list', args=['payments']),
+                                         HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # A delete leaves the newest updated_at alone but changes the count
+        Payment.objects.filter(user=self.user).order_by('id').first().delete()
+        response = self.client.get(reverse('api_list', args=['payments']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_conditional_get(self):
+        payment = Payment.objects.filter(user=self.user).first()
+        url = reverse('api_detail', args=['payments', payment.pk])
+        response = self.client.get(url, {'fields': 'amount'})
+        self.assertEqual(response.json()['data'], {'id': payment.pk, 'amount': '100.00'})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'fields': 'amount'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        payment.amount = Decimal('150.00')
+        payment.save()
+        response = self.client.get(url, {'fields': 'amount'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['amount'], '150.00')
+
+    def test_since_returns_only_newer_rows(self):
+        cutoff = timezone.now()
+        payment = Payment.objects.filter(user=self.user).first()
+        payment.save()
+        data = self.get('payments', since=cutoff.isoformat(), fields='id').json()['data']
+        self.assertEqual(data, [{'id': payment.pk}])
+        self.assertEqual(self.get('payments', since='yesterday').status_code, 400)
+        self.assertEqual(self.get('payments', since='2024-13-45T00:00').status_code, 400)
+        # A naive time is read in the site's time zone
+        naive = timezone.localtime(cutoff).replace(tzinfo=None)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            data = self.get('payments', since=naive.isoformat(), fields='id').json()['data']
+        self.assertEqual(data, [{'id': payment.pk}])
+
+    def test_query_budget(self):
+        # One aggregate for the validators, one page query
+        with self.assertNumQueries(4):
+            self.get('payments')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Connection pragmas are SQLite specific')
+class SqliteConnectionTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_BUSY_TIMEOUT_MS)
+        # 1 = NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+# SimpleTestCase: TestCase wraps each test in a transaction, which pins reads to the primary
+@mock.patch('base.replicas.replica_alias', return_value='replica')
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_only_replica_reads_views_use_the_replica(self, _):
+        self.assertIsNone(self.router.db_for_read(Payment))
+        with reading_replica():
+            self.assertEqual(self.router.db_for_read(Payment), 'replica')
+        self.assertIsNone(self.router.db_for_read(Payment))
+
+    def test_write_moves_the_rest_of_the_request_to_the_primary(self, _):
+        with reading_replica():
+            self.assertEqual(self.router.db_for_write(Payment), 'default')
+            self.assertIsNone(self.router.db_for_read(Payment))
+
+    def test_no_replica_configured(self, replica_alias):
+        replica_alias.return_value = None
+        with reading_replica():
+            self.assertIsNone(self.router.db_for_read(Payment))
+
+    def test_recent_writer_is_pinned_to_the_primary(self, _):
+        view = replica_reads(lambda request: self.router.db_for_read(Payment))
+        self.assertEqual(view(self.factory.get('/')), 'replica')
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertIsNone(view(request))
+
+    @override_settings(DB_REPLICA_PIN_SECONDS=7)
+    def test_middleware_pins_after_unsafe_requests(self, _):
+        middleware = PinPrimaryMiddleware(lambda request: HttpResponse())
+        response = middleware(self.factory.post('/payments/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 7)
+        self.assertNotIn(PIN_COOKIE, middleware(self.factory.get('/payments/')).cookies)
+
+
+# TransactionTestCase: inside TestCase's transaction every read stays on the primary
+class ReplicaFileTests(TransactionTestCase):
+    """
+    Primary and replica as two SQLite files, to see which one each read
+    reaches. The replica alias only exists when DB_REPLICA_NAME is set, so
+    the class adds it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.settings[REPLICA] = {
+            **connections.settings['default'], 'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+            'TEST': {**connections.settings['default']['TEST'], 'NAME': None, 'MIRROR': None},
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        # Set here rather than on the class: the runner checks the class's databases before the alias exists
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del cls.databases
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        # Rows only the replica file has (bulk_create skips the ledger signals, which write to the primary)
+        User.objects.using(REPLICA).bulk_create([User(username='replica-client')])
+        replica_user = User.objects.using(REPLICA).get(username='replica-client')
+        Payment.objects.using(REPLICA).bulk_create([Payment(
+            user=replica_user, type='received', category='client_payment', amount=Decimal('700'),
+            date=date(2025, 1, 5), status='completed')])
+
+    def test_writes_go_to_the_primary_and_pinned_clients_read_it(self):
+        self.client.post(reverse('payments'), {'type': 'paid', 'category': 'materials', 'amount': '100',
+                                               'description': 'Sand', 'date': '2025-01-06'})
+        self.assertTrue(Payment.objects.using('default').filter(user=self.staff).exists())
+        self.assertFalse(Payment.objects.using(REPLICA).filter(user__username='staff').exists())
+
+        # The write pinned this client to the primary
+        self.assertIn(PIN_COOKIE, self.client.cookies)
+        response = self.client.get(reverse('staff_payments'))
+        self.assertEqual([p.user.username for p in response.context['payments']], ['staff'])
+
+        del self.client.cookies[PIN_COOKIE]
+        response = self.client.get(reverse('staff_payments'))
+        self.assertEqual([p.user.username for p in response.context['payments']], ['replica-client'])
+        self.assertContains(response, 'replica-client')
+
+    def test_only_replica_reads_views_read_the_replica(self):
+        self.client.login(username='staff', password='pass12345')
+        self.assertEqual(self.client.get(reverse('payments')).context['payments'], [])
+        self.assertEqual(len(self.client.get(reverse('staff_payments')).context['payments']), 1)
+
+
+JOB_CALLS = []
+
+
+@job(name='test_record')
+def record_job(value):
+    JOB_CALLS.append(value)
+
+
+@job(name='test_flaky', max_attempts=2)
+def flaky_job():
+    raise RuntimeError('boom')
+
+
+@job(name='test_limited', concurrency=1)
+def limited_job():
+    pass
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def test_claims_by_priority_then_due_time(self):
+        low = enqueue('test_record', {'value': 'low'}, priority=-1)
+        first = enqueue('test_record', {'value': 'first'})
+        urgent = enqueue(record_job, {'value': 'urgent'}, priority=9)
+        enqueue('test_record', {'value': 'later'}, delay=timedelta(hours=1))
+
+        jobs = claim('w1', 10)
+        self.assertEqual([j.pk for j in jobs], [urgent.pk, first.pk, low.pk])
+        self.assertTrue(all(j.status == 'running' and j.attempts == 1 and j.locked_by == 'w1' for j in jobs))
+        self.assertEqual(claim('w2', 10), [])
+
+        for j in jobs:
+            self.assertEqual(run_job(j), 'done')
+        self.assertEqual(JOB_CALLS, ['urgent', 'first', 'low'])
+        self.assertEqual(BackgroundJob.objects.filter(status='done').count(), 3)
+
+    def test_retries_with_backoff_then_fails(self):
+        flaky = enqueue('test_flaky')
+        with self.assertLogs('base.jobqueue', 'WARNING'):
+            self.assertEqual(run_job(claim('w1', 1)[0]), 'queued')
+        flaky.refresh_from_db()
+        self.assertEqual(flaky.status, 'queued')
+        self.assertIn('boom', flaky.last_error)
+        self.assertGreater(flaky.run_at, timezone.now())
+
+        self.assertEqual(claim('w1', 1), [])
+        retry = claim('w1', 1, now=flaky.run_at)[0]
+        self.assertEqual(retry.attempts, 2)
+        with self.assertLogs('base.jobqueue', 'ERROR'):
+            self.assertEqual(run_job(retry), 'failed')
+        flaky.refresh_from_db()
+        self.assertEqual(flaky.status, 'failed')
+        self.assertIsNotNone(flaky.finished_at)
+
+    def test_concurrency_limit_across_workers(self):
+        for _ in range(3):
+            enqueue('test_limited')
+        enqueue('test_record', {'value': 1})
+        self.assertEqual(sorted(j.name for j in claim('w1', 10)), ['test_limited', 'test_record'])
+        self.assertEqual(claim('w2', 10), [])
+
+    def test_stale_running_job_is_handed_out_again(self):
+        stuck = enqueue('test_record', {'value': 'x'})
+        claim('dead', 1)
+        later = timezone.now() + timedelta(hours=1)
+        requeue_stale(later)
+        [again] = claim('w2', 1, now=later)
+        self.assertEqual((again.pk, again.locked_by, again.attempts), (stuck.pk, 'w2', 2))
+
+    def test_unique_key_coalesces_waiting_jobs(self):
+        a = enqueue('test_record', {'value': 1}, unique_key='u1')
+        self.assertEqual(enqueue('test_record', {'value': 2}, unique_key='u1').pk, a.pk)
+        claim('w1', 1)
+        self.assertNotEqual(enqueue('test_record', {'value': 3}, unique_key='u1').pk, a.pk)
+        with self.assertRaises(ValueError):
+            enqueue('no_such_job')
+
+    def test_application_response_notifies_worker_in_background(self):
+        owner = User.objects.create_user(username='owner', password='pass12345', email='owner@example.com')
+        worker_user = User.objects.create_user(username='juma', password='pass12345', email='juma@example.com')
+        project = Project.objects.create(user=owner, name='House', budget=1000, start_date=date(2025, 1, 1))
+        worker = Worker.objects.create(user=worker_user, name='Juma', role='mason')
+        application = JobApplication.objects.create(worker=worker, project=project)
+
+        self.client.login(username='owner', password='pass12345')
+        self.client.post(reverse('respond_to_application', args=[application.pk]), {'action': 'accept'})
+        self.assertEqual(len(mail.outbox), 0)
+
+        [queued] = [j for j in claim('w1', 10) if j.name == 'notify_application']
+        self.assertEqual(queued.payload, {'application_id': application.pk, 'event': 'responded'})
+        self.assertEqual(run_job(queued), 'done')
+        self.assertEqual(mail.outbox[0].to, ['juma@example.com'])
+        self.assertIn('accepted', mail.outbox[0].subject)
+
+
+    def test_payment_and_its_reconcile_job_commit_together(self):
+        owner = User.objects.create_user(username='owner', password='pass12345')
+        self.client.login(username='owner', password='pass12345')
+        form = {'type': 'paid', 'category': 'materials', 'amount': '100', 'description': 'Sand', 'date': '2025-01-05'}
+        with mock.patch('base.views.enqueue', side_effect=DatabaseError('queue unavailable')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('payments'), form)
+        self.assertFalse(Payment.objects.filter(user=owner).exists())
+
+        self.client.post(reverse('payments'), form)
+        self.assertTrue(Payment.objects.filter(user=owner).exists())
+        self.assertTrue(BackgroundJob.objects.filter(name='reconcile_ledger', unique_key=str(owner.pk)).exists())
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        # 10 days x 2 workers at 1000/day
+        self.project = Project.objects.create(
+            user=self.owner, name='Villa', budget=20000, start_date=date(2025, 3, 1), end_date=date(2025, 3, 10),
+            required_skills=['plumbing', 'tiling'], crew_size=2,
+        )
+
+    def make_worker(self, name, **fields):
+        user = User.objects.create_user(username=name.lower(), password='pass12345')
+        fields = {'role': 'plumber', 'daily_rate': 800, 'rating': 4, 'experience_years': 5,
+                  'completed_projects': 10, **fields}
+        return Worker.objects.create(user=user, name=name, **fields)
+
+    def apply(self, worker):
+        return JobApplication.objects.create(worker=worker, project=self.project)
+
+    def test_applicants_ranked_by_skills_rating_and_rate(self):
+        both = self.apply(self.make_worker('Both', skills=['Plumbing', 'tiling']))
+        one = self.apply(self.make_worker('One', skills=['plumbing'], rating=5))
+        pricey = self.apply(self.make_worker('Pricey', skills=['plumbing'], rating=5, daily_rate=2000))
+        away = self.apply(self.make_worker('Away', skills=['plumbing'], rating=5, status='on_leave'))
+
+        ranked = ranked_applicants(self.project)
+        self.assertEqual([r['application_id'] for r in ranked], [both.pk, one.pk, pricey.pk, away.pk])
+        self.assertEqual(ranked[0]['components']['skills'], 1.0)
+        self.assertEqual(ranked[2]['components']['rate'], 0.5)
+        self.assertEqual(MatchScore.objects.filter(project=self.project).count(), 4)
+
+    def test_cached_scores_reused_until_inputs_change(self):
+        worker = self.make_worker('Juma', skills=['plumbing'])
+        self.apply(worker)
+        first = ranked_applicants(self.project)[0]['score']
+        with self.assertNumQueries(2):
+            ranked_applicants(self.project)
+
+        worker.skills = ['plumbing', 'tiling']
+        worker.save()
+        self.assertGreater(ranked_applicants(self.project)[0]['score'], first)
+
+    def test_refresh_job_rescores_after_worker_change(self):
+        worker = self.make_worker('Juma', skills=[])
+        self.apply(worker)
+        ranked_applicants(self.project)
+        BackgroundJob.objects.all().delete()
+
+        Worker.objects.filter(pk=worker.pk).update(rating=0)
+        worker.refresh_from_db()
+        worker.save()
+        [refresh] = claim('w1', 10)
+        self.assertEqual(refresh.payload, {'worker_id': worker.pk})
+        run_job(refresh)
+        self.assertEqual(MatchScore.objects.get(worker=worker).rating, 0)
+
+    def test_large_project_proposes_top_workers(self):
+        self.project.crew_size = 5
+        self.project.save()
+        applied = self.make_worker('Applied', skills=['plumbing', 'tiling'])
+        self.apply(applied)
+        for i in range(12):
+            self.make_worker(f'W{i}', skills=['plumbing'], rating=i % 6)
+        self.make_worker('Unskilled', skills=['painting'], rating=5)
+        self.make_worker('Gone', skills=['plumbing', 'tiling'], status='inactive')
+
+        proposed = propose_workers(self.project)
+        self.assertEqual(len(proposed), 10)
+        names = [p['worker']['name'] for p in proposed]
+        self.assertNotIn('Applied', names)
+        self.assertNotIn('Unskilled', names)
+        self.assertNotIn('Gone', names)
+        self.assertEqual([p['score'] for p in proposed], sorted((p['score'] for p in proposed), reverse=True))
+
+        self.client.login(username='owner', password='pass12345')
+        data = self.client.get(reverse('project_matches', args=[self.project.pk])).json()
+        self.assertEqual(data['applicants'][0]['worker']['name'], 'Applied')
+        self.assertEqual([p['worker']['name'] for p in data['proposed']], names)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.project = Project.objects.create(user=self.owner, name='Villa', start_date=date(2025, 3, 1),
+                                              end_date=date(2025, 3, 10))
+
+    def make_worker(self, name, role='plumber', **fields):
+        user = User.objects.create_user(username=name.lower(), password='pass12345', is_staff=True)
+        return Worker.objects.create(user=user, name=name, role=role, **fields)
+
+    def test_interval_index_matches_brute_force(self):
+        import random
+        rng = random.Random(7)
+        intervals = []
+        for key in range(500):
+            start = rng.randrange(1000)
+            intervals.append((start, start + rng.randrange(30), key))
+        index = IntervalIndex(intervals)
+        for _ in range(200):
+            start = rng.randrange(-10, 1040)
+            end = start + rng.randrange(40)
+            expected = {key for s, e, key in intervals if s <= end and e >= start}
+            self.assertEqual(set(index.overlapping(start, end)), expected)
+        self.assertEqual(IntervalIndex([]).overlapping(0, 10), [])
+
+    def test_free_workers_by_trade_and_dates(self):
+        booked = self.make_worker('Booked', rating=5)
+        free = self.make_worker('Free', rating=4)
+        self.make_worker('Sparky', role='electrician')
+        self.make_worker('Gone', status='inactive')
+        with self.captureOnCommitCallbacks(execute=True):
+            book_worker(booked, date(2025, 3, 5), date(2025, 3, 8), project=self.project)
+
+        names = lambda start, end: [w['name'] for w in free_workers(start, end, trade='plumber')]
+        self.assertEqual(names(date(2025, 3, 1), date(2025, 3, 5)), ['Free'])
+        self.assertEqual(names(date(2025, 3, 9), date(2025, 3, 12)), ['Booked', 'Free'])
+        self.assertEqual(len(free_workers(date(2025, 3, 6), date(2025, 3, 6))), 2)
+
+        # The cached index is rebuilt once the new booking commits
+        with self.captureOnCommitCallbacks(execute=True):
+            book_worker(free, date(2025, 3, 1), date(2025, 3, 1), kind='leave')
+        self.assertEqual(names(date(2025, 3, 1), date(2025, 3, 5)), [])
+        self.assertEqual(conflicts(free.pk, date(2025, 2, 20), date(2025, 3, 1)), [free.bookings.get().pk])
+
+    def test_overlapping_booking_is_refused(self):
+        worker = self.make_worker('Juma')
+        book_worker(worker, date(2025, 3, 1), date(2025, 3, 10), project=self.project)
+        with self.assertRaises(BookingConflict) as raised:
+            book_worker(worker, date(2025, 3, 10), date(2025, 3, 12), kind='leave')
+        self.assertEqual(len(raised.exception.conflicts), 1)
+        book_worker(worker, date(2025, 3, 11), date(2025, 3, 12), kind='leave')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            WorkerBooking.objects.create(worker=worker, start_date=date(2025, 4, 2), end_date=date(2025, 4, 1))
+
+    def test_accepting_application_books_worker_and_prevents_double_booking(self):
+        worker = self.make_worker('Juma')
+        other = Project.objects.create(user=self.owner, name='Shop', start_date=date(2025, 3, 8),
+                                       end_date=date(2025, 3, 20))
+        first = JobApplication.objects.create(worker=worker, project=self.project)
+        second = JobApplication.objects.create(worker=worker, project=other)
+        self.client.login(username='owner', password='pass12345')
+
+        self.client.post(reverse('respond_to_application', args=[first.pk]), {'action': 'accept'})
+        booking = WorkerBooking.objects.get(application=first)
+        self.assertEqual((booking.start_date, booking.end_date), (date(2025, 3, 1), date(2025, 3, 10)))
+
+        self.client.post(reverse('respond_to_application', args=[second.pk]), {'action': 'accept'})
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'applied')
+        self.assertFalse(WorkerBooking.objects.filter(application=second).exists())
+
+        # Moving the project moves its bookings; rejecting releases them
+        self.project.end_date = date(2025, 3, 6)
+        self.project.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.end_date, date(2025, 3, 6))
+        self.client.post(reverse('respond_to_application', args=[first.pk]), {'action': 'reject'})
+        self.assertFalse(WorkerBooking.objects.exists())
+
+    def test_moving_a_project_onto_another_booking_is_refused(self):
+        worker = self.make_worker('Juma')
+        booking = book_worker(worker, date(2025, 3, 1), date(2025, 3, 10), project=self.project)
+        book_worker(worker, date(2025, 3, 14), date(2025, 3, 20), kind='leave')
+
+        self.project.end_date = date(2025, 3, 15)
+        with self.assertRaises(BookingConflict) as raised:
+            self.project.save()
+        self.assertEqual([b.kind for b in raised.exception.conflicts], ['leave'])
+        self.project.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertEqual((self.project.end_date, booking.end_date), (date(2025, 3, 10), date(2025, 3, 10)))
+
+        admin_user = User.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(admin_user)
+        form = {'user': self.owner.pk, 'name': 'Villa', 'budget': '0', 'status': 'planning', 'progress': '0',
+                'start_date': '2025-03-01', 'end_date': '2025-03-15', 'required_skills': '[]', 'crew_size': '1'}
+        response = self.client.post(reverse('admin:base_project_change', args=[self.project.pk]), form)
+        self.assertContains(response, 'Worker is already booked 2025-03-14 to 2025-03-20')
+        form['end_date'] = '2025-03-12'
+        self.client.post(reverse('admin:base_project_change', args=[self.project.pk]), form)
+        booking.refresh_from_db()
+        self.assertEqual(booking.end_date, date(2025, 3, 12))
+
+    def test_availability_endpoints(self):
+        worker = self.make_worker('Juma')
+        self.client.login(username='juma', password='pass12345')
+        url = reverse('staff_bookings')
+        response = self.client.post(url, {'start': '2025-03-01', 'end': '2025-03-03', 'note': 'Wedding'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(url, {'start': '2025-03-03', 'end': '2025-03-04'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'][0]['note'], 'Wedding')
+        self.assertEqual(self.client.post(url, {'start': '2025-03-04'}).status_code, 400)
+
+        self.client.login(username='owner', password='pass12345')
+        params = {'start': '2025-03-02', 'end': '2025-03-02', 'trade': 'plumber'}
+        self.assertEqual(self.client.get(reverse('available_workers'), params).json()['count'], 0)
+        params['start'] = params['end'] = '2025-03-04'
+        self.assertEqual(self.client.get(reverse('available_workers'), params).json()['results'][0]['id'], worker.pk)
+        self.assertEqual(self.client.get(reverse('available_workers'), {'start': 'soon'}).status_code, 400)
+
+        data = self.client.get(reverse('worker_conflicts', args=[worker.pk]),
+                               {'start': '2025-02-25', 'end': '2025-03-01'}).json()
+        self.assertFalse(data['available'])
+        self.assertEqual(data['conflicts'][0]['kind'], 'leave')
+
+
+class CalendarTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.client.login(username='client', password='pass12345')
+        self.safety = RecurringTask.objects.create(
+            user=self.user, title='Safety check', type='safety_check', time=time(8, 0),
+            frequency='weekly', start_date=date(2025, 1, 6), until=date(2025, 12, 31),
+        )
+
+    def rule(self, frequency, start, interval=1, until=None):
+        return RecurringTask(frequency=frequency, interval=interval, start_date=start, until=until)
+
+    def test_occurrences_jump_to_window(self):
+        weekly = self.rule('weekly', date(2020, 1, 6), interval=2)
+        every = list(occurrence_dates(weekly, date(2020, 1, 1), date(2025, 3, 31)))
+        self.assertEqual(list(occurrence_dates(weekly, date(2025, 3, 1), date(2025, 3, 31))),
+                         [day for day in every if day >= date(2025, 3, 1)])
+        self.assertEqual(list(occurrence_dates(weekly, date(2025, 3, 1), date(2025, 3, 31))),
+                         [date(2025, 3, 10), date(2025, 3, 24)])
+        daily = self.rule('daily', date(2025, 3, 1), until=date(2025, 3, 3))
+        self.assertEqual(len(list(occurrence_dates(daily, date(2025, 1, 1), date(2025, 12, 31)))), 3)
+        # No 31st in February or April
+        monthly = self.rule('monthly', date(2025, 1, 31))
+        self.assertEqual(list(occurrence_dates(monthly, date(2025, 2, 1), date(2025, 5, 31))),
+                         [date(2025, 3, 31), date(2025, 5, 31)])
+        self.assertEqual(list(occurrence_dates(monthly, date(2024, 1, 1), date(2024, 12, 31))), [])
+
+    def test_range_merges_tasks_and_occurrences(self):
+        Task.objects.create(user=self.user, title='Delivery', type='delivery', date=date(2025, 3, 4), time=time(9))
+        Task.objects.create(user=self.user, title='Later', type='other', date=date(2025, 4, 1), time=time(9))
+        url = reverse('calendar_range')
+        response = self.client.get(url, {'start': '2025-03-01', 'end': '2025-03-14'})
+        titles = [(e['date'], e['title']) for e in response.json()['events']]
+        self.assertEqual(titles, [('2025-03-03', 'Safety check'), ('2025-03-04', 'Delivery'),
+                                  ('2025-03-10', 'Safety check')])
+
+        # Completing one occurrence stores it in place of the expanded one
+        done = reverse('complete_occurrence', args=[self.safety.pk, '2025-03-10'])
+        self.assertEqual(self.client.post(done).status_code, 200)
+        self.assertEqual(self.client.post(reverse('complete_occurrence', args=[self.safety.pk, '2025-03-11']))
+                         .status_code, 400)
+        events = calendar_events(self.user, date(2025, 3, 10), date(2025, 3, 10))
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0]['completed'])
+        self.assertIsNotNone(events[0]['task_id'])
+
+        self.assertEqual(self.client.get(url, {'start': '2025-03-14', 'end': '2025-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2025-01-01', 'end': '2026-06-01'}).status_code, 400)
+
+    def test_schedule_post_creates_recurring_task(self):
+        self.client.post(reverse('schedule'), {
+            'title': 'Site walk', 'type': 'inspection', 'date': '2025-03-05', 'time': '07:30',
+            'repeat': 'monthly', 'interval': '2',
+        })
+        rule = RecurringTask.objects.get(title='Site walk')
+        self.assertEqual((rule.frequency, rule.interval, rule.until), ('monthly', 2, None))
+        self.assertFalse(Task.objects.filter(title='Site walk').exists())
+        self.client.get(reverse('schedule'))
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('schedule'))
+        self.assertContains(response, f'calendar.ics?token={feed_token(self.user)}')
+
+    def test_schedule_post_rejects_bad_recurrence(self):
+        form = {'title': 'Site walk', 'type': 'inspection', 'date': '2025-03-05', 'time': '07:30', 'repeat': 'weekly'}
+        for bad in ({'interval': 'two'}, {'interval': '0'}, {'until': '2025-03-01'}, {'date': '5 March'}):
+            with self.subTest(**bad):
+                response = self.client.post(reverse('schedule'), {**form, **bad})
+                self.assertRedirects(response, reverse('schedule'), fetch_redirect_response=False)
+                self.assertEqual(list(get_messages(response.wsgi_request))[-1].level_tag, 'error')
+        self.assertFalse(RecurringTask.objects.filter(title='Site walk').exists())
+
+    def test_ics_feed_streams_and_revalidates(self):
+        today = timezone.localdate()
+        RecurringTask.objects.filter(pk=self.safety.pk).update(until=date(today.year + 1, 1, 31))
+        project = Project.objects.create(user=self.user, name='Karen villa', status='active')
+        Task.objects.create(user=self.user, title='Pour, slab; level 2', type='milestone', date=today,
+                            time=time(7), description='Line one\nLine two ' + 'x' * 80, project=project)
+        response = self.client.get(reverse('calendar_feed'))
+        self.assertIsInstance(response, StreamingHttpResponse)
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'RRULE:FREQ=WEEKLY;INTERVAL=1;UNTIL={today.year + 1}0131T235959', body)
+        self.assertIn('SUMMARY:Pour\\, slab\\; level 2', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+        etag = response['ETag']
+        self.client.logout()
+        url = f"{reverse('calendar_feed')}?token={feed_token(self.user)}"
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Task.objects.create(user=self.user, title='New', type='other', date=today, time=time(9))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # The project name is the event's LOCATION
+        etag = response['ETag']
+        project.name = 'Karen villa phase 2'
+        project.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('LOCATION:Karen villa phase 2', b''.join(response.streaming_content).decode())
+        self.assertEqual(self.client.get(f"{reverse('calendar_feed')}?token=1:forged").status_code, 403)
+        self.assertEqual(self.client.get(reverse('calendar_feed')).status_code, 302)
+
+        # Resetting the link turns the old one away
+        self.client.login(username='client', password='pass12345')
+        self.assertRedirects(self.client.post(reverse('reset_calendar_feed')), reverse('schedule'),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertNotIn(url, self.client.get(reverse('schedule')).content.decode())
+        self.assertEqual(self.client.get(f"{reverse('calendar_feed')}?token={feed_token(self.user)}").status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        self.staff = User.objects.create_user(username='staff', password='pass12345', is_staff=True)
+
+    def series(self, route, metric):
+        return metrics.registry.collect().get((route, metric))
+
+    def test_records_per_url_name(self):
+        self.client.login(username='client', password='pass12345')
+        response = self.client.get(reverse('schedule'))
+        self.client.get(reverse('schedule'))
+        self.client.get('/no-such-page/')
+
+        buckets, count, total, recent = self.series('schedule', 'request_duration_seconds')
+        self.assertEqual(count, 2)
+        self.assertEqual(buckets[-1], 2)
+        self.assertEqual(len(recent), 2)
+        _, _, queries, _ = self.series('schedule', 'sql_queries')
+        self.assertGreaterEqual(queries, 2 * 4)
+        self.assertGreater(self.series('schedule', 'sql_duration_seconds')[2], 0)
+        self.assertGreater(self.series('schedule', 'template_duration_seconds')[2], 0)
+        self.assertEqual(self.series('schedule', 'response_size_bytes')[2], 2 * len(response.content))
+        self.assertEqual(self.series(metrics.UNRESOLVED, 'request_duration_seconds')[1], 1)
+
+    def test_streamed_size_counted_when_sent(self):
+        self.client.login(username='client', password='pass12345')
+        response = self.client.get(reverse('calendar_feed'))
+        self.assertIsNone(self.series('calendar_feed', 'response_size_bytes'))
+        body = b''.join(response.streaming_content)
+        self.assertEqual(self.series('calendar_feed', 'response_size_bytes')[2], len(body))
+
+    def test_recording_from_threads_adds_up(self):
+        import threading
+        def record():
+            for _ in range(500):
+                metrics.registry.observe('home', [('sql_queries', 3)])
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buckets, count, total, recent = self.series('home', 'sql_queries')
+        self.assertEqual((count, total), (2000, 6000))
+        self.assertEqual(len(recent), 4 * metrics.RING_SIZE)
+
+    def test_thread_per_request_keeps_a_fixed_number_of_shards(self):
+        import threading
+        for _ in range(3 * metrics.SHARDS):
+            thread = threading.Thread(target=metrics.registry.observe, args=('home', [('sql_queries', 1)]))
+            thread.start()
+            thread.join()
+        self.assertEqual(len(metrics.registry.shards), metrics.SHARDS)
+        buckets, count, total, recent = self.series('home', 'sql_queries')
+        self.assertEqual(count, 3 * metrics.SHARDS)
+        self.assertLessEqual(len(recent), metrics.SHARDS * metrics.RING_SIZE)
+
+    def test_prometheus_endpoint_is_staff_only(self):
+        url = reverse('metrics')
+        self.client.login(username='client', password='pass12345')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username='staff', password='pass12345')
+        self.client.get(reverse('staff_portal'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE bidii_request_duration_seconds histogram', text)
+        self.assertIn('bidii_request_duration_seconds_bucket{route="staff_portal",le="+Inf"} 1', text)
+        self.assertIn('bidii_sql_queries_count{route="staff_portal"} 1', text)
+        self.assertRegex(text, r'bidii_request_duration_seconds_recent\{route="staff_portal",quantile="0.99"\} [0-9.e-]+')
+
+
+class BenchmarkTests(TestCase):
+    def test_every_view_has_a_case(self):
+        self.assertEqual(uncovered_views(), [])
+
+    def test_generator_is_deterministic(self):
+        counts = generate(200, seed=7, batch_size=64)
+        sizes = plan(200)
+        self.assertEqual(counts['base_payment'], 200)
+        self.assertEqual(counts['base_task'], sizes['tasks'])
+        self.assertEqual(counts['base_worker'], sizes['workers'])
+        first = list(Payment.objects.order_by('reference').values_list('reference', 'amount', 'date', 'user__username'))
+        self.assertEqual(find_drift(), [])
+        with self.assertRaises(ValueError):
+            generate(200, seed=7)
+
+        flush()
+        self.assertFalse(Payment.objects.exists())
+        generate(200, seed=7, batch_size=200)
+        again = list(Payment.objects.order_by('reference').values_list('reference', 'amount', 'date', 'user__username'))
+        self.assertEqual(first, again)
+
+    def test_suite_runs_every_case(self):
+        generate(200)
+        cache.clear()
+        results = run_suite(repeat=1)
+        for name, result in results.items():
+            self.assertGreaterEqual(result['median_ms'], 0, name)
+            if name.startswith('view:'):
+                self.assertIn(result['status'], (200, 201, 302), name)
+        self.assertGreater(results['view:dashboard']['queries'], 0)
+        self.assertIn('orm:calendar_month', results)
+        # Write cases are rolled back
+        self.assertTrue(Project.objects.filter(user__username='synthetic-client-0').exists())
+
+    def test_compare_flags_queries_and_slowdowns(self):
+        def report(**cases):
+            return {'scales': {'1000': {'cases': {
+                name: {'median_ms': ms, 'queries': queries} for name, (ms, queries) in cases.items()}}}}
+        baseline = report(a=(10.0, 3), b=(10.0, 3), c=(1.0, 3), d=(10.0, 3))
+        current = report(a=(10.5, 4), b=(20.0, 3), c=(1.9, 3), d=(5.0, 2), e=(99.0, 99))
+        found = {(r['case'], r['metric']) for r in compare(baseline, current)}
+        # c is 90% slower but under MIN_REGRESSION_MS; e has no baseline
+        self.assertEqual(found, {('a', 'queries'), ('b', 'median_ms')})
+
+
+class SyntheticFlushTests(TransactionTestCase):
+    """Each delete commits on its own here, as it does when the command runs"""
+    def test_generate_command_flushes_the_previous_run(self):
+        call_command('generate_synthetic_data', '--rows', '200', stdout=StringIO())
+        call_command('generate_synthetic_data', '--rows', '200', '--seed', '3', '--flush', stdout=StringIO())
+        self.assertEqual(Payment.objects.count(), 200)
+        self.assertEqual((find_drift(), find_cost_drift()), ([], []))
+
+
+@override_settings(SLOW_QUERY_MS=-1)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # The override is still on while the class's transaction rolls back; leave nothing for later flushes
+        slowqueries.reset()
+
+    def setUp(self):
+        slowqueries.reset()
+        self.addCleanup(slowqueries.reset)
+        self.user = User.objects.create_user(username='client', password='pass12345')
+        Payment.objects.create(user=self.user, type='received', category='client_payment', amount=Decimal('500'),
+                               date=date(2025, 1, 5), status='completed')
+
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        a = slowqueries.normalize('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\' LIMIT 21')
+        b = slowqueries.normalize('SELECT *\n FROM "t" WHERE "id" IN (%s, %s) AND "name" = \'it\'\'s\' LIMIT 5')
+        self.assertEqual(a, 'SELECT * FROM "t" WHERE "id" IN (...) AND "name" = ? LIMIT ?')
+        self.assertEqual(a, b)
+        self.assertEqual(slowqueries.normalize('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s)'),
+                         'INSERT INTO "t" ("a", "b") VALUES (...)')
+        # Identifiers with digits are kept
+        self.assertEqual(slowqueries.normalize('SELECT U0."id" FROM "base_t" U0'), 'SELECT U0."id" FROM "base_t" U0')
+
+    def test_logs_outside_requests_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for amount in (100, 200, 300):
+                Payment.objects.filter(user=self.user, amount__gte=amount).count()
+        row = SlowQuery.objects.get(statement__contains='COUNT(*)', statement__icontains='base_payment')
+        self.assertEqual(row.calls, 3)
+        self.assertEqual(row.view, '')
+        self.assertRegex(row.location, r'^base/tests\.py:\d+ in test_logs_outside_requests_once_committed$')
+        self.assertFalse(SlowQuery.objects.filter(statement__startswith='SAVEPOINT').exists())
+        self.assertIn('base_payment', row.plan)
+        self.assertIn("Decimal('", row.sample_params)
+
+    def test_request_queries_name_the_view_and_line(self):
+        self.client.login(username='client', password='pass12345')
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        rows = SlowQuery.objects.filter(view='base.views.dashboard')
+        self.assertTrue(rows.exists())
+        self.assertTrue(all(row.location and row.plan for row in rows.filter(statement__startswith='SELECT')))
+        # Recording never adds to the request's own queries
+        self.assertFalse(SlowQuery.objects.filter(statement__contains='base_slowquery').exists())
+
+    def test_counts_add_up_across_flushes(self):
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                list(Payment.objects.filter(user=self.user, status='completed'))
+        row = SlowQuery.objects.get(statement__contains='"base_payment"."status" = ?')
+        self.assertEqual(row.calls, 2)
+        self.assertGreaterEqual(row.total_ms, row.max_ms)
+
+    def test_entries_a_flush_could_not_write_are_kept(self):
+        Payment.objects.filter(user=self.user).count()
+        with mock.patch.object(SlowQuery.objects, 'get_or_create', side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('base.slowqueries', level='WARNING'):
+                self.assertEqual(slowqueries.flush(), 0)
+        Payment.objects.filter(user=self.user).count()
+        self.assertGreater(slowqueries.flush(), 0)
+        row = SlowQuery.objects.get(statement__contains='COUNT(*)', statement__icontains='base_payment')
+        self.assertEqual(row.calls, 2)
+
+    def test_admin_lists_slow_queries(self):
+        admin_user = User.objects.create_superuser(username='admin', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.filter(user=self.user).count()
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:base_slowquery_changelist'))
+        self.assertContains(response, 'base_payment')
+        row = SlowQuery.objects.first()
+        response = self.client.get(reverse('admin:base_slowquery_change', args=[row.pk]))
+        self.assertContains(response, '<pre>')
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(self.admin)
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.project = Project.objects.create(user=self.owner, name='House', client_name='A', budget=10000)
+        self.worker = Worker.objects.create(user=self.admin, name='Juma', role='mason', daily_rate=800)
+
+    def payments(self, n, **fields):
+        for i in range(n):
+            Payment.objects.create(**{
+                'user': self.owner, 'project': self.project, 'type': 'paid', 'category': 'materials',
+                'amount': Decimal('100'), 'date': date(2024 + i % 2, 1 + i % 12, 1 + i % 28), **fields})
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:base_{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.payments(3)
+        # The hierarchy costs a query per period listed, so both runs span the same years
+        for i in range(3):
+            start = timezone.make_aware(datetime(2023 + i, 3, 3, 8))
+            TimeLog.objects.create(worker=self.worker, project=self.project, date=start.date(), clock_in_time=start,
+                                   clock_out_time=start + timedelta(hours=8))
+        JobApplication.objects.create(worker=self.worker, project=self.project)
+        before = {name: self.changelist_queries(name) for name in ('payment', 'timelog', 'jobapplication')}
+
+        self.payments(20)
+        other = User.objects.create_user(username='otto', password='pass12345', is_staff=True)
+        other_worker = Worker.objects.create(user=other, name='Otto', role='mason')
+        for i in range(20):
+            start = timezone.make_aware(datetime(2025, 4, 1, 8)) + timedelta(days=i)
+            TimeLog.objects.create(worker=other_worker, project=self.project, date=start.date(), clock_in_time=start,
+                                   clock_out_time=start + timedelta(hours=8))
+            project = Project.objects.create(user=self.owner, name=f'P{i}', budget=1)
+            JobApplication.objects.create(worker=other_worker, project=project)
+        after = {name: self.changelist_queries(name) for name in ('payment', 'timelog', 'jobapplication')}
+        self.assertEqual(before, after)
+
+    def test_date_hierarchy_matches_the_database(self):
+        self.payments(30)
+        Payment.objects.create(user=self.owner, type='paid', category='other', amount=1, date=None)
+        JobApplication.objects.create(worker=self.worker, project=self.project)
+        admin_site = django_admin.site
+        for model, field, kind in ((Payment, 'date', 'year'), (Payment, 'date', 'month'), (Payment, 'date', 'day')):
+            queryset = admin_site._registry[model].get_queryset(None).filter(date__year=2024)
+            self.assertEqual(list(queryset.dates(field, kind)), list(Payment.objects.filter(date__year=2024)
+                                                                     .dates(field, kind)))
+        applications = admin_site._registry[JobApplication].get_queryset(None)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(list(applications.datetimes('applied_at', kind, 'DESC')),
+                             list(JobApplication.objects.datetimes('applied_at', kind, 'DESC')))
+
+        payments = admin_site._registry[Payment].get_queryset(None)
+        self.assertEqual(payments.aggregate(first=Min('date'), last=Max('date')),
+                         Payment.objects.aggregate(first=Min('date'), last=Max('date')))
+
+        response = self.client.get(reverse('admin:base_payment_changelist'), {'date__year': 2024})
+        self.assertContains(response, '?date__month=1&amp;date__year=2024')
+
+    def test_payment_search_is_exact_reference(self):
+        self.payments(2)
+        Payment.objects.filter(pk=Payment.objects.first().pk).update(reference='MP123')
+        url = reverse('admin:base_payment_changelist')
+        self.assertEqual(self.client.get(url, {'q': ' MP123 '}).context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(url, {'q': 'MP12'}).context['cl'].result_count, 0)
+
+    def test_unfiltered_count_is_estimated(self):
+        self.payments(3)
+        queryset = Payment.objects.order_by('id')
+        with mock.patch('base.pagination.estimated_count', return_value=2_000_000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 50).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(queryset.filter(status='completed'), 50).count, 3)
+        with mock.patch('base.pagination.estimated_count', return_value=40):
+            self.assertEqual(EstimatedCountPaginator(queryset, 50).count, 3)
+
+    def test_payment_status_action_keeps_rollups_and_costs(self):
+        self.payments(5)
+        pks = list(Payment.objects.values_list('pk', flat=True)[:3])
+        response = self.client.post(reverse('admin:base_payment_changelist'),
+                                    {'action': 'mark_cancelled', '_selected_action': pks})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Payment.objects.filter(status='cancelled').count(), 3)
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(find_cost_drift(), [])
+        self.assertEqual(project_financials([self.project])[self.project.pk].materials, Decimal('200'))
+
+    def test_application_actions_book_and_release(self):
+        self.project.start_date, self.project.end_date = date(2025, 5, 1), date(2025, 5, 31)
+        self.project.save()
+        application = JobApplication.objects.create(worker=self.worker, project=self.project)
+        url = reverse('admin:base_jobapplication_changelist')
+        self.client.post(url, {'action': 'accept', '_selected_action': [application.pk]})
+        self.assertTrue(WorkerBooking.objects.filter(application=application).exists())
+        self.client.post(url, {'action': 'reject', '_selected_action': [application.pk]})
+        application.refresh_from_db()
+        self.assertEqual(application.status, 'rejected')
+        self.assertFalse(WorkerBooking.objects.filter(application=application).exists())
@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .financials import record_time_logs
+from .models import ClockEvent, Project, TimeLog, Worker
+
+
+# A whole crew's day (50 workers x a few taps each) fits comfortably
+MAX_BATCH_EVENTS = 2000
+# Device clocks drift; anything further in the future than this is refused
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MAX_KEY_LENGTH = ClockEvent._meta.get_field('key').max_length
+# Same-instant events apply clock-out first, so out/in at shift change works
+KIND_ORDER = {'out': 0, 'in': 1}
+
+
+class EventError(ValueError):
+    pass
+
+
+@dataclass
+class SyncResult:
+    applied: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    results: list = field(default_factory=list)
+
+    def add(self, key, status, message='', time_log_id=None):
+        if status == 'applied':
+            self.applied += 1
+        elif status == 'duplicate':
+            self.duplicates += 1
+        else:
+            self.rejected += 1
+        self.results.append({'key': key, 'status': status, 'message': message, 'time_log_id': time_log_id})
+
+    def as_dict(self):
+        return {'applied': self.applied, 'duplicates': self.duplicates,
+                'rejected': self.rejected, 'results': self.results}
+
+
+# ==================== PARSING ====================
+def parse_timestamp(value, now):
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        try:
+            timestamp = parse_datetime(str(value or '').strip())
+        except ValueError:
+            timestamp = None
+    if timestamp is None:
+        raise EventError(f"invalid timestamp '{value}'")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    if timestamp > now + MAX_CLOCK_SKEW:
+        raise EventError('timestamp is in the future')
+    return timestamp
+
+
+def parse_event(raw, now):
+    """Validate one queued device event into {key, worker_id, kind, timestamp, project_id, notes}"""
+    if not isinstance(raw, dict):
+        raise EventError('event must be an object')
+    key = str(raw.get('key') or '').strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise EventError(f'key is required (at most {MAX_KEY_LENGTH} characters)')
+    kind = str(raw.get('kind') or '').strip().lower()
+    if kind not in dict(ClockEvent.KIND_CHOICES):
+        raise EventError(f"invalid kind '{kind}'")
+    try:
+        worker_id = int(raw.get('worker_id'))
+        project_id = int(raw['project_id']) if raw.get('project_id') else None
+    except (TypeError, ValueError):
+        raise EventError('worker_id and project_id must be integers')
+    return {
+        'key': key,
+        'worker_id': worker_id,
+        'kind': kind,
+        'timestamp': parse_timestamp(raw.get('timestamp'), now),
+        'project_id': project_id,
+        'notes': str(raw.get('notes') or '').strip(),
+    }
+
+
+def hours_between(start, end):
+    return round(Decimal((end - start).total_seconds()) / 3600, 2)
+
+
+# ==================== APPLY ====================
+def apply_clock_events(raw_events, user, now=None):
+    """
+    Apply a batch of queued clock-in/out events, sent by user, in one
+    transaction.
+
+    A user records their own worker profile's shifts, and any worker's
+    shifts on the user's own projects; other events are rejected. Events
+    are replayed per worker in device-timestamp order against the
+    worker's open shift. Shifts are written with one bulk_create (new) and
+    one bulk_update (closed), with hours_worked computed as they close.
+    Every event the user may send is recorded under its key, so a retried
+    upload reports duplicates instead of applying anything twice.
+
+    An IntegrityError propagates if a live clock-in raced the batch; the
+    transaction rolls back and the whole upload can simply be retried.
+    """
+    now = now or timezone.now()
+    result = SyncResult()
+    outcomes = {}
+    events = []
+    seen = set()
+    for index, raw in enumerate(raw_events):
+        key = raw.get('key') if isinstance(raw, dict) else None
+        try:
+            event = parse_event(raw, now)
+        except EventError as e:
+            outcomes[index] = (key, 'rejected', str(e), None)
+            continue
+        if event['key'] in seen:
+            outcomes[index] = (event['key'], 'duplicate', 'repeated in this batch', None)
+            continue
+        seen.add(event['key'])
+        event['index'] = index
+        events.append(event)
+
+    with transaction.atomic():
+        stored = {
+            e['key']: e for e in ClockEvent.objects.filter(key__in=seen).values('key', 'result', 'time_log_id')
+        }
+        workers = Worker.objects.filter(id__in={e['worker_id'] for e in events}).values_list(
+            'id', 'daily_rate', 'user_id')
+        # Shifts closed here keep the rate they were worked at
+        rates = {worker_id: rate for worker_id, rate, _ in workers}
+        own_workers = {worker_id for worker_id, _, user_id in workers if user_id == user.pk}
+        project_owners = dict(Project.objects.filter(
+            id__in={e['project_id'] for e in events if e['project_id']}).values_list('id', 'user_id'))
+        open_logs = {
+            log.worker_id: log for log in TimeLog.objects.select_for_update().filter(
+                worker_id__in=rates, clock_out_time__isnull=True
+            ).only('id', 'worker_id', 'project_id', 'date', 'clock_in_time', 'notes')
+        }
+        managed = {project_id for project_id, owner_id in project_owners.items() if owner_id == user.pk}
+        managed.update(Project.objects.filter(
+            user=user, id__in={log.project_id for log in open_logs.values() if log.project_id}
+        ).values_list('id', flat=True))
+
+        new_logs, closed_logs, records = [], [], []
+        events.sort(key=lambda e: (e['worker_id'], e['timestamp'], KIND_ORDER[e['kind']]))
+        for event in events:
+            index, key = event['index'], event['key']
+            if key in stored:
+                outcomes[index] = (key, 'duplicate', f"already {stored[key]['result']}", stored[key]['time_log_id'])
+                continue
+            if event['worker_id'] not in rates:
+                outcomes[index] = (key, 'rejected', 'unknown worker', None)
+                continue
+            if event['project_id'] and event['project_id'] not in project_owners:
+                outcomes[index] = (key, 'rejected', 'unknown project', None)
+                continue
+            if event['worker_id'] not in own_workers and _shift_project(event, open_logs) not in managed:
+                outcomes[index] = (key, 'rejected', 'not your worker or project', None)
+                continue
+
+            log, message = _replay(event, open_logs, new_logs, closed_logs)
+            records.append((index, log, message, ClockEvent(
+                key=key, worker_id=event['worker_id'], kind=event['kind'], timestamp=event['timestamp'],
+                result='rejected' if message else 'applied', message=message,
+            )))
+
+        for log in closed_logs + new_logs:
+            if log.clock_out_time:
+                log.daily_rate = rates[log.worker_id]
+        # auto_now fields aren't touched by bulk_update
+        for log in closed_logs:
+            log.updated_at = now
+        TimeLog.objects.bulk_update(closed_logs, ['clock_out_time', 'hours_worked', 'daily_rate', 'notes',
+                                                  'updated_at'], batch_size=500)
+        TimeLog.objects.bulk_create(new_logs, batch_size=500)
+        for index, log, message, record in records:
+            record.time_log = log
+            outcomes[index] = (record.key, record.result, message, log.pk if log else None)
+        ClockEvent.objects.bulk_create([record for _, _, _, record in records], batch_size=500)
+        # bulk writes skip the signals that accrue project wages
+        record_time_logs(closed_logs + [log for log in new_logs if log.clock_out_time])
+
+    for index in sorted(outcomes):
+        result.add(*outcomes[index])
+    return result
+
+
+def _shift_project(event, open_logs):
+    """The project a clock in opens a shift on, or the open shift a clock out closes is on"""
+    if event['kind'] == 'in':
+        return event['project_id']
+    log = open_logs.get(event['worker_id'])
+    return log.project_id if log else None
+
+
+def _replay(event, open_logs, new_logs, closed_logs):
+    """Apply one event to the worker's open shift; returns (time_log, rejection message)"""
+    worker_id, timestamp = event['worker_id'], event['timestamp']
+    log = open_logs.get(worker_id)
+    if event['kind'] == 'in':
+        if log is not None:
+            return log, 'already clocked in'
+        log = TimeLog(worker_id=worker_id, project_id=event['project_id'], clock_in_time=timestamp,
+                      date=timezone.localdate(timestamp), notes=event['notes'] or None)
+        open_logs[worker_id] = log
+        new_logs.append(log)
+        return log, ''
+
+    if log is None:
+        return None, 'no open shift to clock out of'
+    if timestamp < log.clock_in_time:
+        return log, 'clock out is before clock in'
+    log.clock_out_time = timestamp
+    log.hours_worked = hours_between(log.clock_in_time, timestamp)
+    if event['notes']:
+        log.notes = event['notes']
+    del open_logs[worker_id]
+    if log.pk is not None:
+        closed_logs.append(log)
+    return log, ''
@@ -11,15 +11,32 @@ urlpatterns = [
     # Main App
     path('dashboard/', views.dashboard, name='dashboard'),
     path('projects/', views.projects, name='projects'),
+    path('projects/<int:id>/', views.project_detail, name='project_detail'),
+    path('projects/<int:id>/matches/', views.project_matches, name='project_matches'),
     path('projects/delete/<int:id>/', views.delete_project, name='delete_project'),
     path('workers/', views.workers, name='workers'),
+    path('workers/search/', views.worker_search, name='worker_search'),
+    path('workers/available/', views.available_workers, name='available_workers'),
+    path('workers/<int:id>/conflicts/', views.worker_conflicts, name='worker_conflicts'),
     path('workers/delete/<int:id>/', views.delete_worker, name='delete_worker'),
     path('payments/', views.payments, name='payments'),
     path('payments/delete/<int:id>/', views.delete_payment, name='delete_payment'),
+    path('payments/import/', views.import_payments, name='import_payments'),
+    path('payments/export/', views.export_payments, name='export_payments'),
+    path('payroll/run/', views.run_payroll, name='run_payroll'),
     path('schedule/', views.schedule, name='schedule'),
     path('schedule/delete/<int:id>/', views.delete_task, name='delete_task'),
     path('schedule/complete/<int:id>/', views.complete_task, name='complete_task'),
+    path('schedule/calendar/', views.calendar_range, name='calendar_range'),
+    path('schedule/calendar.ics', views.calendar_feed, name='calendar_feed'),
+    path('schedule/calendar.ics/reset/', views.reset_calendar_feed, name='reset_calendar_feed'),
+    path('schedule/recurring/<int:id>/complete/<str:day>/', views.complete_occurrence, name='complete_occurrence'),
+    path('search/', views.search, name='search'),
     path('support/', views.support, name='support'),
+
+    # Read-only JSON API
+    path('api/v1/<str:resource>/', views.api_list, name='api_list'),
+    path('api/v1/<str:resource>/<int:id>/', views.api_detail, name='api_detail'),
     
     # Staff Portal
     path('staff/login/', views.staff_login, name='staff_login'),
@@ -31,10 +48,14 @@ urlpatterns = [
     path('staff/schedule/', views.staff_schedule, name='staff_schedule'),
     path('staff/invoices/', views.staff_invoices, name='staff_invoices'),
     path('staff/payments/', views.staff_payments, name='staff_payments'),
+    path('staff/reports/cash-flow/', views.cash_flow, name='cash_flow'),
+    path('staff/metrics/', views.metrics, name='metrics'),
     
     # Job Applications & Time Tracking
     path('apply-job/<int:project_id>/', views.apply_for_job, name='apply_for_job'),
     path('respond-application/<int:app_id>/', views.respond_to_application, name='respond_to_application'),
+    path('staff/bookings/', views.staff_bookings, name='staff_bookings'),
     path('clock-in/', views.clock_in, name='clock_in'),
     path('clock-out/', views.clock_out, name='clock_out'),
+    path('clock-sync/', views.clock_sync, name='clock_sync'),
 ]
\ No newline at end of file
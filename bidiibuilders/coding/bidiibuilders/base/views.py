@@ -2,12 +2,61 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
 from django.contrib import messages
-from django.db.models import Sum
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from django.views.decorators.http import require_http_methods
+import csv
+import json
 from datetime import datetime, timedelta
-from .models import Project, Worker, Payment, Task, Skill, JobApplication, TimeLog
+from decimal import Decimal, InvalidOperation
+from .models import (Project, Worker, Payment, PaymentRollup, Task, Skill, JobApplication, TimeLog, MatchScore,
+                     WorkerBooking, RecurringTask)
+from . import api
+from .availability import (BookingConflict, book_application, book_worker, conflicts as booking_conflicts,
+                           free_workers, release_application)
+from .cache import JOBS_SCOPE, WORKERS_SCOPE, cached, make_key, user_scope
+from .calendar import (calendar_events, feed_token, feed_user, feed_validators, ics_chunks, reset_feed_token,
+                       store_occurrence)
+from .filters import filter_payments
+from .financials import burn_down, project_financials, record_time_logs
+from .jobqueue import enqueue
+from .jobs import email_cash_flow_report, notify_application, reconcile_ledger
+from .ledger import rollup_totals, user_totals
+from .ledger_io import FORMATS as IMPORT_FORMATS, export_rows, import_payments as import_statement
+from .matching import is_large as is_large_project, proposed_workers, ranked_applicants
+from .metrics import prometheus_text
+from .pagination import InvalidCursor, KeysetPaginator, page_links, paginate_request
+from .payroll import run_payroll as compute_payroll
+from .querybudget import query_budget
+from .replicas import replica_reads
+from .reports import GROUPS as REPORT_GROUPS, PERIODS as REPORT_PERIODS, cash_flow_report
+from .search import search as search_entities
+from .skills import normalize_skills, search_workers
+from .stats import get_dashboard_stats
+from .timeclock import MAX_BATCH_EVENTS, apply_clock_events
+
+
+PAYMENT_PAGE_SIZE = 50
+PAYMENT_LEDGER_ORDERING = ('-date', '-created_at', 'id')
+# Payments recorded within this window share one reconciliation job
+LEDGER_RECONCILE_DELAY = timedelta(minutes=5)
+
+STAFF_PAGE_SIZE = 20
+# Worker cards per page of the client directory
+WORKERS_PAGE_SIZE = 24
+# Columns the staff job and worker cards actually render
+JOB_CARD_FIELDS = ('name', 'location', 'budget', 'start_date', 'progress', 'description', 'status', 'created_at',
+                   'user__username', 'user__first_name', 'user__last_name')
+WORKER_CARD_FIELDS = ('name', 'role', 'phone', 'daily_rate', 'rating', 'status')
 
 
 def home(request):
@@ -61,42 +110,20 @@ def logout_view(request):
 
 
 @login_required(login_url='login_view')
+@query_budget(7)
 def dashboard(request):
-    user_projects = Project.objects.filter(user=request.user).order_by('-created_at')
-    user_workers = Worker.objects.filter(user=request.user)
-    user_payments = Payment.objects.filter(user=request.user).order_by('-date')
-    user_tasks = Task.objects.filter(user=request.user).order_by('date')
-    
     today = datetime.now().date()
-    this_week_start = today - timedelta(days=today.weekday())
-    this_week_end = this_week_start + timedelta(days=6)
+    stats = cached(
+        'dashboard_stats', lambda: get_dashboard_stats(request.user, today=today),
+        request.user.id, today.isoformat(), scopes=[user_scope(request.user.id)],
+    )
 
-    context = {
-        'projects': user_projects,
-        'projects_count': user_projects.count(),
-        'completed_projects': user_projects.filter(status='completed').count(),
-        'active_projects': user_projects.filter(status='active').count(),
-        'pending_projects': user_projects.filter(status='planning').count(),
-        'total_budget': user_projects.aggregate(Sum('budget'))['budget__sum'] or 0,
-        'recent_projects': user_projects[:3],
-
-        'workers': user_workers,
-        'total_workers': user_workers.count(),
-        'available_workers': user_workers.filter(status='available').count(),
-        'on_project_workers': user_workers.filter(status='busy').count(),
-
-        'payments': user_payments,
-        'monthly_payments': user_payments.filter(
-            date__year=today.year, date__month=today.month
-        ).aggregate(Sum('amount'))['amount__sum'] or 0,
-        'received_payments': user_payments.filter(type='received').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'pending_payments': user_payments.filter(status='pending').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'recent_payments': user_payments[:4],
-
-        'tasks': user_tasks,
-        'tasks_this_week': user_tasks.filter(date__gte=this_week_start, date__lte=this_week_end).count(),
-        'upcoming_tasks': user_tasks.filter(date__gte=today, completed=False)[:3],
-    }
+    context = stats.as_context()
+    context.update({
+        'recent_projects': Project.objects.filter(user=request.user).order_by('-created_at')[:3],
+        'recent_payments': Payment.objects.filter(user=request.user).order_by('-date', '-created_at')[:4],
+        'upcoming_tasks': Task.objects.filter(user=request.user, date__gte=today, completed=False).order_by('date', 'time')[:3],
+    })
     return render(request, 'base/dashboard.html', context)
 
 
@@ -114,25 +141,69 @@ def projects(request):
             status=request.POST['status'],
             start_date=request.POST['start_date'],
             end_date=request.POST['end_date'],
-            progress=request.POST.get('progress', 0)
+            progress=request.POST.get('progress', 0),
+            required_skills=sorted(normalize_skills(request.POST.get('required_skills', '').split(','))),
+            crew_size=max(int(request.POST.get('crew_size') or 1), 1),
         )
         messages.success(request, 'Project created successfully!')
         return redirect('projects')
     
-    user_projects = Project.objects.filter(user=request.user).order_by('-created_at')
-    user_applications = JobApplication.objects.filter(project__user=request.user).order_by('-applied_at')
+    user_projects = list(Project.objects.filter(user=request.user).order_by('-created_at'))
+    # Best-matching applicants first; ones not scored yet go last until the refresh job runs
+    user_applications = JobApplication.objects.filter(project__user=request.user).annotate(
+        match_score=Subquery(MatchScore.objects.filter(
+            project=OuterRef('project'), worker=OuterRef('worker')).values('score')[:1]),
+    ).order_by(F('match_score').desc(nulls_last=True), '-applied_at')
+    # Budget vs. actual comes from the ProjectCost rollup, not the ledgers
+    financials = project_financials(user_projects)
+    for project in user_projects:
+        project.financials = financials[project.pk]
     
     context = {
         'projects': user_projects,
         'applications': user_applications,
-        'total_projects': user_projects.count(),
-        'active_projects': user_projects.filter(status='active').count(),
-        'planning_projects': user_projects.filter(status='planning').count(),
-        'completed_projects': user_projects.filter(status='completed').count(),
+        'total_projects': len(user_projects),
+        'active_projects': sum(1 for project in user_projects if project.status == 'active'),
+        'planning_projects': sum(1 for project in user_projects if project.status == 'planning'),
+        'completed_projects': sum(1 for project in user_projects if project.status == 'completed'),
     }
     return render(request, 'base/projects.html', context)
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def project_detail(request, id):
+    """Budget vs. actual and the burn-down of one project, as JSON"""
+    project = get_object_or_404(Project, id=id, user=request.user)
+    financials = project_financials([project])[project.pk]
+    return JsonResponse({
+        'status': 'success',
+        'project': {
+            'id': project.id, 'name': project.name, 'status': project.status, 'progress': project.progress,
+            'start_date': project.start_date, 'end_date': project.end_date,
+        },
+        'financials': financials.as_dict(),
+        'burn_down': burn_down(project, timezone.localdate()),
+    })
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def project_matches(request, id):
+    """Applicants ranked by match score, plus proposed workers for large projects (or ?propose=1)"""
+    project = get_object_or_404(Project, id=id, user=request.user)
+    proposed = None
+    if is_large_project(project) or request.GET.get('propose') == '1':
+        proposed = proposed_workers(project)
+    return JsonResponse({
+        'status': 'success',
+        'project': {'id': project.id, 'name': project.name, 'crew_size': project.crew_size,
+                    'required_skills': project.required_skills},
+        'applicants': ranked_applicants(project),
+        'proposed': proposed,
+    })
+
+
 @login_required(login_url='login_view')
 def delete_project(request, id):
     project = get_object_or_404(Project, id=id, user=request.user)
@@ -143,7 +214,7 @@ def delete_project(request, id):
 
 @login_required(login_url='login_view')
 def workers(request):
-    all_workers = Worker.objects.all().order_by('-rating', 'name')
+    all_workers = Worker.objects.all()
     
     trade_filter = request.GET.get('trade', '')
     status_filter = request.GET.get('status', '')
@@ -154,16 +225,124 @@ def workers(request):
     if status_filter:
         all_workers = all_workers.filter(status=status_filter)
     
+    # The directory is the same for every client, so it is cached globally, a page at a time
+    cursor = request.GET.get('workers', '')
+    page = cached('worker_page', lambda: paginate_request(
+        request, all_workers, ('-rating', 'name', 'id'), page_size=WORKERS_PAGE_SIZE, param='workers',
+    )[0], trade_filter, status_filter, cursor, scopes=[WORKERS_SCOPE])
     context = {
-        'workers': all_workers,
-        'total_workers': Worker.objects.count(),
-        'available_workers': Worker.objects.filter(status='available').count(),
-        'on_project_workers': Worker.objects.filter(status='busy').count(),
+        'workers': page.items,
+        'workers_links': page_links(request, page, param='workers'),
+        'worker_cards_key': make_key('worker_cards', trade_filter, status_filter, cursor, scopes=[WORKERS_SCOPE]),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
+    context.update(cached('worker_counts', lambda: Worker.objects.aggregate(
+        total_workers=Count('id'),
+        available_workers=Count('id', filter=Q(status='available')),
+        on_project_workers=Count('id', filter=Q(status='busy')),
+    ), scopes=[WORKERS_SCOPE]))
     
     return render(request, 'base/workers.html', context)
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def worker_search(request):
+    """Ranked worker search by skills, trade, rating, experience and rate"""
+    skills = [skill for value in request.GET.getlist('skill') for skill in value.split(',')]
+    try:
+        results = search_workers(
+            skills=skills,
+            match=request.GET.get('match', 'any'),
+            trade=request.GET.get('trade') or None,
+            status=request.GET.get('status') or None,
+            min_rating=_decimal_param(request, 'min_rating'),
+            min_experience=_decimal_param(request, 'min_experience'),
+            min_rate=_decimal_param(request, 'min_rate'),
+            max_rate=_decimal_param(request, 'max_rate'),
+            limit=max(1, min(int(request.GET.get('limit', 20)), 100)),
+        )
+    except (InvalidOperation, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': f'Invalid search parameter: {e}'}, status=400)
+
+    for worker in results:
+        worker['daily_rate'] = float(worker['daily_rate'])
+        worker['rating'] = float(worker['rating'])
+    return JsonResponse({'status': 'success', 'count': len(results), 'results': results})
+
+
+def _decimal_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise InvalidOperation(name)
+
+
+def _date_param(params, name):
+    try:
+        return datetime.strptime(params.get(name, ''), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+
+
+def _recurrence_params(params):
+    """(interval, start, until) of a recurring task form; ValueError says what is wrong"""
+    try:
+        interval = int(params.get('interval') or 1)
+    except ValueError:
+        interval = 0
+    # The column is a PositiveSmallIntegerField
+    if not 1 <= interval <= 32767:
+        raise ValueError('interval must be a whole number of at least 1')
+    start = _date_param(params, 'date')
+    until = _date_param(params, 'until') if params.get('until') else None
+    if until is not None and until < start:
+        raise ValueError('until must not be before the start date')
+    return interval, start, until
+
+
+def _booking_json(booking):
+    return {'id': booking.id, 'worker_id': booking.worker_id, 'kind': booking.kind, 'project_id': booking.project_id,
+            'start_date': booking.start_date.isoformat(), 'end_date': booking.end_date.isoformat(),
+            'note': booking.note}
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def available_workers(request):
+    """Workers (of a trade) with no booking between start and end, best rated first"""
+    try:
+        start, end = _date_param(request.GET, 'start'), _date_param(request.GET, 'end')
+        limit = max(1, min(int(request.GET.get('limit', 50)), 500))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if end < start:
+        return JsonResponse({'status': 'error', 'message': 'end is before start'}, status=400)
+
+    results = [
+        {**card, 'daily_rate': float(card['daily_rate']), 'rating': float(card['rating'])}
+        for card in free_workers(start, end, trade=request.GET.get('trade') or None, limit=limit)
+    ]
+    return JsonResponse({'status': 'success', 'count': len(results), 'results': results})
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def worker_conflicts(request, id):
+    """The worker's bookings that a booking from start to end would clash with"""
+    try:
+        start, end = _date_param(request.GET, 'start'), _date_param(request.GET, 'end')
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    ids = booking_conflicts(id, start, end)
+    clashes = WorkerBooking.objects.filter(id__in=ids).order_by('start_date') if ids else []
+    return JsonResponse({'status': 'success', 'available': not ids,
+                         'conflicts': [_booking_json(booking) for booking in clashes]})
+
+
 @login_required(login_url='login_view')
 def delete_worker(request, id):
     worker = get_object_or_404(Worker, id=id, user=request.user)
@@ -173,34 +352,92 @@ def delete_worker(request, id):
 
 
 @login_required(login_url='login_view')
+@query_budget(11)
 def payments(request):
     if request.method == 'POST':
-        Payment.objects.create(
-            user=request.user,
-            type=request.POST['type'],
-            category=request.POST['category'],
-            amount=request.POST['amount'],
-            description=request.POST['description'],
-            date=request.POST['date'],
-            status=request.POST.get('status', 'completed'),
-            payment_method=request.POST.get('payment_method', 'mpesa')
-        )
+        project_id = request.POST.get('project') or None
+        if project_id and not Project.objects.filter(id=project_id, user=request.user).exists():
+            messages.error(request, 'Unknown project.')
+            return redirect('payments')
+        with transaction.atomic():
+            Payment.objects.create(
+                user=request.user,
+                project_id=project_id,
+                type=request.POST['type'],
+                category=request.POST['category'],
+                amount=request.POST['amount'],
+                description=request.POST['description'],
+                date=request.POST['date'],
+                status=request.POST.get('status', 'completed'),
+                payment_method=request.POST.get('payment_method', 'mpesa')
+            )
+            # The rollups were updated inline; double-check them off the request path
+            enqueue(reconcile_ledger, {'user_id': request.user.pk}, delay=LEDGER_RECONCILE_DELAY,
+                    unique_key=str(request.user.pk))
         messages.success(request, 'Payment recorded successfully!')
         return redirect('payments')
     
-    user_payments = Payment.objects.filter(user=request.user).order_by('-date')
     today = datetime.now().date()
-    
+    user_payments, filters = filter_payments(Payment.objects.filter(user=request.user), request.GET)
+    page, links = paginate_request(request, user_payments, PAYMENT_LEDGER_ORDERING, page_size=PAYMENT_PAGE_SIZE)
+
     context = {
-        'payments': user_payments,
-        'total_received': user_payments.filter(type='received').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'total_pending': user_payments.filter(status='pending').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'total_paid': user_payments.filter(type='paid').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'monthly_total': user_payments.filter(date__year=today.year, date__month=today.month).aggregate(Sum('amount'))['amount__sum'] or 0,
+        'payments': page.items,
+        'filters': filters,
+        'has_next': page.has_next,
+        'payment_types': Payment.PAYMENT_TYPE_CHOICES,
+        'payment_categories': Payment.CATEGORY_CHOICES,
+        'payment_statuses': Payment.STATUS_CHOICES,
+        'payment_methods': Payment.PAYMENT_METHOD_CHOICES,
+        'user_projects': Project.objects.filter(user=request.user).order_by('-created_at').values('id', 'name'),
     }
+    context.update(links)
+    context.update(user_totals(request.user, today))
     return render(request, 'base/payment.html', context)
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["POST"])
+def import_payments(request):
+    """Bulk-import a CSV ledger or M-Pesa statement"""
+    upload = request.FILES.get('file')
+    fmt = request.POST.get('format', 'ledger')
+    wants_json = request.GET.get('format') == 'json'
+    if upload is None or fmt not in IMPORT_FORMATS:
+        message = 'Choose a CSV file and a valid statement format.'
+        if wants_json:
+            return JsonResponse({'status': 'error', 'message': message}, status=400)
+        messages.error(request, message)
+        return redirect('payments')
+
+    try:
+        result = import_statement(request.user, upload.file, fmt=fmt)
+    except (UnicodeDecodeError, csv.Error) as e:
+        if wants_json:
+            return JsonResponse({'status': 'error', 'message': f'Unreadable CSV: {e}'}, status=400)
+        messages.error(request, f'Unreadable CSV: {e}')
+        return redirect('payments')
+
+    if wants_json:
+        return JsonResponse({'status': 'success', **result.as_dict()})
+    messages.success(request, f'Imported {result.created} payments '
+                              f'({result.duplicates} duplicates skipped, {result.error_count} rows with errors).')
+    for error in result.errors[:5]:
+        messages.error(request, f"Line {error['line']}: {error['message']}")
+    return redirect('payments')
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def export_payments(request):
+    """Stream the user's (filtered) ledger as CSV"""
+    user_payments, _ = filter_payments(Payment.objects.filter(user=request.user), request.GET)
+    user_payments = user_payments.order_by(*PAYMENT_LEDGER_ORDERING)
+    response = StreamingHttpResponse(export_rows(user_payments), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="payments-{datetime.now():%Y%m%d}.csv"'
+    return response
+
+
 @login_required(login_url='login_view')
 def delete_payment(request, id):
     payment = get_object_or_404(Payment, id=id, user=request.user)
@@ -209,6 +446,20 @@ def delete_payment(request, id):
     return redirect('payments')
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["POST"])
+def run_payroll(request):
+    """Compute a pay period's wages for the user's projects and post them as pending payments"""
+    try:
+        period_start = datetime.strptime(request.POST.get('period_start', ''), '%Y-%m-%d').date()
+        period_end = datetime.strptime(request.POST.get('period_end', ''), '%Y-%m-%d').date()
+        result = compute_payroll(request.user, period_start, period_end, full=request.POST.get('full') == '1')
+    except ValueError as e:
+        # PayrollError is a ValueError too
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', **result.as_dict()})
+
+
 @login_required(login_url='login_view')
 def schedule(request):
     if request.method == 'POST':
@@ -217,38 +468,117 @@ def schedule(request):
         if project_id:
             project = get_object_or_404(Project, id=project_id, user=request.user)
         
-        Task.objects.create(
-            user=request.user,
-            title=request.POST['title'],
-            type=request.POST['type'],
-            date=request.POST['date'],
-            time=request.POST['time'],
-            description=request.POST.get('description', ''),
-            project=project,
-            priority=request.POST.get('priority', 'medium'),
-            completed=False
-        )
-        messages.success(request, 'Task added successfully!')
+        fields = {
+            'user': request.user,
+            'title': request.POST['title'],
+            'type': request.POST['type'],
+            'time': request.POST['time'],
+            'description': request.POST.get('description', ''),
+            'project': project,
+            'priority': request.POST.get('priority', 'medium'),
+        }
+        repeat = request.POST.get('repeat', '')
+        if repeat in dict(RecurringTask.FREQUENCY_CHOICES):
+            try:
+                interval, start, until = _recurrence_params(request.POST)
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect('schedule')
+            # Stored once; the calendar expands the occurrences
+            RecurringTask.objects.create(frequency=repeat, interval=interval, start_date=start, until=until,
+                                         **fields)
+            messages.success(request, 'Recurring task added successfully!')
+        else:
+            Task.objects.create(date=request.POST['date'], completed=False, **fields)
+            messages.success(request, 'Task added successfully!')
         return redirect('schedule')
     
-    user_tasks = Task.objects.filter(user=request.user).order_by('date')
-    user_projects = Project.objects.filter(user=request.user)
-    
     today = datetime.now().date()
     this_week_start = today - timedelta(days=today.weekday())
     this_week_end = this_week_start + timedelta(days=6)
     
     context = {
-        'tasks': user_tasks,
-        'projects': user_projects,
-        'upcoming_count': user_tasks.filter(date__gte=today, completed=False).count(),
-        'this_week_count': user_tasks.filter(date__gte=this_week_start, date__lte=this_week_end, completed=False).count(),
-        'overdue_count': user_tasks.filter(date__lt=today, completed=False).count(),
-        'completed_count': user_tasks.filter(completed=True).count(),
+        'projects': Project.objects.filter(user=request.user),
+        'calendar_feed_url': request.build_absolute_uri(
+            f"{reverse('calendar_feed')}?token={feed_token(request.user)}"),
+        **Task.objects.filter(user=request.user).aggregate(
+            upcoming_count=Count('id', filter=Q(date__gte=today, completed=False)),
+            this_week_count=Count('id', filter=Q(date__gte=this_week_start, date__lte=this_week_end,
+                                                 completed=False)),
+            overdue_count=Count('id', filter=Q(date__lt=today, completed=False)),
+            completed_count=Count('id', filter=Q(completed=True)),
+        ),
     }
     return render(request, 'base/schedule.html', context)
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def calendar_range(request):
+    """Tasks and recurring-task occurrences between start and end, for a calendar's visible window"""
+    try:
+        events = calendar_events(request.user, _date_param(request.GET, 'start'), _date_param(request.GET, 'end'))
+    except ValueError as e:
+        # A bad date, or a CalendarError
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'count': len(events), 'events': events})
+
+
+@require_http_methods(["GET", "HEAD"])
+def calendar_feed(request):
+    """
+    The user's schedule as an iCalendar feed, streamed.
+
+    Calendar apps can't log in, so ?token= (see schedule page) also
+    identifies the user. Apps poll often: ETag/Last-Modified let them
+    revalidate for two aggregate queries.
+    """
+    token = request.GET.get('token')
+    if token:
+        user = feed_user(token)
+        if user is None:
+            return JsonResponse({'status': 'error', 'message': 'Invalid feed token'}, status=403)
+    elif request.user.is_authenticated:
+        user = request.user
+    else:
+        return redirect_to_login(request.get_full_path(), 'login_view')
+
+    parts, last_modified = feed_validators(user)
+    etag = api.make_etag('ics', user.pk, *parts)
+    not_modified = _conditional(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    response = StreamingHttpResponse(ics_chunks(user, request.get_host()), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Content-Disposition'] = 'inline; filename="schedule.ics"'
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["POST"])
+def reset_calendar_feed(request):
+    """Replace the calendar feed URL, so apps subscribed with the old one stop receiving the schedule"""
+    reset_feed_token(request.user)
+    messages.success(request, 'Calendar link reset. Subscribe again with the new link.')
+    return redirect('schedule')
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["POST"])
+def complete_occurrence(request, id, day):
+    """Mark one occurrence of a recurring task completed"""
+    rule = get_object_or_404(RecurringTask, id=id, user=request.user)
+    try:
+        task = store_occurrence(rule, datetime.strptime(day, '%Y-%m-%d').date(), completed=True)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'task_id': task.id})
+
+
 @login_required(login_url='login_view')
 def delete_task(request, id):
     task = get_object_or_404(Task, id=id, user=request.user)
@@ -266,6 +596,21 @@ def complete_task(request, id):
     return redirect('schedule')
 
 
+@login_required(login_url='login_view')
+@require_http_methods(["GET"])
+def search(request):
+    """Ranked full-text search over the user's projects, tasks and payments"""
+    query = request.GET.get('q', '').strip()
+    types = [t for value in request.GET.getlist('type') for t in value.split(',') if t]
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be a number'}, status=400)
+
+    results = search_entities(request.user, query, types=types, limit=limit)
+    return JsonResponse({'status': 'success', 'query': query, 'count': len(results), 'results': results})
+
+
 @login_required(login_url='login_view')
 def support(request):
     return render(request, 'base/support.html')
@@ -298,6 +643,7 @@ def staff_login(request):
 
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@query_budget(6)
 def staff_portal(request):
     if request.method == 'POST':
         worker, created = Worker.objects.get_or_create(user=request.user)
@@ -323,19 +669,30 @@ def staff_portal(request):
         worker_profile = None
     
     # Show only active projects as available work for workers
-    available_jobs = Project.objects.filter(status='active').order_by('-created_at')
-    all_workers = Worker.objects.exclude(user=request.user).order_by('-rating')
+    available_jobs = Project.objects.filter(status='active')
+    jobs_page = cached(
+        'staff_jobs', lambda: _available_jobs_page(available_jobs, request.GET.get('jobs')),
+        request.GET.get('jobs', ''), scopes=[JOBS_SCOPE],
+    )
+    jobs_links = page_links(request, jobs_page, param='jobs')
+    workers_page, workers_links = paginate_request(
+        request,
+        Worker.objects.exclude(user=request.user).only(*WORKER_CARD_FIELDS),
+        ('-rating', 'name', 'id'), page_size=STAFF_PAGE_SIZE, param='workers',
+    )
     
     # Get tasks assigned to this worker
-    my_work = Task.objects.filter(user=request.user).order_by('date')
+    my_work = Task.objects.filter(user=request.user).only('title', 'type', 'date', 'time', 'completed')[:10]
     
     context = {
         'staff_name': request.user.get_full_name() or request.user.username,
         'worker_profile': worker_profile,
-        'available_jobs': available_jobs,
-        'workers': all_workers,
+        'available_jobs': jobs_page.items,
+        'jobs_links': jobs_links,
+        'workers': workers_page.items,
+        'workers_links': workers_links,
         'my_work': my_work,
-        'my_assignments': available_jobs.filter(user=request.user)[:3] if worker_profile else [],
+        'my_assignments': available_jobs.filter(user=request.user).order_by('-created_at')[:3] if worker_profile else [],
         'available_count': available_jobs.count(),
         'skills': dict(Skill.SKILL_CHOICES),
         'title': 'WorkerPortal',  # Add title to avoid template errors
@@ -344,6 +701,17 @@ def staff_portal(request):
     return render(request, 'base/staff.html', context)
 
 
+def _available_jobs_page(available_jobs, cursor):
+    paginator = KeysetPaginator(
+        available_jobs.select_related('user').only(*JOB_CARD_FIELDS),
+        ('-created_at', '-id'), page_size=STAFF_PAGE_SIZE,
+    )
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        return paginator.page()
+
+
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
 def staff_estimates(request):
@@ -355,27 +723,45 @@ def staff_estimates(request):
 
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@replica_reads
+@query_budget(3)
 def staff_projects(request):
-    projects = Project.objects.all().order_by('-created_at')
+    page, links = paginate_request(
+        request, Project.objects.select_related('user').only(*JOB_CARD_FIELDS),
+        ('-created_at', '-id'), page_size=STAFF_PAGE_SIZE,
+    )
+    counts = Project.objects.aggregate(
+        active_count=Count('id', filter=Q(status='active')),
+        completed_count=Count('id', filter=Q(status='completed')),
+    )
     context = {
-        'projects': projects,
+        'projects': page.items,
+        'page_links': links,
         'title': 'Projects',
-        'active_count': projects.filter(status='active').count(),
-        'completed_count': projects.filter(status='completed').count(),
+        **counts,
     }
     return render(request, 'base/staff.html', context)
 
 
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@replica_reads
+@query_budget(3)
 def staff_workers(request):
-    workers = Worker.objects.all().order_by('-rating')
+    page, links = paginate_request(
+        request, Worker.objects.only(*WORKER_CARD_FIELDS),
+        ('-rating', 'name', 'id'), page_size=STAFF_PAGE_SIZE, param='workers',
+    )
+    counts = Worker.objects.aggregate(
+        available_count=Count('id', filter=Q(status='available')),
+        busy_count=Count('id', filter=Q(status='busy')),
+        total_count=Count('id'),
+    )
     context = {
-        'workers': workers,
+        'workers': page.items,
+        'workers_links': links,
         'title': 'Workers',
-        'available_count': workers.filter(status='available').count(),
-        'busy_count': workers.filter(status='busy').count(),
-        'total_count': workers.count(),
+        **counts,
     }
     return render(request, 'base/staff.html', context)
 
@@ -391,14 +777,24 @@ def staff_materials(request):
 
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@replica_reads
+@query_budget(3)
 def staff_schedule(request):
-    tasks = Task.objects.all().order_by('date')
     today = datetime.now().date()
+    page, links = paginate_request(
+        request, Task.objects.select_related('project').only(
+            'title', 'type', 'date', 'time', 'completed', 'priority', 'project__name'),
+        ('date', 'time', 'id'), page_size=STAFF_PAGE_SIZE,
+    )
+    counts = Task.objects.aggregate(
+        upcoming_tasks=Count('id', filter=Q(date__gte=today)),
+        overdue_tasks=Count('id', filter=Q(date__lt=today, completed=False)),
+    )
     context = {
-        'tasks': tasks,
+        'tasks': page.items,
+        'page_links': links,
         'title': 'Schedule',
-        'upcoming_tasks': tasks.filter(date__gte=today).count(),
-        'overdue_tasks': tasks.filter(date__lt=today, completed=False).count(),
+        **counts,
     }
     return render(request, 'base/staff.html', context)
 
@@ -414,17 +810,141 @@ def staff_invoices(request):
 
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@replica_reads
+@query_budget(3)
 def staff_payments(request):
-    payments = Payment.objects.all().order_by('-date')
+    page, links = paginate_request(
+        request, Payment.objects.select_related('user').only(
+            'type', 'category', 'amount', 'date', 'status', 'created_at', 'user__username'),
+        PAYMENT_LEDGER_ORDERING, page_size=STAFF_PAGE_SIZE,
+    )
+    totals = rollup_totals(PaymentRollup.objects.all(), datetime.now().date())
     context = {
-        'payments': payments,
+        'payments': page.items,
+        'page_links': links,
         'title': 'Payments',
-        'total_received': payments.filter(type='received').aggregate(Sum('amount'))['amount__sum'] or 0,
-        'total_paid': payments.filter(type='paid').aggregate(Sum('amount'))['amount__sum'] or 0,
+        'total_received': totals['total_received'],
+        'total_paid': totals['total_paid'],
     }
     return render(request, 'base/staff.html', context)
 
 
+@login_required(login_url='staff_login')
+@user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@require_http_methods(["GET", "POST"])
+@replica_reads
+def cash_flow(request):
+    """
+    Company-wide cash flow by month/quarter and category/method/project, as
+    JSON or CSV. POST emails the CSV to the requesting user from a
+    background job instead.
+    """
+    params = request.GET if request.method == 'GET' else request.POST
+    try:
+        date_from = datetime.strptime(params['from'], '%Y-%m-%d').date() if params.get('from') else None
+        date_to = datetime.strptime(params['to'], '%Y-%m-%d').date() if params.get('to') else None
+        period, group_by = params.get('period', 'month'), params.get('group') or None
+        if request.method == 'POST':
+            if period not in REPORT_PERIODS or group_by not in REPORT_GROUPS:
+                raise ValueError('Unknown period or group')
+            job = enqueue(email_cash_flow_report, {
+                'user_id': request.user.pk, 'period': period, 'group_by': group_by,
+                'date_from': date_from and date_from.isoformat(), 'date_to': date_to and date_to.isoformat(),
+            })
+            return JsonResponse({'status': 'queued', 'job_id': job.pk}, status=202)
+        report = cash_flow_report(period, group_by, date_from, date_to)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(report.csv_lines(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="cash-flow-{report.period}-{report.group_by}.csv"'
+        return response
+    return JsonResponse({'status': 'success', **report.as_dict()})
+
+
+# ==================== JSON API ====================
+def _api_error(e):
+    return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+
+
+def _conditional(request, etag, last_modified):
+    """304 if the client's copy is current, else None"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def _api_response(data, etag, last_modified):
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: let clients revalidate, but keep shared caches out
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET", "HEAD"])
+@query_budget(2)
+def api_list(request, resource):
+    """GET /api/v1/<resource>/?fields=a,b&limit=50&cursor=...&since=..."""
+    try:
+        resource = api.get_resource(resource)
+        fields = api.parse_fields(resource, request.GET.get('fields'))
+        page_size = api.parse_page_size(request.GET.get('limit'))
+        queryset = api.filter_since(resource.scope(request.user), request.GET.get('since'))
+
+        etag, last_modified = api.collection_validators(request, queryset)
+        not_modified = _conditional(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        items, next_cursor = api.fetch_page(resource, queryset, fields, request.GET.get('cursor'), page_size)
+    except api.ApiError as e:
+        return _api_error(e)
+
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_url = f'{request.path}?{query.urlencode()}'
+    return _api_response({'version': api.API_VERSION, 'data': items, 'next': next_url}, etag, last_modified)
+
+
+@login_required(login_url='login_view')
+@require_http_methods(["GET", "HEAD"])
+@query_budget(1)
+def api_detail(request, resource, id):
+    """GET /api/v1/<resource>/<id>/?fields=a,b"""
+    try:
+        resource = api.get_resource(resource)
+        fields = api.parse_fields(resource, request.GET.get('fields'))
+        item, last_modified = api.fetch_one(resource, resource.scope(request.user), fields, id)
+    except api.ApiError as e:
+        return _api_error(e)
+
+    etag = api.make_etag(api.API_VERSION, request.get_full_path(), last_modified)
+    not_modified = _conditional(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return _api_response({'version': api.API_VERSION, 'data': item}, etag, last_modified)
+
+
+@login_required(login_url='staff_login')
+@user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@require_http_methods(["GET"])
+def metrics(request):
+    """Request metrics per URL name, in the Prometheus text format"""
+    response = HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    patch_cache_control(response, no_store=True)
+    return response
+
+
 # ==================== JOB APPLICATION HANDLERS ====================
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
@@ -436,11 +956,14 @@ def apply_for_job(request, project_id):
         worker = get_object_or_404(Worker, user=request.user)
         
         # Check if already applied
-        app, created = JobApplication.objects.get_or_create(
-            worker=worker,
-            project=project,
-            defaults={'cover_letter': request.POST.get('cover_letter', '')}
-        )
+        with transaction.atomic():
+            app, created = JobApplication.objects.get_or_create(
+                worker=worker,
+                project=project,
+                defaults={'cover_letter': request.POST.get('cover_letter', '')}
+            )
+            if created:
+                enqueue(notify_application, {'application_id': app.pk, 'event': 'applied'})
         
         if created:
             messages.success(request, f'✅ Applied for {project.name}!')
@@ -460,57 +983,93 @@ def respond_to_application(request, app_id):
         action = request.POST.get('action', 'accept')  # accept or reject
         
         app.status = 'accepted' if action == 'accept' else 'rejected'
-        app.responded_at = datetime.now()
+        app.responded_at = timezone.now()
         app.notes = request.POST.get('notes', '')
-        app.save()
+        with transaction.atomic():
+            app.save()
+            # Accepting books the worker for the project's dates, unless already booked then
+            if app.status == 'accepted':
+                book_application(app)
+            else:
+                release_application(app)
+            enqueue(notify_application, {'application_id': app.pk, 'event': 'responded'})
         
         status_text = 'Accepted' if action == 'accept' else 'Rejected'
         messages.success(request, f'✅ Application {status_text}!')
         return redirect('projects')
+    except BookingConflict as e:
+        messages.error(request, f'Cannot accept: {e}')
+        return redirect('projects')
     except Exception as e:
         messages.error(request, f'Error: {str(e)}')
         return redirect('projects')
 
 
+@login_required(login_url='staff_login')
+@user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@require_http_methods(["GET", "POST"])
+def staff_bookings(request):
+    """A worker's own bookings; POST books leave (or a hold) unless it clashes"""
+    worker = Worker.objects.filter(user=request.user).first()
+    if worker is None:
+        return JsonResponse({'status': 'error', 'message': 'No worker profile found'}, status=404)
+    if request.method == 'POST':
+        kind = request.POST.get('kind', 'leave')
+        if kind not in ('leave', 'hold'):
+            return JsonResponse({'status': 'error', 'message': 'kind must be leave or hold'}, status=400)
+        try:
+            booking = book_worker(worker, _date_param(request.POST, 'start'), _date_param(request.POST, 'end'),
+                                  kind=kind, note=request.POST.get('note', '')[:200])
+        except BookingConflict as e:
+            return JsonResponse({'status': 'error', 'message': str(e),
+                                 'conflicts': [_booking_json(b) for b in e.conflicts]}, status=409)
+        except ValueError as e:
+            # A bad date, or a BookingError
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', 'booking': _booking_json(booking)}, status=201)
+
+    bookings = worker.bookings.filter(end_date__gte=timezone.localdate()).order_by('start_date')
+    return JsonResponse({'status': 'success', 'bookings': [_booking_json(b) for b in bookings]})
+
+
 # ==================== TIME LOG HANDLERS ====================
+# Async views: under ASGI (bidiibuilders/asgi.py) a burst of check-ins at
+# shift start no longer ties up one worker thread per request.
+@sync_to_async
+def _open_shift(worker, project):
+    """Insert an open TimeLog, or return None if the worker already has one"""
+    # The timelog_one_open_shift constraint rejects a second open shift,
+    # so concurrent taps can't both get through
+    try:
+        with transaction.atomic():
+            return TimeLog.objects.create(worker=worker, project=project)
+    except IntegrityError:
+        return None
+
+
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
 @require_http_methods(["POST"])
-def clock_in(request):
+async def clock_in(request):
     """Worker clocks in"""
     try:
-        worker = get_object_or_404(Worker, user=request.user)
-        project_id = request.POST.get('project_id')
+        user = await request.auser()
+        worker = await Worker.objects.only('id').filter(user=user).afirst()
+        if worker is None:
+            return JsonResponse({'status': 'error', 'message': 'No worker profile found'}, status=404)
+
         project = None
-        
+        project_id = request.POST.get('project_id')
         if project_id:
-            try:
-                project = Project.objects.get(id=project_id)
-            except Project.DoesNotExist:
-                pass
-        
-        today = datetime.now().date()
-        
-        # Check if already clocked in today
-        existing = TimeLog.objects.filter(
-            worker=worker,
-            date=today,
-            clock_out_time__isnull=True
-        ).first()
-        
-        if existing:
+            project = await Project.objects.only('id').filter(id=project_id).afirst()
+
+        time_log = await _open_shift(worker, project)
+        if time_log is None:
             return JsonResponse({'status': 'info', 'message': 'Already clocked in'})
-        
-        time_log = TimeLog.objects.create(
-            worker=worker,
-            project=project,
-            date=today,
-            clock_in_time=datetime.now()
-        )
-        
+
         return JsonResponse({
             'status': 'success',
-            'message': f'✅ Clocked in at {datetime.now().strftime("%H:%M:%S")}',
+            'message': f'✅ Clocked in at {timezone.localtime(time_log.clock_in_time).strftime("%H:%M:%S")}',
             'time_log_id': time_log.id
         })
     except Exception as e:
@@ -520,31 +1079,63 @@ def clock_in(request):
 @login_required(login_url='staff_login')
 @user_passes_test(lambda u: u.is_staff, login_url='staff_login')
 @require_http_methods(["POST"])
-def clock_out(request):
+async def clock_out(request):
     """Worker clocks out"""
     try:
-        worker = get_object_or_404(Worker, user=request.user)
-        today = datetime.now().date()
-        
-        # Find active time log
-        time_log = TimeLog.objects.filter(
-            worker=worker,
-            date=today,
+        user = await request.auser()
+        # Closes the open shift whatever day it started, so overnight and
+        # forgotten shifts don't block the next clock in
+        time_log = await TimeLog.objects.filter(
+            worker__user=user,
             clock_out_time__isnull=True
-        ).first()
-        
+        ).only('id', 'worker_id', 'project_id', 'date', 'clock_in_time').afirst()
+
         if not time_log:
             return JsonResponse({'status': 'info', 'message': 'No active clock in found'})
-        
-        time_log.clock_out_time = datetime.now()
-        time_log.notes = request.POST.get('notes', '')
-        time_log.save()
-        
-        hours = time_log.hours_worked or 0
+
+        now = timezone.now()
+        hours = round(Decimal((now - time_log.clock_in_time).total_seconds()) / 3600, 2)
+        closed = await TimeLog.objects.filter(pk=time_log.pk, clock_out_time__isnull=True).aupdate(
+            clock_out_time=now,
+            hours_worked=hours,
+            daily_rate=Subquery(Worker.objects.filter(pk=OuterRef('worker_id')).values('daily_rate')[:1]),
+            notes=request.POST.get('notes', ''),
+            updated_at=now,
+        )
+        if not closed:
+            return JsonResponse({'status': 'info', 'message': 'No active clock in found'})
+        # update() skips the signal that accrues the project's wages
+        time_log.hours_worked = hours
+        await sync_to_async(record_time_logs)([time_log])
+
         return JsonResponse({
             'status': 'success',
-            'message': f'✅ Clocked out at {datetime.now().strftime("%H:%M:%S")} ({hours} hrs)',
+            'message': f'✅ Clocked out at {timezone.localtime(now).strftime("%H:%M:%S")} ({hours} hrs)',
             'hours_worked': float(hours)
         })
     except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@login_required(login_url='staff_login')
+@user_passes_test(lambda u: u.is_staff, login_url='staff_login')
+@require_http_methods(["POST"])
+def clock_sync(request):
+    """Apply a batch of clock events queued offline by a site device"""
+    try:
+        events = json.loads(request.body).get('events')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Body must be a JSON object'}, status=400)
+    if not isinstance(events, list):
+        return JsonResponse({'status': 'error', 'message': 'events must be a list'}, status=400)
+    if len(events) > MAX_BATCH_EVENTS:
+        return JsonResponse({'status': 'error',
+                             'message': f'At most {MAX_BATCH_EVENTS} events per request'}, status=400)
+
+    try:
+        result = apply_clock_events(events, request.user)
+    except IntegrityError:
+        # A live clock-in raced the batch; nothing was applied
+        return JsonResponse({'status': 'error', 'message': 'Conflicting clock in, retry the upload'}, status=409)
+    return JsonResponse({'status': 'success', **result.as_dict()})
+
@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the time spent in the other middleware is measured too
+    'base.metrics.RequestMetricsMiddleware',
+    'base.slowqueries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,13 +54,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'base.replicas.PinPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'bidiibuilders.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for the request metrics
+        'BACKEND': 'base.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,13 +81,119 @@ WSGI_APPLICATION = 'bidiibuilders.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgresql uses PostgreSQL (needs psycopg 3, and psycopg[pool]
+# for DB_POOL=true) configured by DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT.
+# Otherwise SQLite at DB_NAME (default db.sqlite3), tuned below.
+
+def env_flag(name, default=False):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'bidiibuilders'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Keep connections open between requests; check them before
+            # reuse so a restarted server doesn't surface as request errors
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if env_flag('DB_POOL'):
+        # Django's pool replaces persistent connections; the two can't be combined
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Seconds a request waits for a free connection before erroring
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    # WAL lets readers run alongside the single writer, and synchronous=NORMAL
+    # is durable in WAL mode except for the last commits on power loss.
+    # Writers wait busy_timeout for the lock instead of failing with
+    # "database is locked"; IMMEDIATE transactions take the write lock up
+    # front, so a read-then-write transaction can't deadlock on upgrade.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': (
+                    f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}; PRAGMA synchronous={SQLITE_SYNCHRONOUS}; '
+                    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}'
+                ),
+                'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+            },
+        }
+    }
+
+# Read replica (DB_REPLICA_NAME, plus DB_REPLICA_HOST/DB_REPLICA_PORT for
+# PostgreSQL): views decorated with base.replicas.replica_reads (staff
+# listings and reports) read from it. Writes always go to the primary, and
+# a client that just wrote reads from the primary for DB_REPLICA_PIN_SECONDS.
+# To try it locally with SQLite, point DB_REPLICA_NAME at a second file
+# (e.g. a copy of db.sqlite3).
+
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # Tests read the primary's test database through this alias
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['base.replicas.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Set CACHE_URL to any Redis-protocol server (redis://, rediss://) in
+# production; this needs the redis package. Without it a per-process
+# local-memory cache is used.
+
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bidiibuilders',
+        }
     }
-}
 
+# Seconds a cached stat card / fragment may live; writes invalidate sooner
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 300))
+
+
+# Email, sent by background jobs (run_jobs). Printed to the console unless
+# EMAIL_BACKEND/EMAIL_HOST point at a real server.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = env_flag('EMAIL_USE_TLS')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Bidii Quality Builders <noreply@bidiibuilders.local>')
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,3 +246,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login_view'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
+
+# Views decorated with @query_budget log a warning when they run more SQL
+# queries than declared; set to True to raise QueryBudgetExceeded instead
+QUERY_BUDGET_STRICT = False
+
+# Per-URL-name request timings, SQL and template time and response sizes,
+# served to staff in Prometheus format at /staff/metrics/
+PERF_METRICS = env_flag('PERF_METRICS', True)
+
+# Queries slower than SLOW_QUERY_MS are logged by fingerprint, with the
+# calling view and line and an EXPLAIN plan, to SlowQuery (see the admin)
+SLOW_QUERY_LOG = env_flag('SLOW_QUERY_LOG', True)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+
+# Payroll: daily_rate pays a standard day; hours beyond it in a day earn
+# the overtime multiplier
+PAYROLL_STANDARD_DAY_HOURS = int(os.environ.get('PAYROLL_STANDARD_DAY_HOURS', 8))
+PAYROLL_OVERTIME_MULTIPLIER = os.environ.get('PAYROLL_OVERTIME_MULTIPLIER', '1.5')